@@ -1,15 +1,33 @@
-from flask import Flask
+from flask import Flask, request
 from flask_cors import CORS
 from flasgger import Swagger
 from routes.auth import auth_bp
 from routes.expenses import expenses_bp
 from routes.farm import farm_bp
 from routes.goals import goals_bp
+from routes.dashboard import dashboard_bp
+from config.db import debug_enabled, init_app as init_db, pool_stats
+from config.query_log import query_stats
+from config.metrics import init_app as init_metrics
+from config.log import init_app as init_logging
+from services.reference_data import get_reference_data
 
 # Crear app
 app = Flask(__name__)
 CORS(app)
 
+# Logging en cola (JSON a stderr) y X-Request-ID en cada request; primero para que todo lo demás ya loguee con id
+init_logging(app)
+
+# Latencia por ruta y GET /metrics (antes que la BD: el tiempo medido incluye el commit)
+init_metrics(app)
+
+# Una conexión y una transacción por request
+init_db(app)
+
+# Catálogos (category, ants) en memoria desde el arranque; si la BD no responde se reintenta al usarlos
+get_reference_data().load()
+
 # Configurar Swagger
 swagger_config = {
     "headers": [],
@@ -48,6 +66,7 @@ app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(expenses_bp, url_prefix='/api/expenses')
 app.register_blueprint(farm_bp, url_prefix='/api/farm')
 app.register_blueprint(goals_bp, url_prefix='/api/goals')
+app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
 
 @app.route('/')
 def home():
@@ -71,7 +90,8 @@ def home():
         'endpoints': {
             'auth': '/api/auth',
             'expenses': '/api/expenses',
-            'farm': '/api/farm'
+            'farm': '/api/farm',
+            'dashboard': '/api/dashboard'
         }
     }
 
@@ -87,8 +107,62 @@ def health():
           properties:
             status:
               type: string
+            db_pool:
+              type: object
+              description: Estadísticas del pool de conexiones (in_use, waiting, created, recycled)
+            reference_data:
+              type: object
+              description: Estado de los catálogos en memoria (tamaño, edad, recargas)
+    """
+    return {'status': 'healthy', 'db_pool': pool_stats(), 'reference_data': get_reference_data().stats()}, 200
+
+def _not_found():
+    # Sin el modo diagnóstico estos endpoints no existen para el cliente (sin auth propia)
+    return {'success': False, 'message': 'No encontrado'}, 404
+
+@app.route('/db/stats')
+def db_stats():
+    """
+    Sentencias SQL más costosas del proceso (normalizadas, sin valores)
+    ---
+    parameters:
+      - in: query
+        name: top
+        type: integer
+        required: false
+        description: Cuántas sentencias devolver (por tiempo total)
+        example: 20
+    responses:
+      200:
+        description: Llamadas, tiempo total/promedio/máximo, filas y errores por sentencia; conteo de queries lentos
+      404:
+        description: Diagnóstico apagado (solo con debug o DB_DEBUG_HEADERS=1)
+    """
+    if not debug_enabled(app):
+        return _not_found()
+    top = request.args.get('top', default=20, type=int)
+    return {'success': True, 'stats': query_stats.snapshot(top=top)}, 200
+
+@app.route('/reference/refresh', methods=['POST'])
+def refresh_reference_data():
+    """
+    Recargar los catálogos en memoria (category, ants) después de editarlos
+    ---
+    responses:
+      200:
+        description: Catálogos recargados
+      404:
+        description: Diagnóstico apagado (solo con debug o DB_DEBUG_HEADERS=1)
+      503:
+        description: No se pudo leer la base de datos (se conserva el snapshot anterior)
     """
-    return {'status': 'healthy'}, 200
+    if not debug_enabled(app):
+        return _not_found()
+    reference = get_reference_data()
+    reference.invalidate()
+    if not reference.load():
+        return {'success': False, 'message': 'No se pudieron recargar los catálogos'}, 503
+    return {'success': True, 'stats': reference.stats()}, 200
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
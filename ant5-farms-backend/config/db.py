@@ -1,11 +1,23 @@
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, IntegrityError
+from mysql.connector.constants import ClientFlag
 import os
+import re
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dotenv import load_dotenv
+from flask import g, has_app_context, jsonify, request
+from config.pool import ConnectionPool, PoolTimeout
+from config.query_log import end_request_log, normalize_sql, start_request_log, timed
+from config.metrics import registry
+from config.log import get_logger
 
 # Cargar variables de entorno desde .env
 load_dotenv()
 
+log = get_logger('db')
+
 def get_db_connection():
     """
     Crear conexión a la base de datos MySQL
@@ -23,44 +35,353 @@ def get_db_connection():
             user=user,
             password=os.getenv('DB_PASSWORD'),
             database=database,
-            ssl_disabled=False if os.getenv('DB_SSL') == 'True' else True
+            ssl_disabled=False if os.getenv('DB_SSL') == 'True' else True,
+            # rowcount = filas que cumplen el WHERE (no solo las que cambiaron)
+            client_flags=[ClientFlag.FOUND_ROWS]
         )
         
         if connection.is_connected():
-            # ===== AGREGAR ESTO =====
-            print("✅ CONEXIÓN EXITOSA A LA BASE DE DATOS\n")
-            # ========================
+            # Solo pasa cuando el pool abre una conexión nueva (no en cada query)
+            log.debug('conexión nueva a MySQL', extra={'host': host, 'database': database})
             return connection
     except Error as e:
-        print(f"❌ Error conectando a MySQL: {e}\n")
+        log.error('error conectando a MySQL', extra={'error': str(e), 'errno': e.errno})
+        return None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    Pool de conexiones compartido por todo el proceso (se crea al primer uso)
+    Configurable con DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_RECYCLE y DB_POOL_PING_AFTER
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    get_db_connection,
+                    size=int(os.getenv('DB_POOL_SIZE', '5')),
+                    timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+                    recycle=float(os.getenv('DB_POOL_RECYCLE', '1800')),
+                    ping_after=float(os.getenv('DB_POOL_PING_AFTER', '30')),
+                )
+    return _pool
+
+def _is_disconnect(error):
+    """True si el error indica que la conexión ya no sirve (server gone, lost connection)"""
+    return isinstance(error, mysql.connector.InterfaceError) or error.errno in (2006, 2013, 2055)
+
+def pool_stats():
+    """Estadísticas del pool (in_use, waiting, created, recycled, ...)"""
+    return get_pool().stats()
+
+@registry.register_collector
+def _pool_metrics():
+    if _pool is None:
+        return []
+    stats = _pool.stats()
+    return [
+        ('db_pool_connections', 'gauge', 'Conexiones del pool por estado',
+         {(('state', 'in_use'),): stats['in_use'], (('state', 'idle'),): stats['idle']}),
+        ('db_pool_size', 'gauge', 'Máximo de conexiones del pool', {(): stats['size']}),
+        ('db_pool_waiting', 'gauge', 'Hilos esperando una conexión', {(): stats['waiting']}),
+        ('db_pool_checkouts_total', 'counter', 'Conexiones prestadas por el pool', {(): stats['checkouts']}),
+        ('db_pool_timeouts_total', 'counter', 'Esperas por conexión que vencieron', {(): stats['timeouts']}),
+        ('db_pool_recycled_total', 'counter', 'Conexiones reemplazadas por edad o falla', {(): stats['recycled']}),
+    ]
+
+class DBSession:
+    """
+    Unidad de trabajo: una conexión del pool y una transacción
+    La conexión se pide al pool en el primer query y se devuelve en commit/rollback
+    """
+
+    def __init__(self, pool=None):
+        self._pool = pool or get_pool()
+        self.connection = None
+        self.failed = False      # Algún query falló → la transacción termina en rollback
+        self._broken = False     # La conexión murió → no vuelve al pool
+        self._after_commit = []  # Callbacks que corren solo si el commit se confirmó
+
+    def after_commit(self, fn):
+        """
+        Registra fn() para después del commit (ej. invalidar cachés con lo ya confirmado)
+        Si la transacción termina en rollback no se llama
+        """
+        self._after_commit.append(fn)
+
+    def execute(self, query, params=None, fetch=False, rowcount=False, many=False):
+        """
+        Ejecuta un query dentro de la transacción (lanza Error si falla)
+        - many: params es una lista de tuplas (executemany; los INSERT se mandan como uno solo)
+        """
+        if self.connection is None:
+            try:
+                self.connection = self._pool.acquire()
+            except (PoolTimeout, ConnectionError):
+                # Sin conexión el query no corrió: lo que venga después no debe confirmarse
+                self.failed = True
+                raise
+
+        cursor = self.connection.cursor(dictionary=True)
+        # Latencia, filas y SQL normalizado de cada sentencia (query_log)
+        with timed(query) as stat:
+            try:
+                if many:
+                    cursor.executemany(query, params or [])
+                else:
+                    cursor.execute(query, params or ())
+                if fetch:
+                    rows = cursor.fetchall()
+                    stat.rows = len(rows)
+                    return rows
+                stat.rows = cursor.rowcount
+                if rowcount:
+                    return cursor.rowcount
+                return cursor.lastrowid
+            except Error as e:
+                self.failed = True
+                self._broken = self._broken or _is_disconnect(e)
+                raise
+            finally:
+                cursor.close()
+
+    def commit(self):
+        """Confirma la transacción (o hace rollback si algún query falló) y libera la conexión"""
+        if self.connection is None:
+            return
+        if self.failed:
+            self.rollback()
+            return
+        try:
+            self.connection.commit()
+        except Error as e:
+            self._broken = self._broken or _is_disconnect(e)
+            self.rollback()
+            raise
+        callbacks, self._after_commit = self._after_commit, []
+        self._release()
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception:
+                log.exception('error en callback after_commit')
+
+    def rollback(self):
+        """Descarta la transacción y libera la conexión"""
+        self._after_commit = []
+        if self.connection is None:
+            return
+        try:
+            self.connection.rollback()
+        except Error:
+            self._broken = True
+        self._release()
+
+    def _release(self):
+        connection, self.connection = self.connection, None
+        self._pool.release(connection, discard=self._broken)
+        self.failed = False
+        self._broken = False
+
+# Sesión abierta con transaction() en el hilo/contexto actual
+_active_session = ContextVar('db_session', default=None)
+
+@contextmanager
+def transaction():
+    """
+    Context manager para código fuera de un request (workers, scripts)
+    with transaction() as session:
+        session.execute(...)   # o execute_query(...), que usa esta misma sesión
+    Hace commit al salir o rollback si hubo excepción
+    """
+    session = DBSession()
+    token = _active_session.set(session)
+    try:
+        yield session
+    except BaseException:
+        session.rollback()
+        raise
+    else:
+        session.commit()
+    finally:
+        _active_session.reset(token)
+
+def current_session():
+    """Sesión de transaction() activa, la del request (en flask.g) o None"""
+    session = _active_session.get()
+    if session is not None:
+        return session
+    if not has_app_context():
         return None
+    if 'db_session' not in g:
+        g.db_session = DBSession()
+    return g.db_session
+
+def release_session():
+    """
+    Confirma lo hecho hasta ahora y devuelve la conexión al pool
+    Útil antes de una llamada externa lenta (ej. Gemini) para no retener la conexión
+    Si algún query ya falló no confirma nada: rollback y la sesión sigue marcada como fallida,
+    así el request termina en rollback/500 igual que si no se hubiera liberado
+    """
+    session = g.get('db_session') if has_app_context() else None
+    if session is None:
+        return
+    if session.failed:
+        session.rollback()
+        session.failed = True
+        return
+    session.commit()
 
-def execute_query(query, params=None, fetch=False):
+def debug_enabled(app):
+    """
+    Diagnóstico de BD activo (app.debug o DB_DEBUG_HEADERS=1): headers X-DB-* y los endpoints
+    /db/stats y /reference/refresh, que exponen SQL y recargan catálogos sin autenticación
+    """
+    return app.debug or os.getenv('DB_DEBUG_HEADERS') == '1'
+
+def init_app(app):
+    """Registra el commit/rollback único por request"""
+
+    debug_headers = debug_enabled(app)
+
+    @app.before_request
+    def _start_query_log():
+        g.db_query_log, g.db_query_log_token = start_request_log()
+
+    @app.after_request
+    def _report_queries(response):
+        # Flask corre los after_request en orden inverso: esto corre después de _finish_db_session
+        query_log = g.get('db_query_log')
+        if query_log is None:
+            return response
+        repeated = query_log.repeated()
+        for sql, times in repeated:
+            log.warning('sentencia repetida en un request', extra={
+                'method': request.method, 'path': request.path, 'times': times, 'sql': sql})
+        if debug_headers:
+            response.headers['X-DB-Queries'] = str(query_log.count)
+            response.headers['X-DB-Time-ms'] = f"{query_log.total_ms:.2f}"
+            if repeated:
+                response.headers['X-DB-Repeated'] = str(len(repeated))
+        return response
+
+    @app.after_request
+    def _finish_db_session(response):
+        session = g.get('db_session')
+        if session is None:
+            return response
+        # Respuestas de error no dejan escrituras a medias
+        if response.status_code >= 400:
+            session.rollback()
+            return response
+        # Algún query falló a media petición: nada se guarda y no se reporta éxito
+        if session.failed:
+            session.rollback()
+            return _db_error_response()
+        try:
+            session.commit()
+        except Error as e:
+            log.error('error haciendo commit', extra={'error': str(e), 'path': request.path})
+            return _db_error_response()
+        return response
+
+    @app.errorhandler(IntegrityError)
+    def _integrity_error(e):
+        # Las escrituras confían en las FK en vez de validar con un SELECT antes
+        message, status = describe_integrity_error(e)
+        response = jsonify({'success': False, 'message': message})
+        response.status_code = status
+        return response
+
+    @app.teardown_request
+    def _end_query_log(exc):
+        token = g.pop('db_query_log_token', None)
+        if token is not None:
+            end_request_log(token)
+
+    @app.teardown_appcontext
+    def _close_db_session(exc):
+        # Si hubo excepción after_request no corre: rollback aquí
+        session = g.pop('db_session', None)
+        if session is not None:
+            session.rollback()
+
+# Tabla a la que apunta la FK que falló → mismo mensaje que daban las validaciones previas
+FK_MESSAGES = {
+    'users': 'Usuario no existe',
+    'category': 'Categoría no existe',
+    'ants': 'Hormiga no encontrada',
+}
+
+def describe_integrity_error(error):
+    """(mensaje, http_status) de un IntegrityError: FK sin padre → 404, llave duplicada → 409"""
+    if error.errno in (1216, 1452):
+        match = re.search(r"REFERENCES `(\w+)`", error.msg or '')
+        table = match.group(1) if match else None
+        return FK_MESSAGES.get(table, 'Registro relacionado no existe'), 404
+    if error.errno == 1062:
+        return 'Registro duplicado', 409
+    return 'Error guardando cambios', 500
+
+def _db_error_response():
+    response = jsonify({'success': False, 'message': 'Error guardando cambios'})
+    response.status_code = 500
+    return response
+
+def execute_query(query, params=None, fetch=False, rowcount=False):
     """
     Función helper para ejecutar queries SQL
     - query: El SQL a ejecutar (ej: "SELECT * FROM users WHERE id = %s")
     - params: Los parámetros seguros (ej: (1,))
     - fetch: True si quieres resultados, False si es INSERT/UPDATE/DELETE
+    - rowcount: True para recibir las filas afectadas en vez del último ID
+    Dentro de un request usa la sesión del request (commit único al final);
+    fuera de un request usa su propia transacción con commit inmediato
+    Los errores de integridad (FK sin padre, duplicados) se lanzan como IntegrityError;
+    dentro de un request los convierte en 404/409 el errorhandler de init_app
     """
-    connection = get_db_connection()
-    if not connection:
+    return _run(query, params, fetch=fetch, rowcount=rowcount)
+
+def execute_many(query, seq_params, rowcount=False):
+    """
+    Igual que execute_query pero con una lista de parámetros (ej: varios INSERT)
+    mysql-connector junta los INSERT ... VALUES en una sola sentencia multi-fila
+    Regresa el ID del primer INSERT (o las filas afectadas con rowcount=True)
+    """
+    return _run(query, list(seq_params), rowcount=rowcount, many=True)
+
+def _run(query, params, **kwargs):
+    session = current_session()
+    if session is not None:
+        return _execute(session, query, params, **kwargs)
+
+    session = DBSession()
+    try:
+        result = _execute(session, query, params, **kwargs)
+    except IntegrityError:
+        session.rollback()
+        raise
+    try:
+        session.commit()
+    except Error as e:
+        log.error('error haciendo commit', extra={'error': str(e)})
         return None
-    
+    return result
+
+def _execute(session, query, params, **kwargs):
     try:
-        cursor = connection.cursor(dictionary=True)  # Retorna dict en vez de tuplas
-        cursor.execute(query, params or ())
-        
-        if fetch:
-            # Si es SELECT, obtener resultados
-            result = cursor.fetchall()
-        else:
-            # Si es INSERT/UPDATE/DELETE, hacer commit
-            connection.commit()
-            result = cursor.lastrowid  # Retorna el ID del último INSERT
-        
-        cursor.close()
-        connection.close()
-        return result
+        # Si es SELECT regresa las filas (dict); si es INSERT/UPDATE/DELETE el ID del último INSERT
+        return session.execute(query, params, **kwargs)
+    except IntegrityError:
+        raise
+    except (PoolTimeout, ConnectionError) as e:
+        log.error('sin conexión disponible', extra={'error': str(e)})
+        return None
     except Error as e:
-        print(f"Error ejecutando query: {e}")
-        return None
\ No newline at end of file
+        log.error('error ejecutando query', extra={'error': str(e), 'errno': getattr(e, 'errno', None),
+                                                   'sql': normalize_sql(query)})
+        return None
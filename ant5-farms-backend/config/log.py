@@ -0,0 +1,175 @@
+"""
+Logging estructurado y sin bloquear el request
+
+- Los handlers de la app solo encolan (QueueHandler); un hilo QueueListener formatea y escribe.
+  Si la cola se llena el registro se descarta y se cuenta, nunca se espera
+- Cada registro lleva el request id (header X-Request-ID o uno generado), también en los hilos
+  de análisis, preprocesado y jobs si la tarea se envuelve con with_request_id
+- Los eventos DEBUG de alto volumen (un registro por query) se muestrean con LOG_DEBUG_SAMPLE
+
+Configuración: LOG_LEVEL (INFO), LOG_FORMAT (json | text), LOG_DEBUG_SAMPLE (0.01), LOG_QUEUE_SIZE (10000)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+
+from flask import g, request
+
+request_id_var = ContextVar('request_id', default='-')
+
+# X-Request-ID del cliente solo si es un id razonable (no se loguea texto arbitrario)
+_REQUEST_ID_RE = re.compile(r'^[\w.:-]{1,128}$')
+
+# Atributos propios de LogRecord; el resto (extra=...) va como campos del JSON
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+def get_logger(name):
+    return logging.getLogger(f"ant5.{name}")
+
+
+def with_request_id(fn):
+    """
+    Envuelve fn para que corra con el request id actual
+    Los hilos de un ThreadPoolExecutor no heredan los contextvars del request que los usa
+    """
+    request_id = request_id_var.get()
+
+    def run(*args, **kwargs):
+        token = request_id_var.set(request_id)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            request_id_var.reset(token)
+    return run
+
+
+class RequestIdFilter(logging.Filter):
+    """Copia el request id al registro (corre en el hilo que loguea, antes de encolar)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Deja pasar solo una fracción de los registros DEBUG (rate)
+    Un registro puede pedir su propia tasa con extra={'sample': 0.1}
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self._random = random.Random()
+
+    def filter(self, record):
+        rate = getattr(record, 'sample', None)
+        if rate is None:
+            if record.levelno > logging.DEBUG:
+                return True
+            rate = self.rate
+        return rate >= 1 or self._random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and key != 'sample':
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que nunca bloquea: con la cola llena descarta y cuenta"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener = None
+_handler = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging():
+    """Configura el logger 'ant5' una sola vez por proceso"""
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            return
+        level = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper(), logging.INFO)
+        stream = logging.StreamHandler(sys.stderr)
+        if os.getenv('LOG_FORMAT', 'json') == 'json':
+            stream.setFormatter(JsonFormatter())
+        else:
+            stream.setFormatter(logging.Formatter('%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'))
+
+        _handler = DroppingQueueHandler(queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', '10000'))))
+        _handler.addFilter(SamplingFilter(float(os.getenv('LOG_DEBUG_SAMPLE', '0.01'))))
+        _handler.addFilter(RequestIdFilter())
+
+        logger = logging.getLogger('ant5')
+        logger.setLevel(level)
+        logger.addHandler(_handler)
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def dropped_records():
+    return _handler.dropped if _handler is not None else 0
+
+
+def init_app(app):
+    """Request id por request: se toma de X-Request-ID (o se genera) y se devuelve en la respuesta"""
+    setup_logging()
+
+    @app.before_request
+    def _bind_request_id():
+        request_id = request.headers.get('X-Request-ID', '')
+        if not _REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        g.request_id = request_id
+        g.request_id_token = request_id_var.set(request_id)
+
+    @app.after_request
+    def _send_request_id(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        return response
+
+    @app.teardown_request
+    def _unbind_request_id(exc):
+        token = g.pop('request_id_token', None)
+        if token is not None:
+            request_id_var.reset(token)
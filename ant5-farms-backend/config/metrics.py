@@ -0,0 +1,340 @@
+"""
+Métricas en formato de texto de Prometheus (GET /metrics)
+
+- Contadores e histogramas por hilo: registrar un valor no toma locks compartidos;
+  solo el scrape suma los valores de todos los hilos
+- Gauges del momento (pool, cachés) se leen al hacer scrape con register_collector
+- Varios procesos (gunicorn -w N): con METRICS_MULTIPROC_DIR cada proceso escribe su
+  snapshot en <dir>/<pid>.json cada METRICS_FLUSH_INTERVAL segundos y el scrape junta todos
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import Response, g, request
+
+from config.log import dropped_records, get_logger
+
+log = get_logger('metrics')
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []          # [(hilo, dict)] de cada hilo que ha registrado valores
+        self._shards_lock = threading.Lock()
+        self._base = {}            # Valores de hilos que ya terminaron
+
+    def _shard(self):
+        values = getattr(self._local, 'values', None)
+        if values is None:
+            values = self._local.values = {}
+            with self._shards_lock:
+                self._shards.append((threading.current_thread(), values))
+        return values
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def collect(self):
+        """{labels: valor} sumando todos los hilos (los hilos muertos se pliegan a la base)"""
+        with self._shards_lock:
+            alive = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, values))
+                else:
+                    for key, value in list(values.items()):
+                        self._base[key] = self._merge(self._base.get(key), value)
+            self._shards = alive
+            total = {key: self._copy(value) for key, value in self._base.items()}
+            shards = [values for _, values in alive]
+        for values in shards:
+            for key, value in list(values.items()):
+                total[key] = self._merge(total.get(key), value)
+        return total
+
+    @staticmethod
+    def _copy(value):
+        return list(value) if isinstance(value, list) else value
+
+    @staticmethod
+    def _merge(current, value):
+        if current is None:
+            return list(value) if isinstance(value, list) else value
+        if isinstance(value, list):
+            return [a + b for a, b in zip(current, value)]
+        return current + value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        values = self._shard()
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge de suma (inc/dec desde cualquier hilo, ej. requests en curso)"""
+
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        values = self._shard()
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        values = self._shard()
+        key = self._key(labels)
+        entry = values.get(key)
+        if entry is None:
+            # [conteo por bucket..., +Inf, suma]
+            entry = values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[i] += 1
+                break
+        else:
+            entry[len(self.buckets)] += 1
+        entry[-1] += value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def register_collector(self, fn):
+        """
+        fn() -> [(nombre, tipo, ayuda, {labels_dict_como_tupla_de_pares: valor})]
+        Para valores que ya lleva otro componente (pool, cachés); se lee en cada scrape
+        """
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def snapshot(self):
+        """Estado del proceso serializable: {nombre: {type, help, labels, buckets?, samples}}"""
+        result = {}
+        for metric in list(self._metrics):
+            entry = {'type': metric.kind, 'help': metric.help, 'labels': list(metric.labels),
+                     'samples': [[list(k), v] for k, v in metric.collect().items()]}
+            if isinstance(metric, Histogram):
+                entry['buckets'] = list(metric.buckets)
+            result[metric.name] = entry
+        for fn in list(self._collectors):
+            try:
+                families = fn()
+            except Exception as e:
+                log.error('error leyendo métricas', extra={'collector': getattr(fn, '__name__', str(fn)), 'error': str(e)})
+                continue
+            for name, kind, help_text, samples in families:
+                labels = sorted({k for pairs in samples for k, _ in pairs})
+                entry = result.setdefault(name, {'type': kind, 'help': help_text, 'labels': labels, 'samples': []})
+                for pairs, value in samples.items():
+                    pairs = dict(pairs)
+                    entry['samples'].append([[str(pairs.get(k, '')) for k in entry['labels']], value])
+        return result
+
+
+registry = Registry()
+
+
+# -------------------------
+#  Formato de texto
+# -------------------------
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    lines = []
+    for name in sorted(snapshot):
+        entry = snapshot[name]
+        lines.append(f"# HELP {name} {entry['help']}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        names = entry['labels']
+        for values, sample in sorted(entry['samples'], key=lambda s: s[0]):
+            if entry['type'] == 'histogram':
+                cumulative = 0
+                for bound, count in zip(entry['buckets'] + [float('inf')], sample[:-1]):
+                    cumulative += count
+                    le = 'le="' + _number(float(bound)) + '"'
+                    lines.append(f"{name}_bucket{_labels(names, values, le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(names, values)} {_number(float(sample[-1]))}")
+                lines.append(f"{name}_count{_labels(names, values)} {cumulative}")
+            else:
+                lines.append(f"{name}{_labels(names, values)} {_number(sample)}")
+    return '\n'.join(lines) + '\n'
+
+
+# -------------------------
+#  Multiproceso
+# -------------------------
+MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR') or None
+FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '5'))
+
+
+def _dump(directory=MULTIPROC_DIR):
+    """Escribe el snapshot de este proceso de forma atómica"""
+    data = json.dumps({'pid': os.getpid(), 'time': time.time(), 'metrics': registry.snapshot()})
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(data)
+    os.replace(tmp, os.path.join(directory, f"{os.getpid()}.json"))
+
+
+def _merge_dir(directory=MULTIPROC_DIR):
+    """Junta los snapshots de todos los procesos; los gauges de procesos sin actualizar se ignoran"""
+    merged = {}
+    stale_after = FLUSH_INTERVAL * 3
+    now = time.time()
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        live = now - data.get('time', 0) <= stale_after
+        for metric, entry in data['metrics'].items():
+            if entry['type'] == 'gauge' and not live:
+                continue
+            target = merged.setdefault(metric, {**entry, 'samples': []})
+            index = {tuple(values): i for i, (values, _) in enumerate(target['samples'])}
+            for values, sample in entry['samples']:
+                i = index.get(tuple(values))
+                if i is None:
+                    target['samples'].append([values, sample])
+                    index[tuple(values)] = len(target['samples']) - 1
+                else:
+                    target['samples'][i][1] = _Metric._merge(target['samples'][i][1], sample)
+    return merged
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            _dump()
+        except Exception as e:
+            log.error('error guardando métricas', extra={'error': str(e)})
+
+
+def exposition():
+    """Texto de /metrics (de este proceso o de todos con METRICS_MULTIPROC_DIR)"""
+    if MULTIPROC_DIR:
+        _dump()
+        return render(_merge_dir())
+    return render(registry.snapshot())
+
+
+# -------------------------
+#  Métricas HTTP
+# -------------------------
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Latencia de los requests por ruta', ('route', 'method', 'status'))
+in_flight = registry.gauge('http_requests_in_flight', 'Requests en curso')
+
+
+@registry.register_collector
+def _log_metrics():
+    return [('log_records_dropped_total', 'counter', 'Registros de log descartados por cola llena', {(): dropped_records()})]
+
+
+def init_app(app):
+    """Mide cada request y expone GET /metrics"""
+    if MULTIPROC_DIR:
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+        threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+        atexit.register(_dump)
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_done = False
+        in_flight.inc()
+
+    def _observe(status):
+        start = g.get('metrics_start')
+        if start is None or g.get('metrics_done'):
+            return
+        g.metrics_done = True
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        request_duration.observe(time.perf_counter() - start, route=route, method=request.method, status=status)
+
+    @app.after_request
+    def _record_request(response):
+        _observe(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _finish_request(exc):
+        if g.get('metrics_start') is not None:
+            # Excepción sin manejar: after_request no corrió
+            _observe(500)
+            in_flight.dec()
+
+    @app.route('/metrics')
+    def metrics():
+        """
+        Métricas en formato de texto de Prometheus
+        ---
+        responses:
+          200:
+            description: Latencias por ruta, requests en curso, pool de BD, queries, Gemini y cachés
+        """
+        return Response(exposition(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """No hubo conexión libre dentro del tiempo de espera del pool"""
+
+
+class _Entry:
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        now = time.monotonic()
+        self.connection = connection
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones MySQL con tamaño fijo
+    - factory: función que crea una conexión nueva (o None si falla)
+    - size: máximo de conexiones abiertas al mismo tiempo
+    - timeout: segundos que se espera por una conexión libre
+    - recycle: segundos de vida máxima de una conexión antes de reemplazarla
+    - ping_after: segundos inactiva tras los cuales se hace ping antes de usarla
+    """
+
+    def __init__(self, factory, size=5, timeout=10.0, recycle=1800, ping_after=30):
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._entries = {}   # id(connection) -> _Entry de las que están prestadas
+        self._open = 0
+
+        # Contadores para dimensionar el pool
+        self._waiting = 0
+        self._created = 0
+        self._recycled = 0
+        self._timeouts = 0
+        self._checkouts = 0
+
+    def acquire(self):
+        """Presta una conexión sana; crea una si hay cupo o espera si no"""
+        deadline = time.monotonic() + self.timeout
+        entry = None
+
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._open < self.size:
+                        # Reservamos el cupo; la conexión se abre fuera del lock
+                        self._open += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f"Sin conexiones libres tras {self.timeout}s")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+        try:
+            entry = self._checkout(entry)
+        except Exception:
+            self._forget()
+            raise
+
+        with self._cond:
+            self._checkouts += 1
+            self._entries[id(entry.connection)] = entry
+        return entry.connection
+
+    def release(self, connection, discard=False):
+        """Devuelve la conexión al pool (o la descarta si está rota)"""
+        with self._cond:
+            entry = self._entries.pop(id(connection), None)
+        if entry is None:
+            return
+
+        if not discard:
+            try:
+                # Nunca devolver una transacción abierta al pool
+                if connection.in_transaction:
+                    connection.rollback()
+            except Exception:
+                discard = True
+
+        if discard:
+            self._close(connection)
+            self._forget()
+            return
+
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def stats(self):
+        """Estado actual del pool"""
+        with self._cond:
+            in_use = len(self._entries)
+            return {
+                'size': self.size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': in_use,
+                'waiting': self._waiting,
+                'created': self._created,
+                'recycled': self._recycled,
+                'timeouts': self._timeouts,
+                'checkouts': self._checkouts,
+            }
+
+    def close_all(self):
+        """Cierra las conexiones inactivas (las prestadas se cierran al devolverse)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for entry in idle:
+            self._close(entry.connection)
+
+    # -------------------------
+    #  Internos
+    # -------------------------
+    def _checkout(self, entry):
+        if entry is None:
+            return self._create()
+
+        now = time.monotonic()
+        if now - entry.created_at > self.recycle:
+            # Conexión vieja: se reemplaza antes de que el servidor la corte
+            self._close(entry.connection)
+            with self._cond:
+                self._recycled += 1
+            return self._create()
+
+        if now - entry.last_used > self.ping_after:
+            try:
+                entry.connection.ping(reconnect=False)
+            except Exception:
+                self._close(entry.connection)
+                with self._cond:
+                    self._recycled += 1
+                return self._create()
+        return entry
+
+    def _create(self):
+        connection = self._factory()
+        if connection is None:
+            raise ConnectionError("No se pudo abrir conexión a MySQL")
+        with self._cond:
+            self._created += 1
+        return _Entry(connection)
+
+    def _forget(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
@@ -0,0 +1,174 @@
+import logging
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from functools import lru_cache
+
+from config.metrics import registry
+from config.log import get_logger
+
+logger = get_logger('db.query')
+
+# Umbrales (ms y repeticiones por request)
+SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', '200'))
+REPEAT_THRESHOLD = int(os.getenv('DB_REPEAT_THRESHOLD', '5'))
+
+# Máximo de sentencias distintas en las estadísticas del proceso
+_MAX_STATEMENTS = 500
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_RE = re.compile(r'%s|%\(\w+\)s')
+_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_ROWS_RE = re.compile(r'(\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+')
+_CASE_RE = re.compile(r'(WHEN \? THEN \?)(?: WHEN \? THEN \?)+', re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def normalize_sql(query):
+    """
+    Texto del query sin valores: agrupa las ejecuciones de una misma sentencia
+    (espacios colapsados, literales y %s → ?, listas IN / VALUES / CASE de cualquier largo iguales)
+    """
+    sql = ' '.join(query.split())
+    sql = _STRING_RE.sub('?', sql)
+    sql = _PLACEHOLDER_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _LIST_RE.sub('(...)', sql)
+    sql = _ROWS_RE.sub(r'\1', sql)
+    sql = _CASE_RE.sub(r'\1 ...', sql)
+    return sql
+
+
+class RequestQueryLog:
+    """Sentencias ejecutadas durante un request (o un job): cuántas, cuánto tiempo y cuáles se repiten"""
+
+    __slots__ = ('count', 'total_ms', 'errors', 'statements')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.errors = 0
+        self.statements = {}   # sql normalizado -> veces
+
+    def add(self, sql, elapsed_ms, error):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.errors += 1 if error else 0
+        self.statements[sql] = self.statements.get(sql, 0) + 1
+
+    def repeated(self, threshold=None):
+        """[(sql, veces)] de las sentencias que se ejecutaron más de threshold veces (posible N+1)"""
+        threshold = REPEAT_THRESHOLD if threshold is None else threshold
+        return sorted(((sql, n) for sql, n in self.statements.items() if n > threshold), key=lambda x: -x[1])
+
+
+_current_log = ContextVar('db_query_log', default=None)
+
+
+def start_request_log():
+    """Empieza a contar las sentencias del contexto actual; regresa el token para end_request_log"""
+    log = RequestQueryLog()
+    return log, _current_log.set(log)
+
+
+def end_request_log(token):
+    _current_log.reset(token)
+
+
+def current_log():
+    return _current_log.get()
+
+
+class QueryStats:
+    """Acumulados por sentencia normalizada en todo el proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statements = {}   # sql -> [veces, total_ms, max_ms, filas, errores]
+        self._slow = 0
+        self._dropped = 0
+
+    def record(self, sql, elapsed_ms, rows, error):
+        with self._lock:
+            entry = self._statements.get(sql)
+            if entry is None:
+                if len(self._statements) >= _MAX_STATEMENTS:
+                    self._dropped += 1
+                    return
+                entry = self._statements[sql] = [0, 0.0, 0.0, 0, 0]
+            entry[0] += 1
+            entry[1] += elapsed_ms
+            entry[2] = max(entry[2], elapsed_ms)
+            entry[3] += rows or 0
+            entry[4] += 1 if error else 0
+            if elapsed_ms >= SLOW_QUERY_MS:
+                self._slow += 1
+
+    def snapshot(self, top=20):
+        """Las top sentencias por tiempo total"""
+        with self._lock:
+            items = [(sql, list(entry)) for sql, entry in self._statements.items()]
+            slow, dropped = self._slow, self._dropped
+        items.sort(key=lambda item: -item[1][1])
+        return {
+            'slow_queries': slow,
+            'slow_query_ms': SLOW_QUERY_MS,
+            'distinct_statements': len(items),
+            'dropped_statements': dropped,
+            'top': [
+                {
+                    'sql': sql,
+                    'calls': calls,
+                    'total_ms': round(total, 2),
+                    'avg_ms': round(total / calls, 2),
+                    'max_ms': round(worst, 2),
+                    'rows': rows,
+                    'errors': errors,
+                }
+                for sql, (calls, total, worst, rows, errors) in items[:top]
+            ],
+        }
+
+
+query_stats = QueryStats()
+
+query_duration = registry.histogram(
+    'db_query_duration_seconds', 'Latencia de las sentencias SQL por tipo', ('verb', 'outcome'))
+
+
+def record_query(query, elapsed_ms, rows=None, error=False):
+    """Registra una sentencia: estadísticas del proceso, log del request y slow-query log"""
+    sql = normalize_sql(query)
+    query_stats.record(sql, elapsed_ms, rows, error)
+    query_duration.observe(elapsed_ms / 1000, verb=sql.split(' ', 1)[0].upper(), outcome='error' if error else 'ok')
+    log = _current_log.get()
+    if log is not None:
+        log.add(sql, elapsed_ms, error)
+    extra = {'sql': sql, 'ms': round(elapsed_ms, 2), 'rows': rows, 'error': error}
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning('query lento', extra=extra)
+    elif logger.isEnabledFor(logging.DEBUG):
+        # Un registro por sentencia: se muestrea (LOG_DEBUG_SAMPLE)
+        logger.debug('query', extra=extra)
+
+
+class timed:
+    """Context manager que mide una sentencia; el llamador asigna .rows y .error"""
+
+    __slots__ = ('query', 'rows', 'error', '_start')
+
+    def __init__(self, query):
+        self.query = query
+        self.rows = None
+        self.error = False
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_query(self.query, (time.perf_counter() - self._start) * 1000, self.rows, self.error or exc_type is not None)
+        return False
@@ -0,0 +1,57 @@
+-- Esquema base que ya usan los blueprints (no-op en una base existente)
+CREATE TABLE IF NOT EXISTS users (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    username VARCHAR(50) NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    last_login_date DATE NULL
+);
+
+CREATE TABLE IF NOT EXISTS farm (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    ants_count INT NOT NULL DEFAULT 1,
+    leaves_count INT NOT NULL DEFAULT 0,
+    bonus_leaves_earned INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS category (
+    id INT PRIMARY KEY,
+    name VARCHAR(50) NOT NULL
+);
+
+INSERT IGNORE INTO category (id, name) VALUES
+    (1, 'food'),
+    (2, 'drinks'),
+    (3, 'subscriptions'),
+    (4, 'small_payment'),
+    (5, 'transport'),
+    (6, 'others');
+
+CREATE TABLE IF NOT EXISTS goal (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    category_id INT NOT NULL,
+    money DECIMAL(10, 2) NOT NULL DEFAULT 0.00
+);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    user_id INT NOT NULL,
+    category_id INT NOT NULL,
+    amount DECIMAL(10, 2) NOT NULL,
+    description VARCHAR(255) NULL,
+    date DATE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ants (
+    id_ant INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(50) NOT NULL
+);
+
+-- En una base nueva ya nace con llave primaria (sql_require_primary_key); en las existentes la agrega 0004
+CREATE TABLE IF NOT EXISTS ant_farm (
+    user_id INT NOT NULL,
+    id_ant INT NOT NULL,
+    cant INT NOT NULL DEFAULT 1,
+    PRIMARY KEY (user_id, id_ant)
+);
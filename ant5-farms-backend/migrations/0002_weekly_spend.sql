@@ -0,0 +1,17 @@
+-- Gasto semanal materializado por usuario / semana (lunes) / categoría
+-- Lo mantienen create_expense, analyze_and_create_expense, analyze_batch y delete_expense
+CREATE TABLE IF NOT EXISTS weekly_spend (
+    user_id INT NOT NULL,
+    week_start DATE NOT NULL,
+    category_id INT NOT NULL,
+    spent DECIMAL(12, 2) NOT NULL DEFAULT 0.00,
+    expense_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, week_start, category_id)
+);
+
+-- Carga inicial desde el histórico de gastos
+INSERT INTO weekly_spend (user_id, week_start, category_id, spent, expense_count)
+SELECT user_id, DATE_SUB(date, INTERVAL WEEKDAY(date) DAY), category_id, SUM(amount), COUNT(*)
+FROM expenses
+GROUP BY user_id, DATE_SUB(date, INTERVAL WEEKDAY(date) DAY), category_id
+ON DUPLICATE KEY UPDATE spent = VALUES(spent), expense_count = VALUES(expense_count);
@@ -0,0 +1,99 @@
+-- FKs para que las escrituras no tengan que validar usuario/categoría/hormiga con un SELECT
+-- Un INSERT con un padre inexistente falla con 1452 y la API responde 404 (config/db.py)
+-- Cada FK va en su propio ALTER y solo se crea si information_schema no la tiene: el DDL hace
+-- commit implícito, así que si algo falla a la mitad se puede reintentar sin quitar las ya creadas
+-- Las FK de ant_farm se crean en 0004, después de darle llave primaria
+
+-- Filas huérfanas (ej. de usuarios ya borrados) hacen fallar el ALTER. No se borran aquí:
+-- si hay, la migración se detiene y las cuenta por tabla (scripts.migrate). Revisarlas y,
+-- si de verdad sobran, borrarlas a mano antes de reintentar, por ejemplo:
+--   DELETE e FROM expenses e LEFT JOIN users u ON u.id = e.user_id WHERE u.id IS NULL;
+SELECT 'expenses.user_id' AS fk, COUNT(*) AS huerfanas
+FROM expenses e LEFT JOIN users u ON u.id = e.user_id WHERE u.id IS NULL HAVING COUNT(*) > 0
+UNION ALL
+SELECT 'expenses.category_id', COUNT(*)
+FROM expenses e LEFT JOIN category c ON c.id = e.category_id WHERE c.id IS NULL HAVING COUNT(*) > 0
+UNION ALL
+SELECT 'goal.user_id', COUNT(*)
+FROM goal g LEFT JOIN users u ON u.id = g.user_id WHERE u.id IS NULL HAVING COUNT(*) > 0
+UNION ALL
+SELECT 'goal.category_id', COUNT(*)
+FROM goal g LEFT JOIN category c ON c.id = g.category_id WHERE c.id IS NULL HAVING COUNT(*) > 0
+UNION ALL
+SELECT 'farm.user_id', COUNT(*)
+FROM farm f LEFT JOIN users u ON u.id = f.user_id WHERE u.id IS NULL HAVING COUNT(*) > 0
+UNION ALL
+SELECT 'ant_farm.user_id', COUNT(*)
+FROM ant_farm af LEFT JOIN users u ON u.id = af.user_id WHERE u.id IS NULL HAVING COUNT(*) > 0
+UNION ALL
+SELECT 'ant_farm.id_ant', COUNT(*)
+FROM ant_farm af LEFT JOIN ants a ON a.id_ant = af.id_ant WHERE a.id_ant IS NULL HAVING COUNT(*) > 0
+UNION ALL
+SELECT 'weekly_spend.user_id', COUNT(*)
+FROM weekly_spend ws LEFT JOIN users u ON u.id = ws.user_id WHERE u.id IS NULL HAVING COUNT(*) > 0;
+
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.table_constraints
+           WHERE constraint_schema = DATABASE() AND table_name = 'expenses'
+             AND constraint_name = 'fk_expenses_user'),
+    'DO 0',
+    'ALTER TABLE expenses ADD CONSTRAINT fk_expenses_user FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
+
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.table_constraints
+           WHERE constraint_schema = DATABASE() AND table_name = 'expenses'
+             AND constraint_name = 'fk_expenses_category'),
+    'DO 0',
+    'ALTER TABLE expenses ADD CONSTRAINT fk_expenses_category FOREIGN KEY (category_id) REFERENCES category (id)'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
+
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.table_constraints
+           WHERE constraint_schema = DATABASE() AND table_name = 'goal'
+             AND constraint_name = 'fk_goal_user'),
+    'DO 0',
+    'ALTER TABLE goal ADD CONSTRAINT fk_goal_user FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
+
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.table_constraints
+           WHERE constraint_schema = DATABASE() AND table_name = 'goal'
+             AND constraint_name = 'fk_goal_category'),
+    'DO 0',
+    'ALTER TABLE goal ADD CONSTRAINT fk_goal_category FOREIGN KEY (category_id) REFERENCES category (id)'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
+
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.table_constraints
+           WHERE constraint_schema = DATABASE() AND table_name = 'farm'
+             AND constraint_name = 'fk_farm_user'),
+    'DO 0',
+    'ALTER TABLE farm ADD CONSTRAINT fk_farm_user FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
+
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.table_constraints
+           WHERE constraint_schema = DATABASE() AND table_name = 'weekly_spend'
+             AND constraint_name = 'fk_weekly_spend_user'),
+    'DO 0',
+    'ALTER TABLE weekly_spend ADD CONSTRAINT fk_weekly_spend_user FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
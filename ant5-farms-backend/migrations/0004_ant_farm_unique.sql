@@ -0,0 +1,63 @@
+-- Una fila por (usuario, tipo de hormiga) para que add_ant y el otorgamiento en lote
+-- puedan hacer INSERT ... ON DUPLICATE KEY UPDATE cant = cant + n
+-- Primero se juntan las filas repetidas que dejaban las inserciones concurrentes
+-- (user_id, id_ant) queda como llave primaria: ant_farm no tenía, y con sql_require_primary_key=ON
+-- (ej. MySQL administrado) no se puede crear ni alterar una tabla sin ella
+-- Se puede reintentar: la tabla temporal se recrea y los ALTER revisan information_schema antes
+
+DROP TEMPORARY TABLE IF EXISTS ant_farm_merged;
+
+CREATE TEMPORARY TABLE ant_farm_merged (
+    user_id INT NOT NULL,
+    id_ant INT NOT NULL,
+    cant INT NOT NULL,
+    PRIMARY KEY (user_id, id_ant)
+);
+
+INSERT INTO ant_farm_merged (user_id, id_ant, cant)
+SELECT user_id, id_ant, SUM(cant)
+FROM ant_farm
+GROUP BY user_id, id_ant
+HAVING COUNT(*) > 1;
+
+DELETE af FROM ant_farm af
+JOIN ant_farm_merged m ON m.user_id = af.user_id AND m.id_ant = af.id_ant;
+
+INSERT INTO ant_farm (user_id, id_ant, cant)
+SELECT user_id, id_ant, cant FROM ant_farm_merged;
+
+DROP TEMPORARY TABLE ant_farm_merged;
+
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.statistics
+           WHERE table_schema = DATABASE() AND table_name = 'ant_farm' AND index_name = 'PRIMARY'),
+    'DO 0',
+    'ALTER TABLE ant_farm ADD PRIMARY KEY (user_id, id_ant)'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
+
+-- Las FK de ant_farm van aquí y no en 0003: antes de la llave primaria el ALTER falla con
+-- sql_require_primary_key=ON. Como en 0003, cada una solo se crea si todavía no existe (reintentos)
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.table_constraints
+           WHERE constraint_schema = DATABASE() AND table_name = 'ant_farm'
+             AND constraint_name = 'fk_ant_farm_user'),
+    'DO 0',
+    'ALTER TABLE ant_farm ADD CONSTRAINT fk_ant_farm_user FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
+
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.table_constraints
+           WHERE constraint_schema = DATABASE() AND table_name = 'ant_farm'
+             AND constraint_name = 'fk_ant_farm_ant'),
+    'DO 0',
+    'ALTER TABLE ant_farm ADD CONSTRAINT fk_ant_farm_ant FOREIGN KEY (id_ant) REFERENCES ants (id_ant)'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
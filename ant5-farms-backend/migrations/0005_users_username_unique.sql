@@ -0,0 +1,13 @@
+-- Registro sin SELECT previo: el índice único rechaza el username repetido (1062 → 409)
+-- Si falla por duplicados existentes, revisarlos antes con:
+--   SELECT username, COUNT(*) FROM users GROUP BY username HAVING COUNT(*) > 1;
+-- MySQL no tiene ADD INDEX IF NOT EXISTS: el ALTER solo corre si el índice aún no existe
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.statistics
+           WHERE table_schema = DATABASE() AND table_name = 'users' AND index_name = 'uq_users_username'),
+    'DO 0',
+    'ALTER TABLE users ADD UNIQUE KEY uq_users_username (username)'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
@@ -0,0 +1,36 @@
+-- Índices para los filtros de los queries calientes
+-- - expenses: WHERE user_id = ? AND date BETWEEN ? AND ? (gastos de la semana, dashboard)
+-- - goal: WHERE user_id = ? AND category_id = ? / IN (...) (resumen semanal, metas en lote)
+-- ant_farm (user_id, id_ant) y users (username) ya son únicos desde 0004 y 0005
+-- Las FK de 0003 pueden usar estos índices en lugar de los que MySQL creó solo para ellas
+-- Cada ALTER revisa information_schema antes (se puede reintentar)
+
+-- Una meta por (usuario, categoría). Las repetidas no se borran aquí: si hay, la migración se
+-- detiene y lista los pares (scripts.migrate). Revisarlas y, para conservar la más antigua, correr
+-- a mano antes de reintentar:
+--   DELETE g FROM goal g JOIN goal older ON older.user_id = g.user_id
+--       AND older.category_id = g.category_id AND older.id < g.id;
+SELECT user_id, category_id, COUNT(*) AS metas, GROUP_CONCAT(id ORDER BY id) AS ids
+FROM goal
+GROUP BY user_id, category_id
+HAVING COUNT(*) > 1;
+
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.statistics
+           WHERE table_schema = DATABASE() AND table_name = 'expenses' AND index_name = 'ix_expenses_user_date'),
+    'DO 0',
+    'ALTER TABLE expenses ADD INDEX ix_expenses_user_date (user_id, date)'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
+
+SET @ddl = IF(
+    EXISTS(SELECT 1 FROM information_schema.statistics
+           WHERE table_schema = DATABASE() AND table_name = 'goal' AND index_name = 'uq_goal_user_category'),
+    'DO 0',
+    'ALTER TABLE goal ADD UNIQUE KEY uq_goal_user_category (user_id, category_id)'
+);
+PREPARE ddl FROM @ddl;
+EXECUTE ddl;
+DEALLOCATE PREPARE ddl;
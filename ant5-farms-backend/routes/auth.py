@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
-from config.db import execute_query
+from config.db import current_session, execute_query
+from mysql.connector import IntegrityError
+from services.leaves_buffer import get_leaves_buffer
 from datetime import date
 
 auth_bp = Blueprint('auth', __name__)
@@ -63,8 +65,16 @@ def login():
     if not username or not password:
         return jsonify({'success': False, 'message': 'Username and password are required'}), 400
     
-    # Buscar usuario
-    query = "SELECT * FROM users WHERE username = %s AND password = %s"
+    # Buscar usuario junto con su granja y el total de hormigas (1 round trip)
+    query = """
+        SELECT u.id, u.last_login_date, f.bonus_leaves_earned,
+               (SELECT COALESCE(SUM(af.cant), 0)
+                FROM ant_farm af
+                WHERE af.user_id = u.id) AS ants_count
+        FROM users u
+        LEFT JOIN farm f ON f.user_id = u.id
+        WHERE u.username = %s AND u.password = %s
+    """
     user = execute_query(query, (username, password), fetch=True)
     
     if not user:
@@ -78,49 +88,36 @@ def login():
     # Variables para la respuesta
     leaves_earned_today = 0
 
-    # Sumar cantidad total de hormigas del usuario
-    query_ants = """
-        SELECT COALESCE(SUM(cant), 0) AS ants_count
-        FROM ant_farm
-        WHERE user_id = %s
-    """
-    ants_data = execute_query(query_ants, (user_id,), fetch=True)
-    ants_count = ants_data[0]['ants_count'] if ants_data else 0
-    ants_count = ants_count * 2
     # ===== NUEVA LÓGICA: Bonus por día único =====
     if last_login is None or last_login != today:
         # Es un día diferente (o primer login ever)
-        todayyyy = False
-        # Obtener la granja actual
-        query_farm = "SELECT bonus_leaves_earned, leaves_count FROM farm WHERE user_id = %s"
-        farm = execute_query(query_farm, (user_id,), fetch=True)
-        
-        if farm:
-            current_bonus_leaves = farm[0]['bonus_leaves_earned']
-            
-            # El bonus incrementa: día 1 = 1 hoja, día 2 = 2 hojas, etc.
-            new_bonus_leaves = current_bonus_leaves + 1
-            leaves_earned_today = new_bonus_leaves + ants_count
-            
-            # Actualizar la granja
-            update_farm = """
-                UPDATE farm 
-                SET bonus_leaves_earned = %s,
-                    leaves_count = leaves_count + %s
-                WHERE user_id = %s
-            """
-            execute_query(update_farm, (new_bonus_leaves, leaves_earned_today, user_id))
-        
-        # Actualizar último login
-        update_user = "UPDATE users SET last_login_date = %s WHERE id = %s"
-        execute_query(update_user, (today, user_id))
-    else:
-        # Ya hizo login hoy - no dar hojas
-        leaves_earned_today = 0
-    
-    # Obtener datos actualizados de la granja
-    query_farm = "SELECT * FROM farm WHERE user_id = %s"
-    farm_data = execute_query(query_farm, (user_id,), fetch=True)
+        # El bonus incrementa: día 1 = 1 hoja, día 2 = 2 hojas, etc. + 2 hojas por hormiga
+        if user['bonus_leaves_earned'] is not None:
+            leaves_earned_today = user['bonus_leaves_earned'] + 1 + int(user['ants_count']) * 2
+
+        # Un solo UPDATE atómico condicionado a last_login_date:
+        # si dos logins compiten, el segundo ya no cumple el WHERE y no cobra doble bonus
+        update_login = """
+            UPDATE users u
+            LEFT JOIN farm f ON f.user_id = u.id
+            SET u.last_login_date = %s,
+                f.bonus_leaves_earned = f.bonus_leaves_earned + 1,
+                f.leaves_count = f.leaves_count + %s
+            WHERE u.id = %s
+              AND (u.last_login_date IS NULL OR u.last_login_date <> %s)
+        """
+        updated = execute_query(update_login, (today, leaves_earned_today, user_id, today), rowcount=True)
+
+        if updated:
+            todayyyy = False
+            # El bonus cambió leaves_count por fuera del write-behind: releer el saldo, pero ya
+            # confirmado (antes del commit otro request recargaría el saldo viejo)
+            buffer = get_leaves_buffer()
+            if buffer is not None:
+                current_session().after_commit(lambda: buffer.forget(user_id))
+        else:
+            # Otro login de hoy ganó la carrera - no dar hojas
+            leaves_earned_today = 0
     
     return jsonify({
         'success': True,
@@ -165,17 +162,20 @@ def register():
     if not username or not password:
         return jsonify({'success': False, 'message': 'Username y password requeridos'}), 400
     
-    # Verificar si el usuario ya existe
-    check_query = "SELECT id FROM users WHERE username = %s"
-    existing_user = execute_query(check_query, (username,), fetch=True)
-    
-    if existing_user:
-        return jsonify({'success': False, 'message': 'Usuario ya existe'}), 409
-    
-    # Crear usuario
+    # Crear usuario: el índice único de username (migración 0005) decide los choques,
+    # así dos registros simultáneos del mismo nombre no pueden pasar ambos
     insert_user = "INSERT INTO users (username, password, last_login_date) VALUES (%s, %s, NULL)"
-    user_id = execute_query(insert_user, (username, password))
+    try:
+        user_id = execute_query(insert_user, (username, password))
+    except IntegrityError as e:
+        if e.errno == 1062:
+            return jsonify({'success': False, 'message': 'Usuario ya existe'}), 409
+        raise
+    if not user_id:
+        return jsonify({'success': False, 'message': 'Error registrando usuario'}), 500
     
+    # Granja y metas en la misma transacción del request: si algo falla no queda
+    # un usuario sin granja o sin metas
     # Crear granja (sin current_streak, bonus_leaves_earned inicia en 0)
     insert_farm = "INSERT INTO farm (user_id, ants_count, leaves_count, bonus_leaves_earned) VALUES (%s, 1, 0, 0)"
     execute_query(insert_farm, (user_id,))
@@ -0,0 +1,73 @@
+import hashlib
+import json
+
+from flask import Blueprint, request, jsonify
+from routes.expenses import weekly_summary
+from routes.farm import farm_snapshot
+from routes.goals import user_goals
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+@dashboard_bp.route('/<int:user_id>', methods=['GET'])
+def get_dashboard(user_id):
+    """
+    Pantalla de inicio en una sola llamada: granja, metas y resumen semanal
+    ---
+    tags:
+      - Dashboard
+    parameters:
+      - in: path
+        name: user_id
+        type: integer
+        required: true
+        description: ID del usuario
+        example: 1
+      - in: header
+        name: If-None-Match
+        type: string
+        required: false
+        description: ETag de una respuesta anterior; si nada cambió se responde 304 sin cuerpo
+    responses:
+      200:
+        description: Mismo contenido que /api/farm, /api/goals y /api/expenses/summary juntos
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            farm:
+              type: object
+              description: Igual que GET /api/farm/<user_id>
+            goals:
+              type: array
+              description: Igual que goals de GET /api/goals/<user_id>
+              items:
+                type: object
+            summary:
+              type: object
+              description: Igual que GET /api/expenses/summary/<user_id> (sin success)
+      304:
+        description: Sin cambios desde el ETag enviado
+      404:
+        description: Granja no encontrada
+    """
+    # Los tres leen de la sesión del request: una conexión del pool y una transacción.
+    # Una conexión de MySQL no ejecuta queries en paralelo, así que van en serie
+    # (todas son búsquedas por llave del usuario)
+    farm = farm_snapshot(user_id)
+    if farm is None:
+        return jsonify({'success': False, 'message': 'Granja no encontrada'}), 404
+
+    payload = {
+        'success': True,
+        'farm': farm,
+        'goals': user_goals(user_id),
+        'summary': weekly_summary(user_id),
+    }
+
+    response = jsonify(payload)
+    # ETag del contenido: la app revalida al abrir y recibe 304 si nada cambió
+    body = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    response.set_etag(hashlib.sha256(body).hexdigest()[:32])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
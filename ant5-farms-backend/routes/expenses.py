@@ -1,24 +1,25 @@
-from flask import Blueprint, request, jsonify
-from flask import Blueprint, request, jsonify
-from config.db import execute_query
+from flask import Blueprint, request, jsonify, url_for
+from config.db import execute_query, execute_many, release_session, transaction, describe_integrity_error
+from mysql.connector import IntegrityError
+from services.receipt_jobs import ReceiptJobQueue, QueueFull
+from services.receipt_cache import ReceiptCache
+from services.receipt_preprocess import ImagePreprocessor
+from services.receipts import ReceiptError, usage_stats
+from services.analyzers import get_analyzer
+from services import weekly_spend
+from services.reference_data import get_reference_data
+from config.metrics import registry
+from config.log import with_request_id
 from datetime import date, datetime, timedelta
 import os
-import json
-import re
-from pathlib import Path
-from google import genai
-from google.genai import types
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Cargar variables del archivo .env
 load_dotenv()
 
-# Leer la API key del entorno
-api_key = os.environ.get('GENAI_API_KEY')
-
-# Crear el cliente de Gemini
-client = genai.Client(api_key=api_key)
-
 # =========================
 #  Blueprint
 # =========================
@@ -34,81 +35,157 @@ def week_bounds(target_date=None):
     sunday = monday + timedelta(days=6)
     return monday, sunday
 
-def _strip_markdown_fences(s: str) -> str:
-    s = (s or "").strip()
-    if s.startswith("```"):
-        lines = s.splitlines()
-        if lines and lines[0].lstrip().startswith("```"):
-            lines = lines[1:]
-        for i, line in enumerate(lines):
-            if line.strip().startswith("```"):
-                lines = lines[:i]
-                break
-        s = "\n".join(lines).strip()
-    return s
-
-def _try_parse_json(s: str):
-    # 1) Directo
+_receipt_cache = None
+_receipt_cache_lock = threading.Lock()
+
+def get_receipt_cache():
+    """
+    Caché de análisis por hash de imagen (se crea al primer uso)
+    Configurable con RECEIPT_CACHE_SIZE, RECEIPT_CACHE_DIR, RECEIPT_CACHE_TTL y RECEIPT_CACHE_MAX_BYTES
+    """
+    global _receipt_cache
+    if _receipt_cache is None:
+        with _receipt_cache_lock:
+            if _receipt_cache is None:
+                default_dir = os.path.join(tempfile.gettempdir(), 'ant5-receipt-cache')
+                _receipt_cache = ReceiptCache(
+                    max_items=int(os.getenv('RECEIPT_CACHE_SIZE', '256')),
+                    disk_dir=os.getenv('RECEIPT_CACHE_DIR', default_dir) or None,
+                    ttl=int(os.getenv('RECEIPT_CACHE_TTL', str(7 * 24 * 3600))),
+                    max_disk_bytes=int(os.getenv('RECEIPT_CACHE_MAX_BYTES', str(50 * 1024 * 1024))),
+                )
+    return _receipt_cache
+
+
+_preprocessor = None
+_preprocessor_lock = threading.Lock()
+
+def get_preprocessor():
+    """
+    Preprocesado de imágenes antes del modelo (se crea al primer uso)
+    Configurable con RECEIPT_PREPROCESS (0 lo apaga), RECEIPT_MAX_DIM, RECEIPT_JPEG_QUALITY,
+    RECEIPT_GRAYSCALE, RECEIPT_PREPROCESS_WORKERS y RECEIPT_UPLINK_KBPS
+    """
+    global _preprocessor
+    if _preprocessor is None:
+        with _preprocessor_lock:
+            if _preprocessor is None:
+                _preprocessor = ImagePreprocessor(
+                    max_dim=int(os.getenv('RECEIPT_MAX_DIM', '1600')),
+                    quality=int(os.getenv('RECEIPT_JPEG_QUALITY', '80')),
+                    grayscale=os.getenv('RECEIPT_GRAYSCALE', '1') == '1',
+                    workers=int(os.getenv('RECEIPT_PREPROCESS_WORKERS', '2')),
+                    uplink_kbps=float(os.getenv('RECEIPT_UPLINK_KBPS', '1000')),
+                )
+                _preprocessor.enabled = _preprocessor.enabled and os.getenv('RECEIPT_PREPROCESS', '1') == '1'
+    return _preprocessor
+
+
+def analyze_receipt(image_bytes, mime_type):
+    """
+    Análisis de un recibo: si la misma imagen ya se analizó con este backend y prompt, no se llama al modelo
+    El backend (Gemini o el fake local) se elige con RECEIPT_ANALYZER
+    Regresa dict con store, amount, category_id, category_name (lanza ReceiptError)
+    """
+    analyzer = get_analyzer()
+    cache = get_receipt_cache()
+    key = ReceiptCache.make_key(image_bytes, analyzer.version)
+    receipt = cache.get(key)
+    if receipt is None:
+        # La llave usa los bytes originales; solo se preprocesa si hay que llamar al modelo
+        image_bytes, mime_type = get_preprocessor().process(image_bytes, mime_type)
+        receipt = analyzer.analyze(image_bytes, mime_type)
+        cache.put(key, receipt)
+    return receipt
+
+
+def save_analyzed_expense(user_id, receipt):
+    """Inserta el gasto analizado y lo regresa con nombre de categoría → (expense_id, expense)"""
+    cid, cname = receipt['category_id'], receipt['category_name']
+    store, amount = receipt['store'], receipt['amount']
+
+    # Fecha SIEMPRE = fecha de subida (hoy)
+    receipt_date = date.today()
+
+    # Validar categoría exista (catálogo en memoria)
+    if get_reference_data().category_name(cid) is None:
+        cid, cname = 6, 'others'
+
+    # Insertar en BD
+    insert_q = """
+        INSERT INTO expenses (user_id, category_id, amount, description, date)
+        VALUES (%s, %s, %s, %s, %s)
+    """
     try:
-        return json.loads(s)
-    except Exception:
-        pass
-    # 2) Quitando fences
-    s2 = _strip_markdown_fences(s)
+        # Un usuario inexistente lo rechaza la FK (sin SELECT previo)
+        expense_id = execute_query(insert_q, (user_id, cid, amount, store, receipt_date))
+    except IntegrityError as e:
+        raise ReceiptError(*describe_integrity_error(e))
+    if not expense_id or not weekly_spend.add_expense(user_id, cid, amount, receipt_date):
+        raise ReceiptError('Error guardando el gasto', 500)
+
+    # Recuperar expense con nombre de categoría
+    sel_q = """
+        SELECT e.id, e.user_id, e.category_id, c.name AS category_name,
+               e.amount, e.description, e.date
+        FROM expenses e
+        LEFT JOIN category c ON c.id = e.category_id
+        WHERE e.id = %s
+    """
+    rows = execute_query(sel_q, (expense_id,), fetch=True) or []
+    expense = rows[0] if rows else {
+        'id': expense_id, 'user_id': user_id, 'category_id': cid,
+        'category_name': cname, 'amount': float(amount),
+        'description': store, 'date': str(receipt_date)
+    }
+    return expense_id, expense
+
+
+def process_receipt(user_id, image_bytes, mime_type, analyzer=None):
+    """
+    Pipeline completo de un recibo: análisis + inserción → (body, http_status)
+    - analyzer: función (image_bytes, mime_type) -> dict; por defecto analyze_receipt
+      (caché + el backend de get_analyzer(), elegido con RECEIPT_ANALYZER)
+    """
     try:
-        return json.loads(s2)
-    except Exception:
-        pass
-    # 3) Extraer bloque { ... }
-    start = s2.find("{")
-    end = s2.rfind("}")
-    if start != -1 and end != -1 and end > start:
-        candidate = s2[start:end+1]
-        return json.loads(candidate)
-    raise ValueError("No se pudo parsear JSON de Gemini.")
-
-CAT_MAP = {
-    1: "food",
-    2: "drinks",
-    3: "subscriptions",
-    4: "small_payment",
-    5: "transport",
-    6: "others",
-}
-NAME_TO_ID = {v: k for k, v in CAT_MAP.items()}
-
-# Prompt: fecha NO se toma del ticket; el backend fija date = fecha de subida (hoy)
-GEMINI_PROMPT = (
-    "LEE LA IMAGEN DEL RECIBO Y DEVUELVE EXCLUSIVAMENTE UN JSON VÁLIDO (sin texto adicional, sin markdown, sin comentarios).\n\n"
-    "El recibo completo representa UN solo gasto. Si la imagen está dañada o ilegible, debes devolver un objeto de error.\n\n"
-    "Formato requerido:\n"
-    "{\n"
-    "  \"store\": string,              // nombre del comercio o 'unidentified' si no se puede leer\n"
-    "  \"date\": string,               // SIEMPRE en formato YYYY-MM-DD, representando la FECHA DE SUBIDA (NO LEAS la fecha impresa en el ticket)\n"
-    "  \"amount\": number,             // monto total del ticket (si no aparece o es ambiguo, marcar error)\n"
-    "  \"category_id\": number,        // 1..6\n"
-    "  \"category_name\": string,      // 'food','drinks','subscriptions','small_payment','transport','others'\n"
-    "  \"error\": string|null          // describe error si no se pudo analizar correctamente\n"
-    "}\n\n"
-    "Reglas:\n"
-    "- Si no hay tienda visible, usa \"store\": \"unidentified\".\n"
-    "- NO LEAS la fecha impresa del ticket; la fecha corresponde al momento de SUBIDA (el sistema del cliente la fijará).\n"
-    "- Si no hay total claro o el recibo es ilegible, devuelve un JSON con:\n"
-    "  {\"error\": \"total_not_found\"} o {\"error\": \"unreadable_image\"} según el caso.\n"
-    "- Si no hay categoría clara, usa id=6 y name='others'.\n"
-    "- Clasificación de categoría:\n"
-    "   1. food            → comida, restaurantes, supermercado, comida rápida\n"
-    "   2. drinks          → café, bebidas, jugos, bares\n"
-    "   3. subscriptions   → Netflix, Spotify, servicios digitales\n"
-    "   4. small_payment   → propinas, comisiones pequeñas, micro pagos\n"
-    "   5. transport       → Uber, gasolina, transporte público, estacionamientos\n"
-    "   6. others          → todo lo demás o ambiguo\n\n"
-    "Si el ticket parece mezcla (ej. OXXO con comida y bebidas), aplica predominio:\n"
-    "- Si no hay predominio claro, usa food (1) por defecto, salvo que sea casi puro bebidas → drinks (2).\n\n"
-    "IMPORTANTE:\n"
-    "- DEVUELVE SOLO EL JSON SIN ``` NI TEXTO EXTRA.\n"
-    "- Usa punto decimal en los montos.\n"
-)
+        receipt = (analyzer or analyze_receipt)(image_bytes, mime_type)
+        expense_id, expense = save_analyzed_expense(user_id, receipt)
+    except ReceiptError as e:
+        return e.to_body(), e.status
+
+    return {
+        'success': True,
+        'message': 'Recibo analizado y gasto creado',
+        'expense_id': expense_id,
+        'expense': expense
+    }, 201
+
+
+def _run_receipt_job(user_id, image_bytes, mime_type):
+    # Fuera del request: el job abre su propia transacción
+    with transaction():
+        return process_receipt(user_id, image_bytes, mime_type)
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue():
+    """
+    Cola de análisis en segundo plano (se crea al primer uso)
+    Configurable con RECEIPT_JOB_WORKERS, RECEIPT_JOB_MAX_PENDING y RECEIPT_JOB_TTL
+    """
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                _job_queue = ReceiptJobQueue(
+                    _run_receipt_job,
+                    workers=int(os.getenv('RECEIPT_JOB_WORKERS', '2')),
+                    max_pending=int(os.getenv('RECEIPT_JOB_MAX_PENDING', '20')),
+                    ttl=int(os.getenv('RECEIPT_JOB_TTL', '600')),
+                )
+    return _job_queue
 
 # =========================
 #  Endpoints
@@ -164,18 +241,19 @@ def create_expense():
     if not all([user_id, category_id, amount]):
         return jsonify({'success': False, 'message': 'Faltan datos requeridos'}), 400
 
+    try:
+        amount = float(amount)
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': 'amount no numérico'}), 400
+
     # Parsear fecha
     try:
         expense_date = datetime.strptime(date_str, '%Y-%m-%d').date() if date_str else date.today()
     except Exception:
         return jsonify({'success': False, 'message': 'Formato de fecha inválido (YYYY-MM-DD)'}), 400
 
-    # Validar usuario
-    if not execute_query("SELECT id FROM users WHERE id=%s", (user_id,), fetch=True):
-        return jsonify({'success': False, 'message': 'Usuario no existe'}), 404
-
     # Validar categoría
-    if not execute_query("SELECT id FROM category WHERE id=%s", (category_id,), fetch=True):
+    if get_reference_data().category_name(category_id) is None:
         return jsonify({'success': False, 'message': 'Categoría no existe'}), 404
 
     # Insertar gasto
@@ -185,6 +263,9 @@ def create_expense():
     """
     expense_id = execute_query(query, (user_id, category_id, amount, description, expense_date))
 
+    # Mismo commit que el gasto: el resumen semanal nunca queda desfasado
+    weekly_spend.add_expense(user_id, category_id, amount, expense_date)
+
     return jsonify({'success': True, 'expense_id': expense_id}), 201
 
 
@@ -209,6 +290,12 @@ def analyze_and_create_expense():
         type: file
         required: true
         description: Imagen del recibo (JPG o PNG)
+      - in: query
+        name: mode
+        type: string
+        required: false
+        description: "async para encolar el análisis y responder 202 con job_id"
+        example: async
     responses:
       201:
         description: Recibo analizado y gasto creado
@@ -233,10 +320,14 @@ def analyze_and_create_expense():
                 date: {type: string, format: date}
       400:
         description: Petición inválida (falta user_id, imagen o amount no detectado)
+      202:
+        description: Análisis encolado (mode=async); consultar /api/expenses/jobs/<job_id>
       404:
         description: Usuario no existe
       502:
         description: Error llamando a Gemini
+      503:
+        description: Cola de análisis llena (mode=async)
     """
     # Validaciones de entrada
     user_id = request.form.get('user_id', type=int)
@@ -249,103 +340,294 @@ def analyze_and_create_expense():
     if not image_file or image_file.filename == '':
         return jsonify({'success': False, 'message': 'Imagen vacía'}), 400
 
-    # Validar usuario existe
-    if not execute_query("SELECT id FROM users WHERE id=%s", (user_id,), fetch=True):
-        return jsonify({'success': False, 'message': 'Usuario no existe'}), 404
-
     # Bytes e inferencia de mime
     image_bytes = image_file.read()
     mime_type = image_file.content_type or 'image/jpeg'
 
-    # Llamada a Gemini
-    try:
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=[
-                types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
-                GEMINI_PROMPT
-            ],
-            # generation_config={"temperature": 0.2}  # si tu SDK lo permite
-        )
-    except Exception as e:
-        return jsonify({'success': False, 'message': 'Error llamando a Gemini', 'error': str(e)}), 502
+    # No retener la conexión del pool mientras Gemini responde
+    release_session()
 
-    # Parseo de salida (limpieza de fences)
-    text = getattr(response, 'text', str(response)).strip()
-    try:
-        data = _try_parse_json(text)
-    except Exception as e:
+    # Modo job: responder 202 de inmediato y analizar en segundo plano
+    if request.args.get('mode') == 'async':
+        try:
+            job = get_job_queue().submit(user_id=user_id, image_bytes=image_bytes, mime_type=mime_type)
+        except QueueFull as e:
+            return jsonify({'success': False, 'message': 'Demasiados recibos en proceso, intenta más tarde', 'error': str(e)}), 503
         return jsonify({
-            'success': False,
-            'message': 'Respuesta de Gemini no es JSON parseable',
-            'error': str(e),
-            'raw': text[:500]
-        }), 400
+            'success': True,
+            'job_id': job['id'],
+            'status': job['status'],
+            'status_url': url_for('expenses.get_receipt_job', job_id=job['id'])
+        }), 202
 
-    # Checa error explícito del modelo
-    if isinstance(data, dict) and data.get('error'):
-        return jsonify({'success': False, 'message': f"Gemini error: {data['error']}"}), 400
+    body, status = process_receipt(user_id, image_bytes, mime_type)
+    return jsonify(body), status
 
-    # Campos mínimos (store puede ser vacío → se normaliza; date la fija backend)
-    if 'amount' not in data:
-        return jsonify({'success': False, 'message': 'No se detectó amount'}), 400
 
-    # Normalizaciones
-    store = data.get('store') or 'unidentified'
+@expenses_bp.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    Analiza varios recibos en una sola petición y crea todos los gastos
+    ---
+    tags:
+      - Expenses
+    consumes:
+      - multipart/form-data
+    parameters:
+      - in: formData
+        name: user_id
+        type: integer
+        required: true
+        description: ID del usuario dueño de los gastos
+        example: 1
+      - in: formData
+        name: images
+        type: file
+        required: true
+        description: Imágenes de los recibos (repetir el campo por cada imagen)
+    responses:
+      201:
+        description: Todos los recibos analizados y gastos creados
+      207:
+        description: Algunos recibos fallaron; ver results por imagen
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            created:
+              type: integer
+            failed:
+              type: integer
+            results:
+              type: array
+              items:
+                type: object
+                properties:
+                  index: {type: integer}
+                  filename: {type: string}
+                  success: {type: boolean}
+                  status: {type: integer}
+                  expense_id: {type: integer}
+                  expense: {type: object}
+                  message: {type: string}
+      400:
+        description: Petición inválida o ningún recibo se pudo analizar
+      404:
+        description: Usuario no existe
+    """
+    user_id = request.form.get('user_id', type=int)
+    if not user_id:
+        return jsonify({'success': False, 'message': 'user_id requerido'}), 400
+
+    images = [f for f in request.files.getlist('images') if f and f.filename]
+    if not images:
+        return jsonify({'success': False, 'message': 'Al menos una imagen requerida'}), 400
+    max_images = int(os.getenv('RECEIPT_BATCH_MAX', '20'))
+    if len(images) > max_images:
+        return jsonify({'success': False, 'message': f'Máximo {max_images} imágenes por petición'}), 400
+
+    uploads = [(f.filename, f.read(), f.content_type or 'image/jpeg') for f in images]
+
+    # No retener la conexión del pool mientras Gemini responde
+    release_session()
+
+    # Análisis concurrente: la petición tarda lo que el recibo más lento, no la suma
+    concurrency = max(1, min(int(os.getenv('RECEIPT_BATCH_CONCURRENCY', '4')), len(uploads)))
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='receipt-batch') as executor:
+        outcomes = list(executor.map(with_request_id(_analyze_safely), [(data, mime) for _, data, mime in uploads]))
+
+    results = [None] * len(uploads)
+    pending = []
+    for index, ((filename, _, _), outcome) in enumerate(zip(uploads, outcomes)):
+        if isinstance(outcome, ReceiptError):
+            results[index] = {'index': index, 'filename': filename, 'status': outcome.status, **outcome.to_body()}
+        else:
+            pending.append((index, filename, outcome))
+
+    if pending:
+        receipt_date = date.today()
+        valid_ids = set(get_reference_data().categories())
+        rows = []
+        for _, _, receipt in pending:
+            if receipt['category_id'] not in valid_ids:
+                receipt.update(category_id=6, category_name='others')
+            rows.append((user_id, receipt['category_id'], receipt['amount'], receipt['store'], receipt_date))
+
+        # Un solo INSERT multi-fila para todos los gastos del lote
+        insert_q = """
+            INSERT INTO expenses (user_id, category_id, amount, description, date)
+            VALUES (%s, %s, %s, %s, %s)
+        """
+        first_id = execute_many(insert_q, rows)
+        if not first_id or not weekly_spend.add_expenses([(u, c, a, d) for u, c, a, _, d in rows]):
+            return jsonify({'success': False, 'message': 'Error guardando los gastos'}), 500
+
+        # IDs reales del lote: con auto_increment_increment > 1 no son first_id + 1, + 2...
+        # El INSERT recibe un bloque propio a partir de first_id, así que sus filas son las primeras
+        # del usuario desde ahí; se confirman contra categoría y monto antes de reportarlas
+        ids_q = """
+            SELECT id, category_id, amount
+            FROM expenses
+            WHERE user_id = %s AND id >= %s
+            ORDER BY id
+            LIMIT %s
+        """
+        inserted = execute_query(ids_q, (user_id, first_id, len(rows)), fetch=True) or []
+        if len(inserted) != len(rows) or any(
+            r['category_id'] != c or round(float(r['amount']), 2) != round(float(a), 2)
+            for r, (_, c, a, _, _) in zip(inserted, rows)
+        ):
+            return jsonify({'success': False, 'message': 'Error guardando los gastos'}), 500
+
+        for (index, filename, receipt), row in zip(pending, inserted):
+            expense_id = row['id']
+            results[index] = {
+                'index': index,
+                'filename': filename,
+                'success': True,
+                'status': 201,
+                'expense_id': expense_id,
+                'expense': {
+                    'id': expense_id, 'user_id': user_id,
+                    'category_id': receipt['category_id'], 'category_name': receipt['category_name'],
+                    'amount': receipt['amount'], 'description': receipt['store'],
+                    'date': str(receipt_date)
+                }
+            }
+
+    created = len(pending)
+    failed = len(uploads) - created
+    status = 201 if not failed else (207 if created else 400)
+    return jsonify({
+        'success': created > 0,
+        'created': created,
+        'failed': failed,
+        'results': results
+    }), status
 
-    # Fecha SIEMPRE = fecha de subida (hoy)
-    receipt_date = date.today()
 
-    # amount: float positivo
+def _analyze_safely(args):
+    # Para executor.map: un recibo fallido no tumba el lote
     try:
-        amount = round(float(data.get('amount')), 2)
-        if amount <= 0:
-            return jsonify({'success': False, 'message': 'amount debe ser > 0'}), 400
-    except Exception:
-        return jsonify({'success': False, 'message': 'amount no numérico'}), 400
+        return dict(analyze_receipt(*args))
+    except ReceiptError as e:
+        return e
+    except Exception as e:
+        return ReceiptError('Error procesando recibo', 500, error=str(e))
 
-    # Categoría coherente, con fallback a others(6)
-    cid = data.get('category_id')
-    cname = data.get('category_name')
-    if cid in CAT_MAP and not cname:
-        cname = CAT_MAP[cid]
-    elif cname in NAME_TO_ID and not cid:
-        cid = NAME_TO_ID[cname]
-    if cid not in CAT_MAP:
-        cid, cname = 6, 'others'
 
-    # Validar categoría exista en DB
-    if not execute_query("SELECT id FROM category WHERE id=%s", (cid,), fetch=True):
-        cid, cname = 6, 'others'
+@expenses_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_receipt_job(job_id):
+    """
+    Estado de un análisis de recibo en segundo plano
+    ---
+    tags:
+      - Expenses
+    parameters:
+      - in: path
+        name: job_id
+        type: string
+        required: true
+        description: ID regresado por /analyze?mode=async
+      - in: query
+        name: wait
+        type: integer
+        required: false
+        description: Segundos máximos para esperar a que termine (long-poll, máx 30)
+        example: 10
+    responses:
+      200:
+        description: Estado del job; si terminó incluye el gasto creado (o el error) en result
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            job:
+              type: object
+              properties:
+                id: {type: string}
+                status: {type: string, description: "queued, running, done o failed"}
+                http_status: {type: integer}
+                result: {type: object}
+      404:
+        description: Job no encontrado o expirado
+    """
+    wait = min(max(request.args.get('wait', 0, type=float), 0), 30)
+    job = get_job_queue().get(job_id, wait=wait)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job no encontrado'}), 404
+    return jsonify({'success': True, 'job': job}), 200
 
-    # Insertar en BD
-    insert_q = """
-        INSERT INTO expenses (user_id, category_id, amount, description, date)
-        VALUES (%s, %s, %s, %s, %s)
+
+@expenses_bp.route('/jobs/stats', methods=['GET'])
+def get_receipt_job_stats():
+    """
+    Métricas de la cola de análisis (profundidad, espera y latencia por job)
+    ---
+    tags:
+      - Expenses
+    responses:
+      200:
+        description: Estadísticas de la cola
     """
-    expense_id = execute_query(insert_q, (user_id, cid, amount, store, receipt_date))
+    return jsonify({'success': True, 'stats': get_job_queue().stats()}), 200
 
-    # Recuperar expense con nombre de categoría
-    sel_q = """
-        SELECT e.id, e.user_id, e.category_id, c.name AS category_name,
-               e.amount, e.description, e.date
-        FROM expenses e
-        LEFT JOIN category c ON c.id = e.category_id
-        WHERE e.id = %s
+
+@registry.register_collector
+def _receipt_cache_metrics():
+    if _receipt_cache is None:
+        return []
+    stats = _receipt_cache.stats()
+    return [
+        ('receipt_cache_hits_total', 'counter', 'Aciertos de la caché de recibos por nivel',
+         {(('tier', 'memory'),): stats['hits_memory'], (('tier', 'disk'),): stats['hits_disk']}),
+        ('receipt_cache_misses_total', 'counter', 'Fallos de la caché de recibos', {(): stats['misses']}),
+        ('receipt_cache_hit_ratio', 'gauge', 'Aciertos / búsquedas de la caché de recibos', {(): stats['hit_ratio']}),
+    ]
+
+
+@expenses_bp.route('/cache/stats', methods=['GET'])
+def get_receipt_cache_stats():
     """
-    rows = execute_query(sel_q, (expense_id,), fetch=True) or []
-    expense = rows[0] if rows else {
-        'id': expense_id, 'user_id': user_id, 'category_id': cid,
-        'category_name': cname, 'amount': float(amount),
-        'description': store, 'date': str(receipt_date)
-    }
+    Aciertos y fallos de la caché de análisis de recibos
+    ---
+    tags:
+      - Expenses
+    responses:
+      200:
+        description: Contadores hits/misses por nivel (memoria y disco) y hit_ratio
+    """
+    return jsonify({'success': True, 'stats': get_receipt_cache().stats()}), 200
 
-    return jsonify({
-        'success': True,
-        'message': 'Recibo analizado y gasto creado',
-        'expense_id': expense_id,
-        'expense': expense
-    }), 201
+
+@expenses_bp.route('/preprocess/stats', methods=['GET'])
+def get_preprocess_stats():
+    """
+    Bytes y latencia ahorrados por el preprocesado de imágenes
+    ---
+    tags:
+      - Expenses
+    responses:
+      200:
+        description: Bytes de entrada/salida, tiempo de preprocesado y ahorro estimado de subida
+    """
+    return jsonify({'success': True, 'stats': get_preprocessor().stats()}), 200
+
+
+@expenses_bp.route('/gemini/stats', methods=['GET'])
+def get_gemini_stats():
+    """
+    Tokens, latencia y fallos de parseo de las llamadas a Gemini por modo de prompt
+    ---
+    tags:
+      - Expenses
+    responses:
+      200:
+        description: Totales y promedios por llamada para structured (esquema JSON) y legacy (texto libre)
+    """
+    return jsonify({'success': True, 'stats': usage_stats.snapshot()}), 200
 
 
 @expenses_bp.route('/weekly/<int:user_id>', methods=['GET'])
@@ -385,47 +667,23 @@ def get_weekly_expenses(user_id):
         'expenses': expenses
     }), 200
 
-@expenses_bp.route('/summary/<int:user_id>', methods=['GET'])
-def get_weekly_summary(user_id):
-    """
-    Resumen de gastos vs metas de la semana actual
-    ---
-    tags:
-      - Expenses
-    parameters:
-      - in: path
-        name: user_id
-        type: integer
-        required: true
-        description: ID del usuario
-        example: 1
-    responses:
-      200:
-        description: Resumen semanal con porcentajes
-    """
+def weekly_summary(user_id):
+    """Gasto vs metas de la semana actual → {period, total_spent, total_budget, expended_pct, saved_pct, per_category}"""
     monday, sunday = week_bounds()
 
-    # Gastos por categoría esta semana
-    spent_query = """
-        SELECT c.id AS category_id, c.name AS category_name, 
-               COALESCE(SUM(e.amount), 0) AS spent
+    # Gasto de la semana (agregado materializado) + meta por categoría en un solo query:
+    # son búsquedas por llave primaria, no crece con el historial del usuario
+    summary_query = """
+        SELECT c.id AS category_id, c.name AS category_name,
+               COALESCE(ws.spent, 0) AS spent, g.money AS goal
         FROM category c
-        LEFT JOIN expenses e ON e.category_id = c.id 
-                             AND e.user_id = %s
-                             AND e.date BETWEEN %s AND %s
-        GROUP BY c.id, c.name
+        LEFT JOIN weekly_spend ws ON ws.user_id = %s
+                                 AND ws.week_start = %s
+                                 AND ws.category_id = c.id
+        LEFT JOIN goal g ON g.user_id = %s AND g.category_id = c.id
         ORDER BY c.name
     """
-    spent_rows = execute_query(spent_query, (user_id, monday, sunday), fetch=True) or []
-
-    # Metas del usuario por categoría
-    goals_query = """
-        SELECT g.category_id, g.money
-        FROM goal g
-        WHERE g.user_id = %s
-    """
-    goal_rows = execute_query(goals_query, (user_id,), fetch=True) or []
-    goal_map = {r['category_id']: float(r['money']) for r in goal_rows}
+    spent_rows = execute_query(summary_query, (user_id, monday, user_id), fetch=True) or []
 
     # Combinar datos
     per_category = []
@@ -435,7 +693,7 @@ def get_weekly_summary(user_id):
     for row in spent_rows:
         cat_id = row['category_id']
         spent = float(row['spent'] or 0)
-        goal = float(goal_map.get(cat_id, 0))
+        goal = float(row['goal'] or 0)
         
         total_spent += spent
         total_budget += goal
@@ -451,15 +709,35 @@ def get_weekly_summary(user_id):
     expended_pct = round((total_spent / total_budget) * 100, 2) if total_budget > 0 else 0.0
     saved_pct = round(max(0.0, 100.0 - expended_pct), 2)
 
-    return jsonify({
-        'success': True,
+    return {
         'period': {'from': str(monday), 'to': str(sunday)},
         'total_spent': round(total_spent, 2),
         'total_budget': round(total_budget, 2),
         'expended_pct': expended_pct,
         'saved_pct': saved_pct,
         'per_category': per_category
-    }), 200
+    }
+
+
+@expenses_bp.route('/summary/<int:user_id>', methods=['GET'])
+def get_weekly_summary(user_id):
+    """
+    Resumen de gastos vs metas de la semana actual
+    ---
+    tags:
+      - Expenses
+    parameters:
+      - in: path
+        name: user_id
+        type: integer
+        required: true
+        description: ID del usuario
+        example: 1
+    responses:
+      200:
+        description: Resumen semanal con porcentajes
+    """
+    return jsonify({'success': True, **weekly_summary(user_id)}), 200
 
 @expenses_bp.route('/<int:expense_id>', methods=['DELETE'])
 def delete_expense(expense_id):
@@ -478,7 +756,16 @@ def delete_expense(expense_id):
       200:
         description: Gasto eliminado exitosamente
     """
+    # Bloquear el gasto para restar exactamente lo que se borra del resumen semanal
+    rows = execute_query(
+        "SELECT user_id, category_id, amount, date FROM expenses WHERE id = %s FOR UPDATE",
+        (expense_id,), fetch=True
+    )
     query = "DELETE FROM expenses WHERE id = %s"
     execute_query(query, (expense_id,))
 
+    if rows:
+        row = rows[0]
+        weekly_spend.remove_expense(row['user_id'], row['category_id'], row['amount'], row['date'])
+
     return jsonify({'success': True, 'message': 'Gasto eliminado'}), 200
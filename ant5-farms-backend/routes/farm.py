@@ -1,8 +1,61 @@
+from decimal import Decimal
 from flask import Blueprint, request, jsonify
-from config.db import execute_query
+from config.db import execute_query, execute_many
+from services.reference_data import get_reference_data
+from services.leaves_buffer import get_leaves_buffer
+from config.log import get_logger
+
+log = get_logger('farm')
 
 farm_bp = Blueprint('farm', __name__)
 
+FARM_FIELDS = ('ants_count', 'leaves_count', 'ants')
+
+
+def farm_snapshot(user_id, fields=None):
+    """
+    Granja del usuario en un solo query → {ants_count, leaves_count, ants} o None si no existe
+    - fields: subconjunto de FARM_FIELDS; solo leaves_count lee únicamente la fila de farm
+    """
+    if fields and fields <= {'leaves_count'}:
+        rows = execute_query("SELECT leaves_count FROM farm WHERE user_id = %s", (user_id,), fetch=True)
+    else:
+        # Granja + detalle de hormigas; el total sale de las mismas filas
+        query = """
+            SELECT f.leaves_count, a.name, af.cant
+            FROM farm f
+            LEFT JOIN ant_farm af ON af.user_id = f.user_id
+            LEFT JOIN ants a ON a.id_ant = af.id_ant
+            WHERE f.user_id = %s
+            ORDER BY a.name
+        """
+        rows = execute_query(query, (user_id,), fetch=True)
+    if not rows:
+        return None
+
+    # Decimal como el SUM() original: se serializa como texto y así lo decodifica la app (antsCount: String)
+    ants_count = Decimal(0)
+    ants_list = []
+    for row in rows:
+        if row.get('cant') is not None:
+            ants_count += row['cant']
+            if row['name'] is not None:
+                ants_list.append({'name': row['name'], 'cant': row['cant']})
+
+    # Con write-behind, el saldo visible del buffer (BD + lo que falta escribir, también durante un flush)
+    leaves_count = rows[0]['leaves_count']
+    buffer = get_leaves_buffer()
+    if buffer is not None:
+        balance = buffer.balance(user_id)
+        if balance is not None:
+            leaves_count = balance
+
+    snapshot = {'ants_count': ants_count, 'leaves_count': leaves_count, 'ants': ants_list}
+    if fields:
+        snapshot = {k: v for k, v in snapshot.items() if k in fields}
+    return snapshot
+
+
 @farm_bp.route('/<int:user_id>', methods=['GET'])
 def get_farm(user_id):
     """
@@ -17,6 +70,12 @@ def get_farm(user_id):
         required: true
         description: ID del usuario
         example: 1
+      - in: query
+        name: fields
+        type: string
+        required: false
+        description: Campos a devolver separados por coma (leaves_count, ants_count, ants); solo leaves_count evita leer las hormigas
+        example: leaves_count
     responses:
       200:
         description: Conteo de hormigas y hojas
@@ -36,41 +95,23 @@ def get_farm(user_id):
                     type: string
                   quantity:
                     type: integer
+      400:
+        description: Campo desconocido en fields
       404:
         description: Granja no encontrada
     """
-    # Obtener información básica de la granja
-    query_farm = "SELECT leaves_count FROM farm WHERE user_id = %s"
-    farm = execute_query(query_farm, (user_id,), fetch=True)
-    
-    if not farm:
+    fields = request.args.get('fields')
+    if fields:
+        fields = {f.strip() for f in fields.split(',') if f.strip()}
+        unknown = fields - set(FARM_FIELDS)
+        if unknown:
+            return jsonify({'success': False, 'message': f"Campos desconocidos: {', '.join(sorted(unknown))}"}), 400
+
+    snapshot = farm_snapshot(user_id, fields or None)
+    if snapshot is None:
         return jsonify({'success': False, 'message': 'Granja no encontrada'}), 404
 
-    # Obtener conteo total de hormigas
-    query_ants_count = """
-        SELECT COALESCE(SUM(cant), 0) AS ants_count
-        FROM ant_farm
-        WHERE user_id = %s
-    """
-    ants_data = execute_query(query_ants_count, (user_id,), fetch=True)
-    ants_count = ants_data[0]['ants_count'] if ants_data else 0
-
-    # Obtener lista detallada de hormigas con su nombre y cantidad
-    query_ants_detail = """
-        SELECT a.name, af.cant AS cant
-        FROM ant_farm af
-        INNER JOIN ants a ON af.id_ant = a.id_ant
-        WHERE af.user_id = %s
-        ORDER BY a.name
-    """
-    ants_list = execute_query(query_ants_detail, (user_id,), fetch=True)
-
-    # Devolver respuesta completa
-    return jsonify({
-        'ants_count': ants_count,
-        'leaves_count': farm[0]['leaves_count'],
-        'ants': ants_list if ants_list else []
-    }), 200
+    return jsonify(snapshot), 200
 
 
 # @farm_bp.route('/<int:user_id>/daily-production', methods=['GET'])
@@ -154,27 +195,18 @@ def add_ant(user_id, ant_id):
       404:
         description: Hormiga no encontrada
     """
-    # Verificar que la hormiga existe en la tabla ants
-    check_ant_query = "SELECT name FROM ants WHERE id_ant = %s"
-    ant = execute_query(check_ant_query, (ant_id,), fetch=True)
-    
-    if not ant:
+    # Verificar que la hormiga existe (catálogo en memoria)
+    if get_reference_data().ant_name(ant_id) is None:
         return jsonify({'success': False, 'message': 'Hormiga no encontrada'}), 404
     
-    # Verificar si el usuario ya tiene esta hormiga
-    check_query = "SELECT cant FROM ant_farm WHERE user_id = %s AND id_ant = %s"
-    existing_ant = execute_query(check_query, (user_id, ant_id), fetch=True)
-    
-    if existing_ant:
-        # Si ya existe, incrementar la cantidad
-        update_query = "UPDATE ant_farm SET cant = cant + 1 WHERE user_id = %s AND id_ant = %s"
-        execute_query(update_query, (user_id, ant_id))
-        new_quantity = existing_ant[0]['cant'] + 1
-    else:
-        # Si no existe, crear nueva entrada
-        insert_query = "INSERT INTO ant_farm (user_id, id_ant, cant) VALUES (%s, %s, 1)"
-        execute_query(insert_query, (user_id, ant_id))
-        new_quantity = 1
+    # Un solo upsert (requiere UNIQUE(user_id, id_ant), migración 0004):
+    # dos recompensas simultáneas suman en la misma fila en vez de duplicarla.
+    # Un usuario inexistente lo rechaza la FK → 404
+    upsert_query = """
+        INSERT INTO ant_farm (user_id, id_ant, cant) VALUES (%s, %s, 1)
+        ON DUPLICATE KEY UPDATE cant = cant + VALUES(cant)
+    """
+    execute_query(upsert_query, (user_id, ant_id))
     
     '''return jsonify({
         'success': True
@@ -278,22 +310,149 @@ def update_leaves(user_id):
     except (ValueError, TypeError):
         return jsonify({'message': 'El campo "leaves" debe ser un número entero'}), 400
 
-    # Get current leaves
-    query = "SELECT leaves_count FROM farm WHERE user_id = %s"
-    result = execute_query(query, (user_id,), fetch=True)
-    if not result:
-        return jsonify({'message': 'Usuario no encontrado'}), 404
+    # Write-behind (LEAVES_WRITE_BEHIND=1): el cambio se acumula en memoria y se escribe en lote
+    buffer = get_leaves_buffer()
+    if buffer is not None:
+        try:
+            outcome = buffer.apply(user_id, leaves_change)
+        except Exception as e:
+            log.error('error leyendo saldo de hojas', extra={'error': str(e), 'user_id': user_id})
+            return jsonify({'message': 'Error actualizando hojas'}), 500
+        if outcome == 'not_found':
+            return jsonify({'message': 'Usuario no encontrado'}), 404
+        if outcome == 'insufficient':
+            return jsonify({'message': 'Saldo insuficiente'}), 400
+        return '', 204
 
-    current_leaves = result[0]['leaves_count']
-    new_leaves = current_leaves + leaves_change
+    # Incremento atómico: el saldo no negativo lo asegura el WHERE, no una lectura previa,
+    # así que ruletas/tragamonedas concurrentes no pierden actualizaciones
+    update_q = """
+        UPDATE farm
+        SET leaves_count = leaves_count + %s
+        WHERE user_id = %s AND leaves_count >= %s
+    """
+    matched = execute_query(update_q, (leaves_change, user_id, -leaves_change), rowcount=True)
+    if matched is None:
+        return jsonify({'message': 'Error actualizando hojas'}), 500
 
-    # Prevent negatives
-    if new_leaves < 0:
+    if matched == 0:
+        # Sin fila: o no hay granja o el saldo no alcanza (solo aquí se paga el SELECT extra)
+        if not execute_query("SELECT 1 FROM farm WHERE user_id = %s", (user_id,), fetch=True):
+            return jsonify({'message': 'Usuario no encontrado'}), 404
         return jsonify({'message': 'Saldo insuficiente'}), 400
 
-    # Update silently
-    update_q = "UPDATE farm SET leaves_count = %s WHERE user_id = %s"
-    execute_query(update_q, (new_leaves, user_id))
-
     # Return HTTP 204: No Content
     return '', 204
+
+
+@farm_bp.route('/<int:user_id>/ants', methods=['POST'])
+def grant_ants(user_id):
+    """
+    Otorgar varias hormigas de una vez (recompensas con más de un tipo/cantidad)
+    ---
+    tags:
+      - Farm
+    parameters:
+      - in: path
+        name: user_id
+        type: integer
+        required: true
+        description: ID del usuario
+        example: 1
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - ants
+          properties:
+            ants:
+              type: array
+              items:
+                type: object
+                required:
+                  - ant_id
+                properties:
+                  ant_id:
+                    type: integer
+                    example: 2
+                  quantity:
+                    type: integer
+                    example: 3
+                    description: Cantidad a sumar (default 1)
+    responses:
+      200:
+        description: Hormigas otorgadas (una sola sentencia)
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            granted:
+              type: array
+              items:
+                type: object
+                properties:
+                  ant_id:
+                    type: integer
+                  ant_name:
+                    type: string
+                  quantity:
+                    type: integer
+      400:
+        description: Lista vacía o cantidades inválidas
+      404:
+        description: Usuario u hormiga no encontrados
+    """
+    data = request.get_json() or {}
+    items = data.get('ants')
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'message': 'Campo "ants" requerido (lista no vacía)'}), 400
+
+    # Juntar repetidos: un tipo de hormiga = una fila del upsert
+    totals = {}
+    reference = get_reference_data()
+    for item in items:
+        try:
+            ant_id = int(item.get('ant_id'))
+            quantity = int(item.get('quantity', 1))
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'ant_id y quantity deben ser enteros'}), 400
+        if quantity <= 0:
+            return jsonify({'success': False, 'message': 'quantity debe ser positivo'}), 400
+        if reference.ant_name(ant_id) is None:
+            return jsonify({'success': False, 'message': f'Hormiga {ant_id} no encontrada'}), 404
+        totals[ant_id] = totals.get(ant_id, 0) + quantity
+
+    # Todas las filas en un solo INSERT multi-fila (un round trip)
+    upsert_query = """
+        INSERT INTO ant_farm (user_id, id_ant, cant) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE cant = cant + VALUES(cant)
+    """
+    if execute_many(upsert_query, [(user_id, ant_id, qty) for ant_id, qty in totals.items()]) is None:
+        return jsonify({'success': False, 'message': 'Error otorgando hormigas'}), 500
+
+    return jsonify({
+        'success': True,
+        'granted': [
+            {'ant_id': ant_id, 'ant_name': reference.ant_name(ant_id), 'quantity': qty}
+            for ant_id, qty in totals.items()
+        ]
+    }), 200
+
+
+@farm_bp.route('/leaves/stats', methods=['GET'])
+def get_leaves_buffer_stats():
+    """
+    Estadísticas del write-behind de hojas
+    ---
+    tags:
+      - Farm
+    responses:
+      200:
+        description: Cambios absorbidos, flushes, sentencias y cambios por sentencia (enabled false si está apagado)
+    """
+    buffer = get_leaves_buffer()
+    stats = buffer.stats() if buffer is not None else {'enabled': False}
+    return jsonify({'success': True, 'stats': stats}), 200
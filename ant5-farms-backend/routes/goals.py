@@ -3,6 +3,19 @@ from config.db import execute_query
 
 goals_bp = Blueprint('goals', __name__)
 
+
+def user_goals(user_id):
+    """Metas del usuario por categoría (lista de filas, ordenadas por categoría)"""
+    query = """
+        SELECT g.id, g.user_id, g.category_id, c.name AS category_name, g.money
+        FROM goal g
+        JOIN category c ON c.id = g.category_id
+        WHERE g.user_id = %s
+        ORDER BY c.id
+    """
+    return execute_query(query, (user_id,), fetch=True) or []
+
+
 @goals_bp.route('/<int:user_id>', methods=['GET'])
 def get_goals(user_id):
     """
@@ -41,14 +54,7 @@ def get_goals(user_id):
                   money:
                     type: number
     """
-    query = """
-        SELECT g.id, g.user_id, g.category_id, c.name AS category_name, g.money
-        FROM goal g
-        JOIN category c ON c.id = g.category_id
-        WHERE g.user_id = %s
-        ORDER BY c.id
-    """
-    rows = execute_query(query, (user_id,), fetch=True) or []
+    rows = user_goals(user_id)
     
     # Verificar que el usuario tenga las 6 metas (por si acaso)
     if len(rows) < 6:
@@ -114,7 +120,11 @@ def update_goals_bulk(user_id):
       200:
         description: Metas actualizadas exitosamente
       400:
-        description: Datos inválidos (deben ser 6 metas)
+        description: Datos inválidos (deben ser 6 metas; se valida antes de tocar la BD)
+      404:
+        description: Usuario no existe
+      500:
+        description: El usuario no tiene metas inicializadas
     """
     data = request.get_json() or {}
     goals = data.get('goals', [])
@@ -126,10 +136,6 @@ def update_goals_bulk(user_id):
             'message': 'Deben enviarse exactamente 6 metas (una por categoría)'
         }), 400
 
-    # Validar que el usuario exista
-    if not execute_query("SELECT id FROM users WHERE id=%s", (user_id,), fetch=True):
-        return jsonify({'success': False, 'message': 'Usuario no existe'}), 404
-
     # Validar que todas las categorías sean válidas (1-6)
     category_ids = [g.get('category_id') for g in goals]
     if set(category_ids) != {1, 2, 3, 4, 5, 6}:
@@ -138,21 +144,40 @@ def update_goals_bulk(user_id):
             'message': 'Deben incluirse las 6 categorías (IDs: 1, 2, 3, 4, 5, 6)'
         }), 400
 
-    # Actualizar cada meta (solo el monto)
-    update_query = """
-        UPDATE goal 
-        SET money = %s 
-        WHERE user_id = %s AND category_id = %s
-    """
-    
+    # Validar montos antes de escribir nada
+    amounts = {}
     for goal in goals:
-        category_id = goal.get('category_id')
-        money = goal.get('money', 0.00)
-        
-        # Asegurar que money no sea negativo
-        money = max(0, float(money))
-        
-        execute_query(update_query, (money, user_id, category_id))
+        try:
+            # Asegurar que money no sea negativo
+            amounts[goal['category_id']] = max(0, float(goal.get('money', 0.00)))
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'message': 'money debe ser numérico'}), 400
+
+    # Las 6 metas en una sola sentencia (todas o ninguna)
+    # Se parte de users para saber en el mismo round trip si el usuario existe: su fila se
+    # reasigna sin cambios y cuenta como encontrada (FOUND_ROWS) → 0 = no existe, 1 = sin metas
+    cases = ' '.join(['WHEN %s THEN %s'] * len(amounts))
+    update_query = f"""
+        UPDATE users u
+        LEFT JOIN goal g ON g.user_id = u.id AND g.category_id IN ({', '.join(['%s'] * len(amounts))})
+        SET g.money = CASE g.category_id {cases} END,
+            u.last_login_date = u.last_login_date
+        WHERE u.id = %s
+    """
+    params = list(amounts) + [v for pair in amounts.items() for v in pair] + [user_id]
+    matched = execute_query(update_query, params, rowcount=True)
+    if matched is None:
+        return jsonify({'success': False, 'message': 'Error actualizando metas'}), 500
+
+    if not matched:
+        return jsonify({'success': False, 'message': 'Usuario no existe'}), 404
+
+    # El usuario existe pero registro no le creó metas (igual que en get_goals)
+    if matched == 1:
+        return jsonify({
+            'success': False,
+            'message': 'Usuario no tiene metas inicializadas. Contacta soporte.'
+        }), 500
     
     return jsonify({
         'success': True
@@ -0,0 +1,142 @@
+"""
+Backfill masivo: analiza una carpeta de recibos y escribe un resultado NDJSON por imagen
+
+Uso (desde ant5-farms-backend/):
+    python -m scripts.backfill_receipts ./tickets --out tickets.ndjson --workers 8
+    python -m scripts.backfill_receipts ./tickets --out tickets.ndjson --executor process
+
+- El mismo --out funciona como checkpoint: al reiniciar se saltan las imágenes
+  que ya tienen línea en el archivo, así que se puede cortar y reanudar
+- Cada línea: {"file", "sha256", "ok", "receipt" | "error", "ms"}
+- Cada --progress segundos se reporta throughput (imágenes/s) y ETA
+- El backend sale de RECEIPT_ANALYZER (gemini o fake para ensayos offline)
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from services.analyzers import get_analyzer
+from services.receipt_preprocess import preprocess_image
+from services.receipts import ReceiptError, guess_mime_type
+
+IMAGE_EXTS = {'.jpg', '.jpeg', '.png'}
+
+# Un analizador por proceso (los hilos lo comparten)
+_analyzer = None
+_max_dim = 0
+
+
+def _init_worker(max_dim):
+    global _analyzer, _max_dim
+    load_dotenv()
+    _analyzer = get_analyzer()
+    _max_dim = max_dim
+
+
+def analyze_file(path):
+    """Analiza una imagen y regresa el registro NDJSON (nunca lanza)"""
+    start = time.perf_counter()
+    record = {'file': path}
+    try:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        record['sha256'] = hashlib.sha256(image_bytes).hexdigest()
+        mime_type = guess_mime_type(path)
+        if _max_dim:
+            image_bytes, new_mime = preprocess_image(image_bytes, max_dim=_max_dim)
+            mime_type = new_mime or mime_type
+        record['receipt'] = _analyzer.analyze(image_bytes, mime_type)
+        record['ok'] = True
+    except ReceiptError as e:
+        record['ok'] = False
+        record['error'] = {'message': e.message, 'status': e.status, **e.extra}
+    except Exception as e:
+        record['ok'] = False
+        record['error'] = {'message': str(e), 'status': 500}
+    record['ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+def _list_images(directory):
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTS:
+                files.append(os.path.join(root, name))
+    return sorted(files)
+
+
+def _load_checkpoint(out_path, ok_only=False):
+    """Archivos ya procesados según el NDJSON de salida (solo los exitosos con ok_only)"""
+    done = set()
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Última línea cortada por una interrupción: se reprocesa
+                continue
+            if record.get('ok') or not ok_only:
+                done.add(record['file'])
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill de recibos a NDJSON')
+    parser.add_argument('directory', help='Carpeta con imágenes (se recorre recursivamente)')
+    parser.add_argument('--out', required=True, help='Archivo NDJSON de salida (y checkpoint)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--executor', choices=('thread', 'process'), default='thread',
+                        help='thread para I/O (default), process si el preprocesado domina')
+    parser.add_argument('--max-dim', type=int, default=1600, help='Lado máximo al preprocesar (0 = mandar original)')
+    parser.add_argument('--retry-errors', action='store_true', help='Reprocesar imágenes que fallaron antes')
+    parser.add_argument('--progress', type=float, default=5.0, help='Segundos entre reportes de avance')
+    args = parser.parse_args()
+
+    files = _list_images(args.directory)
+    done = _load_checkpoint(args.out, ok_only=args.retry_errors)
+    pending = [f for f in files if f not in done]
+    print(f"{len(files)} imágenes, {len(files) - len(pending)} ya procesadas, {len(pending)} pendientes", file=sys.stderr)
+    if not pending:
+        return
+
+    if args.executor == 'process':
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.max_dim,))
+    else:
+        _init_worker(args.max_dim)
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+
+    start = last_report = time.monotonic()
+    processed = failed = 0
+    with executor, open(args.out, 'a', encoding='utf-8') as out:
+        futures = [executor.submit(analyze_file, path) for path in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            # flush por línea: si se interrumpe, el checkpoint queda al día
+            out.flush()
+            processed += 1
+            failed += 0 if record['ok'] else 1
+
+            now = time.monotonic()
+            if now - last_report >= args.progress or processed == len(pending):
+                last_report = now
+                rate = processed / (now - start) if now > start else 0.0
+                eta = (len(pending) - processed) / rate if rate else 0.0
+                print(f"{processed}/{len(pending)} ({failed} errores) {rate:.2f} img/s ETA {eta:.0f}s", file=sys.stderr)
+
+    elapsed = time.monotonic() - start
+    print(f"Listo: {processed} imágenes en {elapsed:.1f}s ({processed / elapsed:.2f} img/s), {failed} errores",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+"""
+Benchmark de la API con tráfico mixto contra una base real (MySQL/MariaDB local)
+
+Uso (desde ant5-farms-backend/, con DB_* apuntando a una base de pruebas):
+    python -m scripts.bench_api --users 200 --threads 16 --duration 30 --save baseline.json
+    python -m scripts.bench_api --users 200 --threads 16 --duration 30 --compare baseline.json
+
+- Solo corre contra una BD local (DB_HOST localhost/127.0.0.1/::1); otra base requiere --allow-remote
+- Con --migrate aplica antes las migraciones pendientes (scripts.migrate); por defecto no migra
+  (algunas migraciones reescriben tablas: mejor correrlas a propósito)
+- Siembra --users usuarios con granja, metas, hormigas y --expenses gastos de las últimas 8 semanas
+- Cada hilo elige operaciones al azar según --mix:
+    login      ráfaga de --login-burst PUT /api/auth/login del mismo usuario (la app al abrir)
+    dashboard  GET /api/dashboard/<id>, reenviando el ETag recibido (200 o 304)
+    expense    POST /api/expenses/
+    leaves     PUT /api/farm/<id>/leaves con deltas pequeños (ruleta, tragamonedas)
+    receipt    POST /api/expenses/analyze con una imagen distinta cada vez (sin hits de caché)
+- Los recibos usan el analizador fake (RECEIPT_ANALYZER=fake, latencia con FAKE_ANALYZER_*)
+- Se reporta throughput y p50/p95/p99 por endpoint; --save guarda el resultado como baseline y
+  --compare falla (exit 1) si un endpoint empeora más de --tolerance respecto al baseline
+Los requests van por app.test_client() en el mismo proceso: se mide la app y la BD, no el servidor HTTP.
+Los usuarios sembrados se borran al terminar (la FK en cascada borra el resto) salvo con --keep
+"""
+import os
+
+# Antes de importar la app: sin Gemini ni caché en disco
+os.environ.setdefault('RECEIPT_ANALYZER', 'fake')
+os.environ.setdefault('FAKE_ANALYZER_LATENCY_MS', '150')
+os.environ.setdefault('FAKE_ANALYZER_JITTER_MS', '50')
+os.environ.setdefault('FAKE_ANALYZER_SEED', '1')
+os.environ.setdefault('RECEIPT_CACHE_DIR', '')
+
+import argparse
+import io
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from app import app
+from config.db import execute_many, execute_query, transaction
+from scripts.local_db import add_allow_remote, require_local_db
+from services import weekly_spend
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+DEFAULT_MIX = 'login=10,dashboard=35,expense=20,leaves=30,receipt=5'
+
+# Códigos esperados por operación; cualquier otro cuenta como error
+EXPECTED = {
+    'login': {200},
+    'dashboard': {200, 304},
+    'expense': {201},
+    'leaves': {204, 400},     # 400 = saldo insuficiente
+    'receipt': {201},
+}
+
+DESCRIPTIONS = ('Tacos', 'Café', 'Uber', 'Spotify', 'Súper', 'Refresco', 'Metro', 'Cine')
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in EXPECTED:
+            raise ValueError(f"operación desconocida en --mix: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+# -------------------------
+#  Datos de prueba
+# -------------------------
+def seed(prefix, users, expenses_per_user, rng):
+    """Crea los usuarios del benchmark; regresa ([(user_id, username)], [category_id])"""
+    today = date.today()
+    with transaction():
+        execute_many(
+            "INSERT INTO users (username, password, last_login_date) VALUES (%s, %s, NULL)",
+            [(f"{prefix}{i}", 'bench') for i in range(users)]
+        )
+        rows = execute_query(
+            "SELECT id, username FROM users WHERE username LIKE %s ORDER BY id", (prefix + '%',), fetch=True
+        ) or []
+        user_ids = [r['id'] for r in rows]
+
+        execute_many(
+            "INSERT INTO farm (user_id, ants_count, leaves_count, bonus_leaves_earned) VALUES (%s, 1, %s, %s)",
+            [(u, rng.randint(0, 500), rng.randint(0, 30)) for u in user_ids]
+        )
+        categories = sorted(r['id'] for r in execute_query("SELECT id FROM category", fetch=True) or [])
+        execute_many(
+            "INSERT INTO goal (user_id, category_id, money) VALUES (%s, %s, %s)",
+            [(u, c, rng.choice((0, 200, 500, 1000, 1500))) for u in user_ids for c in categories]
+        )
+        ants = [r['id_ant'] for r in execute_query("SELECT id_ant FROM ants", fetch=True) or []]
+        if ants:
+            execute_many(
+                "INSERT INTO ant_farm (user_id, id_ant, cant) VALUES (%s, %s, %s)",
+                [(u, a, rng.randint(1, 4)) for u in user_ids
+                 for a in rng.sample(ants, min(len(ants), rng.randint(1, 3)))]
+            )
+
+        expenses = [
+            (u, rng.choice(categories), round(rng.uniform(10, 400), 2), rng.choice(DESCRIPTIONS),
+             today - timedelta(days=rng.randrange(56)))
+            for u in user_ids for _ in range(expenses_per_user)
+        ]
+        for i in range(0, len(expenses), 1000):
+            chunk = expenses[i:i + 1000]
+            execute_many(
+                "INSERT INTO expenses (user_id, category_id, amount, description, date) VALUES (%s, %s, %s, %s, %s)",
+                chunk
+            )
+            weekly_spend.add_expenses([(u, c, a, d) for u, c, a, _, d in chunk])
+    return [(r['id'], r['username']) for r in rows], categories
+
+
+def cleanup(prefix):
+    with transaction():
+        execute_query("DELETE FROM users WHERE username LIKE %s", (prefix + '%',))
+
+
+def _receipt_image(n):
+    """JPEG chico distinto para cada n (hash distinto → el analizador siempre corre)"""
+    if Image is None:
+        return f"recibo {n} {uuid.uuid4().hex}".encode(), 'image/jpeg'
+    img = Image.new('RGB', (320, 480), ((n * 37) % 256, (n * 91) % 256, (n * 53) % 256))
+    out = io.BytesIO()
+    img.save(out, format='JPEG', quality=70)
+    return out.getvalue(), 'image/jpeg'
+
+
+# -------------------------
+#  Tráfico
+# -------------------------
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}   # endpoint -> [ms]
+        self.statuses = {}    # endpoint -> {código: veces}
+        self.errors = {}      # endpoint -> veces con código inesperado
+
+    def add(self, endpoint, elapsed_ms, status):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(elapsed_ms)
+            codes = self.statuses.setdefault(endpoint, {})
+            codes[status] = codes.get(status, 0) + 1
+            if status not in EXPECTED[endpoint]:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+
+def run_traffic(users, categories, threads, duration, mix, login_burst, rng_seed):
+    recorder = Recorder()
+    names, weights = list(mix), [mix[name] for name in mix]
+    deadline = time.perf_counter() + duration
+    receipt_counter = iter(range(10 ** 9))
+    counter_lock = threading.Lock()
+
+    def call(endpoint, fn):
+        start = time.perf_counter()
+        response = fn()
+        recorder.add(endpoint, (time.perf_counter() - start) * 1000, response.status_code)
+        return response
+
+    def worker(index):
+        rng = random.Random(rng_seed + index)
+        client = app.test_client()
+        etags = {}
+        while time.perf_counter() < deadline:
+            op = rng.choices(names, weights)[0]
+            user_id, username = rng.choice(users)
+            if op == 'login':
+                for _ in range(login_burst):
+                    call('login', lambda: client.put(
+                        '/api/auth/login', json={'username': username, 'password': 'bench'}))
+            elif op == 'dashboard':
+                headers = {'If-None-Match': etags[user_id]} if user_id in etags else {}
+                response = call('dashboard', lambda: client.get(f'/api/dashboard/{user_id}', headers=headers))
+                if response.headers.get('ETag'):
+                    etags[user_id] = response.headers['ETag']
+            elif op == 'expense':
+                call('expense', lambda: client.post('/api/expenses/', json={
+                    'user_id': user_id,
+                    'category_id': rng.choice(categories),
+                    'amount': round(rng.uniform(10, 300), 2),
+                    'description': rng.choice(DESCRIPTIONS),
+                }))
+            elif op == 'leaves':
+                delta = rng.choice((-5, -2, -1, 1, 2, 5, 10))
+                call('leaves', lambda: client.put(f'/api/farm/{user_id}/leaves', json={'leaves': delta}))
+            elif op == 'receipt':
+                with counter_lock:
+                    n = next(receipt_counter)
+                data, mime = _receipt_image(n)
+                call('receipt', lambda: client.post('/api/expenses/analyze', data={
+                    'user_id': str(user_id),
+                    'image': (io.BytesIO(data), f'recibo{n}.jpg', mime),
+                }, content_type='multipart/form-data'))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    return recorder, time.perf_counter() - started
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for endpoint, values in sorted(recorder.latencies.items()):
+        endpoints[endpoint] = {
+            'requests': len(values),
+            'rps': round(len(values) / elapsed, 2),
+            'errors': recorder.errors.get(endpoint, 0),
+            'mean_ms': round(sum(values) / len(values), 2),
+            'p50_ms': round(_percentile(values, 50), 2),
+            'p95_ms': round(_percentile(values, 95), 2),
+            'p99_ms': round(_percentile(values, 99), 2),
+            'statuses': {str(k): v for k, v in sorted(recorder.statuses[endpoint].items())},
+        }
+    everything = [v for values in recorder.latencies.values() for v in values]
+    total = len(everything)
+    return {
+        'elapsed_s': round(elapsed, 2),
+        'requests': total,
+        'rps': round(total / elapsed, 2) if elapsed else 0.0,
+        'errors': sum(recorder.errors.values()),
+        'p50_ms': round(_percentile(everything, 50), 2),
+        'p95_ms': round(_percentile(everything, 95), 2),
+        'p99_ms': round(_percentile(everything, 99), 2),
+        'endpoints': endpoints,
+    }
+
+
+def print_report(result):
+    print(f"{result['requests']} requests en {result['elapsed_s']}s ({result['rps']} req/s), "
+          f"{result['errors']} con código inesperado")
+    print(f"{'endpoint':<10} {'reqs':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errores':>8}  códigos")
+    for endpoint, s in result['endpoints'].items():
+        print(f"{endpoint:<10} {s['requests']:>7} {s['rps']:>8.1f} {s['p50_ms']:>7.1f}ms {s['p95_ms']:>7.1f}ms "
+              f"{s['p99_ms']:>7.1f}ms {s['errors']:>8}  {s['statuses']}")
+
+
+# -------------------------
+#  Baseline
+# -------------------------
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline, tolerance, min_delta_ms):
+    """Regresiones respecto al baseline: [texto]"""
+    problems = []
+    if baseline.get('config') != result.get('config'):
+        print(f"⚠️ Configuración distinta al baseline: {baseline.get('config')} vs {result.get('config')}")
+    for endpoint, base in baseline['endpoints'].items():
+        current = result['endpoints'].get(endpoint)
+        if current is None:
+            problems.append(f"{endpoint}: sin requests en esta corrida")
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            limit = max(base[key] * (1 + tolerance), base[key] + min_delta_ms)
+            if current[key] > limit:
+                problems.append(f"{endpoint}: {key} {current[key]:.1f} > {base[key]:.1f} (+{tolerance:.0%})")
+        if current['rps'] < base['rps'] * (1 - tolerance):
+            problems.append(f"{endpoint}: {current['rps']:.1f} req/s < {base['rps']:.1f} (-{tolerance:.0%})")
+        base_rate = base['errors'] / base['requests'] if base['requests'] else 0
+        rate = current['errors'] / current['requests']
+        if rate > base_rate + 0.01:
+            problems.append(f"{endpoint}: {rate:.1%} de errores (baseline {base_rate:.1%})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la API con tráfico mixto')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--expenses', type=int, default=40, help='Gastos sembrados por usuario')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='Segundos de tráfico')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Pesos por operación (default {DEFAULT_MIX})')
+    parser.add_argument('--login-burst', type=int, default=3, help='Logins seguidos por operación login')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='Guardar el resultado como baseline JSON')
+    parser.add_argument('--compare', help='Baseline JSON contra el cual comparar')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Empeoramiento permitido (0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help='Diferencia mínima en ms para contar una regresión de latencia')
+    parser.add_argument('--migrate', action='store_true', help='Aplicar migraciones pendientes antes de sembrar')
+    add_allow_remote(parser)
+    parser.add_argument('--keep', action='store_true', help='No borrar los usuarios sembrados')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    require_local_db(args.allow_remote, 'el benchmark siembra y borra datos')
+    if args.migrate:
+        from scripts.migrate import migrate
+        migrate()
+
+    prefix = f"bench-{uuid.uuid4().hex[:8]}-"
+    rng = random.Random(args.seed)
+    try:
+        seed_start = time.perf_counter()
+        users, categories = seed(prefix, args.users, args.expenses, rng)
+        print(f"{len(users)} usuarios y {len(users) * args.expenses} gastos sembrados en "
+              f"{time.perf_counter() - seed_start:.1f}s")
+        recorder, elapsed = run_traffic(users, categories, args.threads, args.duration, mix,
+                                        args.login_burst, args.seed)
+    finally:
+        if not args.keep:
+            cleanup(prefix)
+
+    result = summarize(recorder, elapsed)
+    result['config'] = {
+        'users': args.users, 'expenses': args.expenses, 'threads': args.threads, 'duration': args.duration,
+        'mix': mix, 'login_burst': args.login_burst,
+        'analyzer_latency_ms': float(os.environ['FAKE_ANALYZER_LATENCY_MS']),
+    }
+    result['commit'] = _git_commit()
+    result['created_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    print_report(result)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Baseline guardado en {args.save}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        problems = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        print(f"Comparado contra {args.compare} (commit {baseline.get('commit')})")
+        for problem in problems:
+            print(f"FAIL {problem}")
+        if problems:
+            sys.exit(1)
+        print('Sin regresiones')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark del preprocesado de recibos: latencia end-to-end y precisión por tamaño
+
+Uso (desde ant5-farms-backend/):
+    python -m scripts.bench_preprocess ../ --labels labels.json --sizes 0,2048,1600,1024,768
+
+- images: carpeta (o archivos) con fotos de recibos .jpg/.jpeg/.png
+- labels: JSON opcional {"archivo.jpg": {"amount": 123.45, "category_id": 1}} para medir precisión
+- sizes: lados máximos a comparar; 0 = imagen original sin preprocesar
+Cada imagen se manda directo al modelo (sin caché) una vez por tamaño y repetición;
+el backend sale de RECEIPT_ANALYZER.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from services.analyzers import get_analyzer
+from services.receipts import ReceiptError, guess_mime_type
+from services.receipt_preprocess import preprocess_image
+
+IMAGE_EXTS = {'.jpg', '.jpeg', '.png'}
+
+
+def _collect_images(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTS:
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return files
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run(files, sizes, labels, repeat, grayscale, quality):
+    analyzer = get_analyzer()
+    rows = []
+    for size in sizes:
+        latencies, sizes_out = [], []
+        amount_ok = category_ok = labeled = errors = 0
+
+        for path in files:
+            with open(path, 'rb') as f:
+                original = f.read()
+            mime = guess_mime_type(path)
+            expected = labels.get(os.path.basename(path))
+
+            for _ in range(repeat):
+                start = time.perf_counter()
+                if size:
+                    data, new_mime = preprocess_image(original, max_dim=size, quality=quality, grayscale=grayscale)
+                else:
+                    data, new_mime = original, None
+                try:
+                    receipt = analyzer.analyze(data, new_mime or mime)
+                except ReceiptError:
+                    receipt = None
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+                sizes_out.append(len(data))
+
+                if expected and receipt:
+                    labeled += 1
+                    if abs(float(receipt['amount']) - float(expected['amount'])) < 0.01:
+                        amount_ok += 1
+                    if receipt['category_id'] == expected.get('category_id'):
+                        category_ok += 1
+                elif expected:
+                    labeled += 1
+
+        rows.append({
+            'max_dim': size or 'original',
+            'avg_kb': round(statistics.mean(sizes_out) / 1024, 1) if sizes_out else 0.0,
+            'p50_ms': round(_percentile(latencies, 50), 1),
+            'p95_ms': round(_percentile(latencies, 95), 1),
+            'errors': errors,
+            'amount_acc': round(amount_ok / labeled, 3) if labeled else None,
+            'category_acc': round(category_ok / labeled, 3) if labeled else None,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de preprocesado de recibos')
+    parser.add_argument('images', nargs='+', help='Carpetas o archivos de imagen')
+    parser.add_argument('--labels', help='JSON con montos/categorías esperados por archivo')
+    parser.add_argument('--sizes', default='0,2048,1600,1024,768', help='Lados máximos separados por coma')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--quality', type=int, default=80)
+    parser.add_argument('--color', action='store_true', help='No convertir a escala de grises')
+    parser.add_argument('--out', help='Guardar resultados en este JSON')
+    args = parser.parse_args()
+
+    files = _collect_images(args.images)
+    if not files:
+        parser.error('No se encontraron imágenes')
+    labels = {}
+    if args.labels:
+        with open(args.labels, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+    sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+
+    rows = run(files, sizes, labels, args.repeat, not args.color, args.quality)
+
+    header = f"{'max_dim':>9} {'avg_kb':>8} {'p50_ms':>9} {'p95_ms':>9} {'errors':>7} {'amount':>7} {'categ':>7}"
+    print(header)
+    print('-' * len(header))
+    for r in rows:
+        print(f"{r['max_dim']!s:>9} {r['avg_kb']:>8} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['errors']:>7} "
+              f"{r['amount_acc']!s:>7} {r['category_acc']!s:>7}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'images': len(files), 'results': rows}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Verifica con EXPLAIN que los queries de los blueprints usen índices (sin full scan)
+
+Uso (desde ant5-farms-backend/, con la BD local de pruebas migrada):
+    python -m scripts.check_indexes
+    python -m scripts.check_indexes --verbose   # imprime el plan de cada sentencia
+
+Crea un usuario temporal, recorre los endpoints (registro, login, granja, hojas, hormigas,
+metas, gastos, resumen, dashboard) y guarda la primera ejecución de cada sentencia distinta.
+Después corre EXPLAIN sobre cada una con sus mismos parámetros y falla (exit 1) si alguna
+tabla se lee completa (type ALL o index sin llave). category y ants son catálogos chicos que
+se leen completos a propósito. Los INSERT ... VALUES no leen tablas y no se revisan.
+Con tablas casi vacías MySQL puede preferir un scan aunque exista el índice: correrlo sobre
+una base con datos (ej. después de scripts.bench_api --keep)
+El usuario temporal se crea y se borra en la BD configurada: con un DB_HOST que no es local
+se niega a correr salvo con --allow-remote
+"""
+import argparse
+import os
+import re
+import sys
+import uuid
+
+os.environ.setdefault('RECEIPT_ANALYZER', 'fake')
+os.environ.setdefault('FAKE_ANALYZER_LATENCY_MS', '0')
+os.environ.setdefault('FAKE_ANALYZER_JITTER_MS', '0')
+
+from app import app
+from config.db import DBSession, execute_query, transaction
+from config.query_log import normalize_sql
+from scripts.local_db import add_allow_remote, require_local_db
+
+# Catálogos que se leen completos (servidos desde memoria por reference_data)
+FULL_SCAN_OK = {'category', 'ants'}
+
+_TABLE_RE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(?!ON\b|SET\b|WHERE\b|LEFT\b|INNER\b|JOIN\b|ORDER\b|GROUP\b|LIMIT\b)(\w+))?',
+                       re.IGNORECASE)
+_INSERT_VALUES_RE = re.compile(r'^\s*INSERT\b[^()]*\([^)]*\)\s*VALUES\b', re.IGNORECASE)
+
+
+def capture_statements(client):
+    """Recorre los endpoints con un usuario temporal; regresa {sql_normalizado: (endpoint, query, params)}"""
+    captured = {}
+    original = DBSession.execute
+    current = {'endpoint': 'startup'}
+
+    def execute(self, query, params=None, fetch=False, rowcount=False, many=False):
+        sql = normalize_sql(query)
+        if sql not in captured:
+            first = params[0] if many and params else params
+            captured[sql] = (current['endpoint'], query, first)
+        return original(self, query, params, fetch=fetch, rowcount=rowcount, many=many)
+
+    def call(endpoint, fn):
+        current['endpoint'] = endpoint
+        return fn()
+
+    with transaction():
+        ants = execute_query("SELECT id_ant FROM ants ORDER BY id_ant LIMIT 1", fetch=True) or []
+
+    username = f"idx-{uuid.uuid4().hex[:12]}"
+    DBSession.execute = execute
+    try:
+        response = call('POST /api/auth/register', lambda: client.post(
+            '/api/auth/register', json={'username': username, 'password': 'x'}))
+        user_id = (response.get_json() or {}).get('user_id')
+        if not user_id:
+            raise RuntimeError(f"no se pudo crear el usuario temporal ({response.status_code})")
+
+        login = {'username': username, 'password': 'x'}
+        call('PUT /api/auth/login', lambda: client.put('/api/auth/login', json=login))
+        call('PUT /api/auth/login', lambda: client.put('/api/auth/login', json=login))
+
+        call('GET /api/farm/<id>', lambda: client.get(f'/api/farm/{user_id}'))
+        call('GET /api/farm/<id>?fields', lambda: client.get(f'/api/farm/{user_id}?fields=leaves_count'))
+        call('PUT /api/farm/<id>/leaves', lambda: client.put(f'/api/farm/{user_id}/leaves', json={'leaves': 5}))
+        call('PUT /api/farm/<id>/leaves', lambda: client.put(f'/api/farm/{user_id}/leaves', json={'leaves': -10 ** 6}))
+
+        if ants:
+            ant_id = ants[0]['id_ant']
+            call('PUT /api/farm/<id>/ants/<ant>', lambda: client.put(f'/api/farm/{user_id}/ants/{ant_id}'))
+            call('POST /api/farm/<id>/ants', lambda: client.post(
+                f'/api/farm/{user_id}/ants', json={'ants': [{'ant_id': ant_id, 'quantity': 2}]}))
+
+        call('GET /api/goals/<id>', lambda: client.get(f'/api/goals/{user_id}'))
+        call('PUT /api/goals/bulk/<id>', lambda: client.put(
+            f'/api/goals/bulk/{user_id}', json={'goals': [{'category_id': c, 'money': 100} for c in range(1, 7)]}))
+
+        response = call('POST /api/expenses', lambda: client.post(
+            '/api/expenses/', json={'user_id': user_id, 'category_id': 1, 'amount': 12.5}))
+        expense_id = (response.get_json() or {}).get('expense_id')
+        call('GET /api/expenses/weekly/<id>', lambda: client.get(f'/api/expenses/weekly/{user_id}'))
+        call('GET /api/expenses/summary/<id>', lambda: client.get(f'/api/expenses/summary/{user_id}'))
+        call('GET /api/dashboard/<id>', lambda: client.get(f'/api/dashboard/{user_id}'))
+        if expense_id:
+            call('DELETE /api/expenses/<id>', lambda: client.delete(f'/api/expenses/{expense_id}'))
+    finally:
+        DBSession.execute = original
+        with transaction():
+            execute_query("DELETE FROM users WHERE username = %s", (username,))
+    return captured
+
+
+def table_aliases(query):
+    """{alias_o_nombre: tabla} según FROM / JOIN / UPDATE / INTO"""
+    aliases = {}
+    for table, alias in _TABLE_RE.findall(query):
+        aliases[table] = table
+        if alias:
+            aliases[alias] = table
+    return aliases
+
+
+def full_scans(query, plan):
+    """[(tabla, type, possible_keys)] de las tablas del plan que se leen completas"""
+    aliases = table_aliases(query)
+    scans = []
+    for row in plan:
+        name = row.get('table') or ''
+        if not name or name.startswith('<'):
+            continue   # tablas derivadas / subqueries materializados
+        table = aliases.get(name, name)
+        scan = row.get('type') == 'ALL' or (row.get('type') == 'index' and not row.get('key'))
+        if scan and table not in FULL_SCAN_OK:
+            scans.append((table, row.get('type'), row.get('possible_keys')))
+    return scans
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EXPLAIN de los queries de los blueprints')
+    parser.add_argument('--verbose', action='store_true', help='Imprimir el plan de cada sentencia')
+    add_allow_remote(parser)
+    args = parser.parse_args()
+    require_local_db(args.allow_remote, 'el chequeo crea y borra un usuario temporal')
+
+    captured = capture_statements(app.test_client())
+    failures = 0
+    checked = 0
+    ok = 0
+    for sql, (endpoint, query, params) in sorted(captured.items(), key=lambda item: item[1][0]):
+        if _INSERT_VALUES_RE.match(query):
+            continue
+        with transaction():
+            plan = execute_query("EXPLAIN " + query, params, fetch=True)
+        if plan is None:
+            failures += 1
+            print(f"FAIL {endpoint}: EXPLAIN falló para {sql}")
+            continue
+        checked += 1
+        scans = full_scans(query, plan)
+        failures += 1 if scans else 0
+        ok += 0 if scans else 1
+        print(f"{'FAIL' if scans else 'ok  '} {endpoint}: {sql}")
+        for table, kind, possible in scans:
+            print(f"       full scan de {table} (type {kind}, possible_keys {possible})")
+        if args.verbose:
+            for row in plan:
+                print(f"       {row.get('table')}: type={row.get('type')} key={row.get('key')} rows={row.get('rows')}")
+    print(f"{ok}/{checked} sentencias sin full scan")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Verifica contra una base real que las escrituras respondan los mismos códigos
+ahora que confían en las FK (migración 0003) en vez de validar con SELECT
+
+Uso (desde ant5-farms-backend/, con la BD migrada):
+    python -m scripts.check_response_codes
+    python -m scripts.check_response_codes --user-id 1   # además el camino feliz con un usuario real
+
+Los casos de error terminan en rollback; el camino feliz borra el gasto que crea
+y vuelve a guardar las metas que ya tenía el usuario. Como escribe en ese usuario, --user-id
+con un DB_HOST que no es local requiere --allow-remote. Sale con código 1 si algo no coincide
+Opcional: los mismos códigos los cubren sin BD tests/test_response_codes.py (python -m pytest)
+"""
+import argparse
+import io
+import os
+import sys
+
+# Análisis local e instantáneo: aquí solo importa qué pasa al guardar
+os.environ.setdefault('RECEIPT_ANALYZER', 'fake')
+os.environ.setdefault('FAKE_ANALYZER_LATENCY_MS', '0')
+os.environ.setdefault('FAKE_ANALYZER_JITTER_MS', '0')
+
+from app import app
+from config.db import transaction, execute_query
+from scripts.local_db import add_allow_remote, require_local_db
+
+FAKE_IMAGE = b'\xff\xd8\xff\xe0 recibo de prueba'
+
+
+def _goals_payload(money_by_category):
+    return {'goals': [{'category_id': c, 'money': money_by_category.get(c, 0)} for c in range(1, 7)]}
+
+
+def _image(name='ticket.jpg'):
+    return (io.BytesIO(FAKE_IMAGE), name, 'image/jpeg')
+
+
+def run_checks(client, missing_user, user_id=None):
+    """[(descripción, esperado, obtenido)]"""
+    results = []
+
+    def check(description, expected, response):
+        results.append((description, expected, response.status_code))
+        return response
+
+    check('POST /api/expenses usuario inexistente', 404,
+          client.post('/api/expenses/', json={'user_id': missing_user, 'category_id': 1, 'amount': 10}))
+    check('POST /api/expenses categoría inexistente', 404,
+          client.post('/api/expenses/', json={'user_id': user_id or missing_user, 'category_id': 99, 'amount': 10}))
+    check('POST /api/expenses sin monto', 400,
+          client.post('/api/expenses/', json={'user_id': missing_user, 'category_id': 1}))
+    check('POST /api/expenses/analyze usuario inexistente', 404,
+          client.post('/api/expenses/analyze', data={'user_id': str(missing_user), 'image': _image()},
+                      content_type='multipart/form-data'))
+    check('POST /api/expenses/analyze/batch usuario inexistente', 404,
+          client.post('/api/expenses/analyze/batch',
+                      data={'user_id': str(missing_user), 'images': [_image('a.jpg'), _image('b.jpg')]},
+                      content_type='multipart/form-data'))
+    check('PUT /api/goals/bulk usuario inexistente', 404,
+          client.put(f'/api/goals/bulk/{missing_user}', json=_goals_payload({})))
+
+    if user_id:
+        response = check('POST /api/expenses usuario existente', 201,
+                         client.post('/api/expenses/', json={'user_id': user_id, 'category_id': 1, 'amount': 0.01}))
+        expense_id = (response.get_json() or {}).get('expense_id')
+        if expense_id:
+            check('DELETE /api/expenses gasto creado', 200, client.delete(f'/api/expenses/{expense_id}'))
+
+        goals = (client.get(f'/api/goals/{user_id}').get_json() or {}).get('goals', [])
+        current = {g['category_id']: g['money'] for g in goals}
+        check('PUT /api/goals/bulk usuario existente', 200,
+              client.put(f'/api/goals/bulk/{user_id}', json=_goals_payload(current)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Códigos de respuesta de las escrituras con FK')
+    parser.add_argument('--user-id', type=int, help='Usuario existente para probar también el camino feliz')
+    add_allow_remote(parser)
+    args = parser.parse_args()
+    if args.user_id:
+        require_local_db(args.allow_remote, '--user-id crea y borra gastos y reescribe metas de ese usuario')
+
+    with transaction():
+        rows = execute_query("SELECT COALESCE(MAX(id), 0) + 1000 AS missing FROM users", fetch=True)
+    missing_user = rows[0]['missing']
+
+    results = run_checks(app.test_client(), missing_user, args.user_id)
+    failures = 0
+    for description, expected, got in results:
+        ok = expected == got
+        failures += 0 if ok else 1
+        print(f"{'ok  ' if ok else 'FAIL'} {description}: esperado {expected}, obtenido {got}")
+    print(f"{len(results) - failures}/{len(results)} correctos")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Compara el prompt estructurado (esquema JSON) contra el prompt de texto libre
+
+Uso (desde ant5-farms-backend/):
+    python -m scripts.compare_prompts ../ticket-supreme-1.jpg ../2971_6518_3.jpg --repeat 3
+
+Manda cada imagen a Gemini en ambos modos (sin caché ni preprocesado) y muestra
+por modo: tokens de prompt/salida/thinking promedio, latencia y fallos de parseo.
+"""
+import argparse
+import json
+import os
+
+from dotenv import load_dotenv
+from google import genai
+
+from services.receipts import ReceiptError, call_gemini, guess_mime_type, usage_stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Comparar prompt estructurado vs texto libre')
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = genai.Client(api_key=os.environ.get('GENAI_API_KEY'))
+
+    # Contador limpio solo para esta corrida
+    usage_stats.reset()
+    for path in args.images:
+        with open(path, 'rb') as f:
+            image_bytes = f.read()
+        for _ in range(args.repeat):
+            for structured in (False, True):
+                try:
+                    call_gemini(client, image_bytes, guess_mime_type(path), structured=structured)
+                except ReceiptError:
+                    pass
+
+    print(json.dumps(usage_stats.snapshot(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
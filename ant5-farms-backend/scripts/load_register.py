@@ -0,0 +1,127 @@
+"""
+Carga de POST /api/auth/register con usernames que chocan, contra una base real
+
+Uso (desde ant5-farms-backend/, con la BD local de pruebas migrada):
+    python -m scripts.load_register --threads 32 --requests 2000 --names 200
+
+Cada hilo registra nombres tomados al azar de un conjunto chico (--names), así que
+muchos registros compiten por el mismo username. Se reporta el throughput y la latencia,
+y se verifica que:
+- cada nombre se creó una sola vez (el resto respondió 409)
+- cada usuario creado tiene su granja y sus 6 metas (la transacción no deja usuarios a medias)
+Los usuarios creados se borran al terminar (la FK en cascada borra granja y metas) salvo con --keep
+Con un DB_HOST que no es local se niega a correr salvo con --allow-remote
+Opcional: los códigos 201/409 los cubre sin BD tests/test_register.py
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+from config.db import execute_query, transaction
+from scripts.local_db import add_allow_remote, require_local_db
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_load(prefix, threads, total, names, seed):
+    lock = threading.Lock()
+    statuses = {}
+    latencies = []
+    created = {}   # username -> user_id
+    # El resto de la división se reparte entre los primeros hilos: en total son exactamente total
+    per_thread, remainder = divmod(total, threads)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = app.test_client()
+        for _ in range(per_thread + (1 if index < remainder else 0)):
+            username = f"{prefix}{rng.randrange(names)}"
+            start = time.perf_counter()
+            response = client.post('/api/auth/register', json={'username': username, 'password': 'x'})
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                latencies.append(elapsed)
+                if response.status_code == 201:
+                    created.setdefault(username, []).append(response.get_json()['user_id'])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    return statuses, latencies, created, time.perf_counter() - started
+
+
+def check_integrity(prefix):
+    """Usuarios del prefijo con username repetido o sin granja/metas completas"""
+    query = """
+        SELECT u.id, u.username,
+               (SELECT COUNT(*) FROM farm f WHERE f.user_id = u.id) AS farms,
+               (SELECT COUNT(*) FROM goal g WHERE g.user_id = u.id) AS goals
+        FROM users u
+        WHERE u.username LIKE %s
+    """
+    with transaction():
+        rows = execute_query(query, (prefix + '%',), fetch=True) or []
+    seen = {}
+    problems = []
+    for row in rows:
+        seen[row['username']] = seen.get(row['username'], 0) + 1
+        if row['farms'] != 1 or row['goals'] != 6:
+            problems.append(f"usuario {row['id']} ({row['username']}): {row['farms']} granjas, {row['goals']} metas")
+    problems += [f"username {name} repetido {count} veces" for name, count in seen.items() if count > 1]
+    return len(rows), problems
+
+
+def cleanup(prefix):
+    with transaction():
+        execute_query("DELETE FROM users WHERE username LIKE %s", (prefix + '%',))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Carga de registros concurrentes con usernames repetidos')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=1000, help='Registros totales')
+    parser.add_argument('--names', type=int, default=100, help='Usernames distintos (menos = más choques)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--keep', action='store_true', help='No borrar los usuarios creados')
+    add_allow_remote(parser)
+    args = parser.parse_args()
+    require_local_db(args.allow_remote, 'la carga crea usuarios en esa base')
+
+    prefix = f"load-{uuid.uuid4().hex[:8]}-"
+    try:
+        statuses, latencies, created, elapsed = run_load(prefix, args.threads, args.requests, args.names, args.seed)
+        users, problems = check_integrity(prefix)
+    finally:
+        if not args.keep:
+            cleanup(prefix)
+
+    done = sum(statuses.values())
+    print(f"{done} registros en {elapsed:.1f}s ({done / elapsed:.0f} req/s) con {args.threads} hilos")
+    print(f"Códigos: {dict(sorted(statuses.items()))}")
+    print(f"Latencia p50 {_percentile(latencies, 50):.1f}ms  p95 {_percentile(latencies, 95):.1f}ms  "
+          f"p99 {_percentile(latencies, 99):.1f}ms")
+    print(f"{users} usuarios en BD, {len(created)} usernames creados por la API")
+
+    duplicated = [name for name, ids in created.items() if len(ids) > 1]
+    problems += [f"la API respondió 201 más de una vez para {name}" for name in duplicated]
+    unexpected = {code: n for code, n in statuses.items() if code not in (201, 409)}
+    if unexpected:
+        problems.append(f"códigos inesperados: {unexpected}")
+    for problem in problems:
+        print(f"FAIL {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
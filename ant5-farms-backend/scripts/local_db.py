@@ -0,0 +1,25 @@
+"""
+Guardia para los scripts que escriben en la BD configurada (benchmarks, pruebas de carga/estrés)
+Solo corren contra una BD local; otra base requiere --allow-remote explícito
+"""
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# DB_HOST que se consideran locales (vacío = default del conector, 127.0.0.1)
+LOCAL_HOSTS = {'', 'localhost', '127.0.0.1', '::1'}
+
+
+def add_allow_remote(parser):
+    parser.add_argument('--allow-remote', action='store_true',
+                        help='Permitir un DB_HOST que no es local (el script escribe datos en esa base)')
+
+
+def require_local_db(allow_remote, what='el script escribe datos'):
+    """Sale del proceso si DB_HOST no es local y no se pasó --allow-remote"""
+    load_dotenv()
+    host = (os.getenv('DB_HOST') or '').strip().lower()
+    if host not in LOCAL_HOSTS and not allow_remote:
+        sys.exit(f"DB_HOST={host} no es local: {what}. "
+                 f"Usar una base de pruebas local o pasar --allow-remote")
@@ -0,0 +1,132 @@
+"""
+Migraciones versionadas del esquema (carpeta migrations/, archivos NNNN_nombre.sql)
+
+Uso (desde ant5-farms-backend/):
+    python -m scripts.migrate            # aplica las pendientes en orden
+    python -m scripts.migrate --status   # lista aplicadas y pendientes
+
+Cada archivo aplicado queda registrado en schema_migrations. Las sentencias se
+separan por ';' al final de línea. En MySQL el DDL hace commit implícito, así que
+las migraciones deben poder reintentarse (IF NOT EXISTS, INSERT IGNORE, etc.)
+
+Un SELECT dentro de una migración es una verificación: si regresa filas la migración
+se detiene ahí (MigrationCheckFailed) y se muestran las filas. Sirve para
+datos que el DDL no acepta (huérfanos, duplicados) y que hay que revisar a mano
+en vez de borrarlos en silencio
+"""
+import argparse
+import os
+import re
+import sys
+
+from config.db import DBSession, transaction
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+_FILE_RE = re.compile(r'^(\d{4})_[\w-]+\.sql$')
+
+# Filas que se muestran por verificación fallida
+_REPORT_ROWS = 20
+
+
+class MigrationCheckFailed(Exception):
+    """Una verificación (SELECT) de la migración regresó filas"""
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+        lines = [f"{name}: la verificación encontró {len(rows)} filas, la migración se detuvo"]
+        lines += [f"    {row}" for row in rows[:_REPORT_ROWS]]
+        if len(rows) > _REPORT_ROWS:
+            lines.append(f"    ... y {len(rows) - _REPORT_ROWS} más")
+        super().__init__('\n'.join(lines))
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """[(version, ruta)] ordenadas por versión"""
+    found = []
+    for name in os.listdir(directory):
+        match = _FILE_RE.match(name)
+        if match:
+            found.append((match.group(1), os.path.join(directory, name)))
+    return sorted(found)
+
+
+def split_statements(sql):
+    """Separa un archivo en sentencias (quita comentarios -- de línea completa)"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    statements = re.split(r';\s*$', '\n'.join(lines), flags=re.MULTILINE)
+    return [s.strip() for s in statements if s.strip()]
+
+
+def is_check(statement):
+    """True si la sentencia es una verificación (SELECT) y no un cambio"""
+    return re.match(r'SELECT\b', statement, re.IGNORECASE) is not None
+
+
+def applied_versions(session):
+    session.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(16) PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return {r['version'] for r in session.execute("SELECT version FROM schema_migrations", fetch=True)}
+
+
+def migrate(directory=MIGRATIONS_DIR, out=sys.stdout):
+    """Aplica las migraciones pendientes; regresa las versiones aplicadas"""
+    session = DBSession()
+    done = []
+    try:
+        applied = applied_versions(session)
+        session.commit()
+        for version, path in list_migrations(directory):
+            if version in applied:
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                statements = split_statements(f.read())
+            print(f"→ {os.path.basename(path)} ({len(statements)} sentencias)", file=out)
+            for statement in statements:
+                if is_check(statement):
+                    rows = session.execute(statement, fetch=True)
+                    if rows:
+                        raise MigrationCheckFailed(os.path.basename(path), rows)
+                else:
+                    session.execute(statement)
+            session.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, os.path.basename(path))
+            )
+            session.commit()
+            done.append(version)
+    except Exception:
+        session.rollback()
+        raise
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migraciones del esquema')
+    parser.add_argument('--status', action='store_true', help='Solo mostrar aplicadas/pendientes')
+    args = parser.parse_args()
+
+    if args.status:
+        with transaction() as session:
+            applied = applied_versions(session)
+        for version, path in list_migrations():
+            mark = 'x' if version in applied else ' '
+            print(f"[{mark}] {os.path.basename(path)}")
+        return
+
+    try:
+        done = migrate()
+    except MigrationCheckFailed as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(f"{len(done)} migraciones aplicadas" if done else 'Sin migraciones pendientes')
+
+
+if __name__ == '__main__':
+    main()
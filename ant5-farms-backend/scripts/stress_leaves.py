@@ -0,0 +1,125 @@
+"""
+Prueba de concurrencia de PUT /api/farm/<user_id>/leaves contra una base real
+
+Uso (desde ant5-farms-backend/, con DB_* apuntando a una base de pruebas local):
+    python -m scripts.stress_leaves --threads 32 --ops 200 --start 100
+
+Registra un usuario temporal y muchos hilos le suman y restan hojas a la vez. Al final
+el saldo debe ser exactamente start + la suma de los cambios que respondieron 204, y nunca
+negativo. Con el viejo leer-calcular-escribir se pierden actualizaciones y no cuadra.
+El usuario temporal se borra al terminar (la FK en cascada borra su granja). Sale con
+código 1 si no cuadra. Con un DB_HOST que no es local se niega a correr salvo con --allow-remote
+Con LEAVES_WRITE_BEHIND=1 también reporta cuántos cambios absorbió cada UPDATE
+Opcional: el UPDATE condicional (mínimo del WHERE y códigos) lo cubre sin BD tests/test_leaves.py;
+la atomicidad bajo concurrencia solo se puede probar aquí, con MySQL real
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app
+from config.db import execute_query, transaction
+from scripts.local_db import add_allow_remote, require_local_db
+from services.leaves_buffer import get_leaves_buffer
+
+
+def _create_user():
+    """Registra un usuario temporal por la API (usuario, granja y metas) → user_id"""
+    username = f"stress-{uuid.uuid4().hex[:12]}"
+    response = app.test_client().post('/api/auth/register', json={'username': username, 'password': 'x'})
+    user_id = (response.get_json() or {}).get('user_id')
+    if not user_id:
+        raise SystemExit(f"No se pudo crear el usuario temporal ({response.status_code})")
+    return user_id
+
+
+def _delete_user(user_id):
+    with transaction():
+        execute_query("DELETE FROM users WHERE id = %s", (user_id,))
+
+
+def _balance(user_id):
+    with transaction():
+        rows = execute_query("SELECT leaves_count FROM farm WHERE user_id = %s", (user_id,), fetch=True)
+    if not rows:
+        raise SystemExit(f"El usuario {user_id} no tiene granja")
+    return rows[0]['leaves_count']
+
+
+def _set_balance(user_id, leaves):
+    with transaction():
+        execute_query("UPDATE farm SET leaves_count = %s WHERE user_id = %s", (leaves, user_id))
+
+
+def hammer(user_id, threads, ops, max_delta, seed):
+    """Regresa (suma aplicada, aplicados, rechazados, errores)"""
+    lock = threading.Lock()
+    totals = {'applied': 0, 'ok': 0, 'rejected': 0, 'errors': 0}
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = app.test_client()
+        for _ in range(ops):
+            delta = rng.randint(-max_delta, max_delta) or 1
+            status = client.put(f'/api/farm/{user_id}/leaves', json={'leaves': delta}).status_code
+            with lock:
+                if status == 204:
+                    totals['applied'] += delta
+                    totals['ok'] += 1
+                elif status == 400:
+                    totals['rejected'] += 1
+                else:
+                    totals['errors'] += 1
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, range(threads)))
+    return totals['applied'], totals['ok'], totals['rejected'], totals['errors']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estrés de actualizaciones concurrentes de hojas')
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--ops', type=int, default=100, help='Operaciones por hilo')
+    parser.add_argument('--start', type=int, default=50, help='Saldo inicial (bajo = más rechazos por saldo)')
+    parser.add_argument('--max-delta', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    add_allow_remote(parser)
+    args = parser.parse_args()
+    require_local_db(args.allow_remote, 'el estrés crea un usuario y escribe su saldo')
+
+    user_id = _create_user()
+    try:
+        _set_balance(user_id, args.start)
+        started = time.perf_counter()
+        applied, ok, rejected, errors = hammer(user_id, args.threads, args.ops, args.max_delta, args.seed)
+        elapsed = time.perf_counter() - started
+        buffer = get_leaves_buffer()
+        if buffer is not None:
+            # Write-behind: escribir lo pendiente antes de comparar con la BD
+            buffer.flush()
+        final = _balance(user_id)
+    finally:
+        _delete_user(user_id)
+
+    expected = args.start + applied
+    total = args.threads * args.ops
+    print(f"{total} operaciones en {elapsed:.1f}s ({total / elapsed:.0f} ops/s): "
+          f"{ok} aplicadas, {rejected} saldo insuficiente, {errors} errores")
+    print(f"Saldo final {final}, esperado {expected}")
+    if buffer is not None:
+        stats = buffer.stats()
+        print(f"Write-behind: {stats['ops']} cambios en {stats['statements']} UPDATE "
+              f"({stats['ops_per_statement']} por sentencia)")
+
+    if final != expected or final < 0 or errors:
+        print('FAIL: el saldo no cuadra con los cambios aplicados')
+        sys.exit(1)
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
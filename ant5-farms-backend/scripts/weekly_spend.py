@@ -0,0 +1,51 @@
+"""
+Mantenimiento del agregado weekly_spend
+
+Uso (desde ant5-farms-backend/):
+    python -m scripts.weekly_spend verify                 # reporta diferencias contra expenses
+    python -m scripts.weekly_spend verify --fix           # y reconstruye si hay diferencias
+    python -m scripts.weekly_spend rebuild --user-id 3    # recalcula un usuario (o todos sin --user-id)
+
+Sale con código 1 si verify encuentra diferencias y no se pidió --fix
+"""
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+from config.db import transaction
+from services import weekly_spend
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconstruir / verificar weekly_spend')
+    parser.add_argument('command', choices=('rebuild', 'verify'))
+    parser.add_argument('--user-id', type=int, help='Limitar a un usuario')
+    parser.add_argument('--fix', action='store_true', help='Con verify: reconstruir si hay diferencias')
+    args = parser.parse_args()
+    load_dotenv()
+
+    if args.command == 'rebuild':
+        with transaction():
+            rows = weekly_spend.rebuild(args.user_id)
+        print(f"weekly_spend reconstruido ({rows or 0} filas)")
+        return
+
+    with transaction():
+        drift = weekly_spend.verify(args.user_id)
+    for user_id, week, category_id, want, have in drift:
+        print(f"user={user_id} semana={week} categoría={category_id}: "
+              f"esperado {want[0]:.2f} ({want[1]}) guardado {have[0]:.2f} ({have[1]})")
+    if not drift:
+        print('weekly_spend al día')
+        return
+
+    if not args.fix:
+        sys.exit(1)
+    with transaction():
+        rows = weekly_spend.rebuild(args.user_id)
+    print(f"{len(drift)} diferencias; weekly_spend reconstruido ({rows or 0} filas)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+"""
+Backends para analizar recibos
+- GeminiAnalyzer: el modelo real (requiere GENAI_API_KEY y red)
+- FakeAnalyzer: sustituto local determinista para load tests, benchmarks y CI
+Se elige con RECEIPT_ANALYZER=gemini|fake (gemini por defecto)
+"""
+import abc
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from services.receipts import (
+    CAT_MAP, GEMINI_MODEL, PROMPT_VERSION, ReceiptError, call_gemini, normalize_receipt, usage_stats
+)
+
+
+class ReceiptAnalyzer(abc.ABC):
+    """Interfaz: analyze(image_bytes, mime_type) -> dict con store, amount, category_id, category_name"""
+
+    name = 'base'
+
+    @property
+    def version(self):
+        """Identifica los resultados de este backend (parte de la llave de caché)"""
+        return f"{self.name}:{PROMPT_VERSION}"
+
+    @abc.abstractmethod
+    def analyze(self, image_bytes, mime_type):
+        """Lanza ReceiptError si el recibo no se pudo analizar"""
+
+
+class GeminiAnalyzer(ReceiptAnalyzer):
+    name = 'gemini'
+
+    def __init__(self, api_key=None, model=GEMINI_MODEL):
+        self.model = model
+        self._api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # El cliente se crea al primer análisis, no al importar la app
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from google import genai
+                    self._client = genai.Client(api_key=self._api_key or os.environ.get('GENAI_API_KEY'))
+        return self._client
+
+    def analyze(self, image_bytes, mime_type):
+        return call_gemini(self.client, image_bytes, mime_type, model=self.model)
+
+
+class FakeAnalyzer(ReceiptAnalyzer):
+    """
+    Analizador local sin red
+    - latency_ms / jitter_ms: latencia simulada; distribution = fixed, uniform, normal o lognormal
+    - error_rate: fracción de llamadas que fallan como lo haría Gemini (502)
+    - canned: {sha256_de_la_imagen: salida_del_modelo} para respuestas fijas por imagen;
+      una salida puede traer "latency_ms" propio o {"error": "..."} para simular un ticket ilegible
+    - seed: semilla para que latencias y errores se repitan entre corridas
+    Sin respuesta fija, el recibo se deriva del hash de la imagen (misma imagen → mismo resultado)
+    """
+
+    name = 'fake'
+
+    STORES = ('OXXO', 'Starbucks', 'Uber', 'Spotify', 'Soriana', 'Tacos El Güero', '7-Eleven')
+
+    def __init__(self, latency_ms=800.0, jitter_ms=200.0, distribution='normal', error_rate=0.0, canned=None, seed=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.canned = canned or {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        canned = {}
+        canned_path = os.getenv('FAKE_ANALYZER_CANNED')
+        if canned_path:
+            with open(canned_path, 'r', encoding='utf-8') as f:
+                canned = json.load(f)
+        seed = os.getenv('FAKE_ANALYZER_SEED')
+        return cls(
+            latency_ms=float(os.getenv('FAKE_ANALYZER_LATENCY_MS', '800')),
+            jitter_ms=float(os.getenv('FAKE_ANALYZER_JITTER_MS', '200')),
+            distribution=os.getenv('FAKE_ANALYZER_DISTRIBUTION', 'normal'),
+            error_rate=float(os.getenv('FAKE_ANALYZER_ERROR_RATE', '0')),
+            canned=canned,
+            seed=int(seed) if seed else None,
+        )
+
+    def analyze(self, image_bytes, mime_type):
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        output = self.canned.get(digest)
+
+        with self._lock:
+            delay = self._sample_latency()
+            fail = self._rng.random() < self.error_rate
+        if output and 'latency_ms' in output:
+            delay = float(output['latency_ms']) / 1000
+
+        start = time.perf_counter()
+        time.sleep(delay)
+        if fail:
+            usage_stats.record(self.name, time.perf_counter() - start, error=True)
+            raise ReceiptError('Error llamando a Gemini', 502, error='fake analyzer: error simulado')
+
+        if output is None:
+            output = self._derive(digest)
+        usage_stats.record(self.name, time.perf_counter() - start)
+        return normalize_receipt({k: v for k, v in output.items() if k != 'latency_ms'})
+
+    def _sample_latency(self):
+        mean, jitter = self.latency_ms, self.jitter_ms
+        if self.distribution == 'fixed' or jitter <= 0:
+            value = mean
+        elif self.distribution == 'uniform':
+            value = self._rng.uniform(mean - jitter, mean + jitter)
+        elif self.distribution == 'lognormal':
+            # Cola larga como la de una API real: mediana = mean
+            value = self._rng.lognormvariate(0, jitter / mean if mean else 0) * mean
+        else:
+            value = self._rng.gauss(mean, jitter)
+        return max(0.0, value) / 1000
+
+    def _derive(self, digest):
+        n = int(digest[:12], 16)
+        category_id = n % len(CAT_MAP) + 1
+        return {
+            'store': self.STORES[n % len(self.STORES)],
+            'amount': round(10 + (n // 7) % 49000 / 100, 2),
+            'category_id': category_id,
+            'category_name': CAT_MAP[category_id],
+            'error': None,
+        }
+
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_analyzer():
+    """Backend activo según RECEIPT_ANALYZER (se crea al primer uso)"""
+    global _analyzer
+    if _analyzer is None:
+        with _analyzer_lock:
+            if _analyzer is None:
+                kind = os.getenv('RECEIPT_ANALYZER', 'gemini').lower()
+                if kind == 'fake':
+                    _analyzer = FakeAnalyzer.from_env()
+                elif kind == 'gemini':
+                    _analyzer = GeminiAnalyzer()
+                else:
+                    raise ValueError(f"RECEIPT_ANALYZER desconocido: {kind}")
+    return _analyzer
+
+
+def set_analyzer(analyzer):
+    """Reemplaza el backend activo (benchmarks y pruebas); None vuelve a leer RECEIPT_ANALYZER"""
+    global _analyzer
+    with _analyzer_lock:
+        _analyzer = analyzer
@@ -0,0 +1,273 @@
+"""
+Write-behind de hojas: junta los cambios pequeños y frecuentes (ruleta, tragamonedas)
+por usuario en memoria y los escribe en un solo UPDATE cada cierto tiempo o volumen
+Se activa con LEAVES_WRITE_BEHIND=1; sin él cada PUT /leaves escribe directo
+"""
+import atexit
+import os
+import threading
+import time
+
+from config.db import DBSession
+from config.metrics import registry
+from config.log import get_logger
+
+log = get_logger('leaves_buffer')
+
+# Usuarios por sentencia al hacer flush
+_CHUNK = 500
+
+
+class LeavesBuffer:
+    """
+    Buffer por proceso de deltas de hojas
+    - Saldo visible = saldo en BD al cargarlo (base) + deltas en escritura (in-flight) + deltas pendientes;
+      el no-negativo se valida contra él. Un flush mueve los pendientes a in-flight y solo los pasa
+      a la base cuando el commit terminó (si falla regresan a pendientes)
+    - flush_interval: segundos entre escrituras; flush_threshold: cambios pendientes que adelantan el flush
+    - base_ttl: segundos que se confía en la base sin actividad (otros procesos o el bonus
+      de login pueden haberla cambiado); forget() la descarta de inmediato
+    Los saldos solo son exactos dentro de un proceso: con varios workers cada uno tiene su buffer
+    """
+
+    def __init__(self, flush_interval=0.5, flush_threshold=200, base_ttl=30.0):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.base_ttl = base_ttl
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+
+        self._base = {}       # user_id -> (saldo en BD, último uso)
+        self._pending = {}    # user_id -> delta sin escribir
+        self._inflight = {}   # user_id -> delta del flush en curso (aún sin commit)
+        self._pending_ops = 0
+        self._base_seq = 0    # Cambia con cada commit de un flush o forget (ver _ensure_base)
+
+        # Métricas
+        self._ops = 0
+        self._rejected = 0
+        self._flushes = 0
+        self._statements = 0
+        self._rows_flushed = 0
+        self._flush_errors = 0
+        self._flush_ms_total = 0.0
+
+        self._thread = threading.Thread(target=self._loop, name='leaves-flush', daemon=True)
+        self._thread.start()
+
+    def apply(self, user_id, delta):
+        """Aplica un cambio contra el saldo visible → 'ok', 'insufficient' o 'not_found'"""
+        entry = self._ensure_base(user_id)
+        if entry is None:
+            return 'not_found'
+
+        with self._lock:
+            base = self._base.get(user_id, entry)[0]
+            pending = self._pending.get(user_id, 0)
+            if base + self._inflight.get(user_id, 0) + pending + delta < 0:
+                self._rejected += 1
+                return 'insufficient'
+            self._pending[user_id] = pending + delta
+            self._base[user_id] = (base, time.monotonic())
+            self._pending_ops += 1
+            self._ops += 1
+            full = self._pending_ops >= self.flush_threshold
+        if full:
+            self._wake.set()
+        return 'ok'
+
+    def pending(self, user_id):
+        """Delta aún no confirmado en BD (pendiente + el del flush en curso)"""
+        with self._lock:
+            return self._pending.get(user_id, 0) + self._inflight.get(user_id, 0)
+
+    def balance(self, user_id):
+        """Saldo visible del usuario (el mismo contra el que valida apply) o None si no tiene granja"""
+        entry = self._ensure_base(user_id)
+        if entry is None:
+            return None
+        with self._lock:
+            base = self._base.get(user_id, entry)[0]
+            return base + self._inflight.get(user_id, 0) + self._pending.get(user_id, 0)
+
+    def forget(self, user_id):
+        """
+        Descarta la base de un usuario (se cambió leaves_count por fuera del buffer)
+        Llamarlo después del commit de ese cambio; una carga que ya estaba leyendo se repite
+        """
+        with self._lock:
+            self._base.pop(user_id, None)
+            self._base_seq += 1
+
+    def flush(self):
+        """Escribe todos los deltas pendientes; regresa cuántos usuarios se actualizaron"""
+        with self._flush_lock:
+            with self._lock:
+                batch = {u: d for u, d in self._pending.items() if d}
+                # Siguen contando en el saldo visible hasta el commit
+                self._inflight = batch
+                self._pending = {}
+                self._pending_ops = 0
+            if not batch:
+                self._evict_idle()
+                return 0
+
+            start = time.perf_counter()
+            session = DBSession()
+            try:
+                items = list(batch.items())
+                for i in range(0, len(items), _CHUNK):
+                    self._write_chunk(session, items[i:i + _CHUNK])
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                log.error('error escribiendo hojas pendientes', extra={'error': str(e), 'users': len(batch)})
+                with self._lock:
+                    # Se reintentan en el siguiente flush
+                    for user_id, delta in batch.items():
+                        self._pending[user_id] = self._pending.get(user_id, 0) + delta
+                    self._inflight = {}
+                    self._flush_errors += 1
+                return 0
+
+            with self._lock:
+                for user_id, delta in batch.items():
+                    base = self._base.get(user_id)
+                    if base is not None:
+                        self._base[user_id] = (base[0] + delta, base[1])
+                self._inflight = {}
+                self._base_seq += 1
+                self._flushes += 1
+                self._rows_flushed += len(batch)
+                self._flush_ms_total += (time.perf_counter() - start) * 1000
+            self._evict_idle()
+            return len(batch)
+
+    def close(self):
+        """Detiene el hilo y escribe lo pendiente (se llama también al salir del proceso)"""
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': True,
+                'ops': self._ops,
+                'rejected': self._rejected,
+                'pending_users': len(self._pending),
+                'pending_ops': self._pending_ops,
+                'inflight_users': len(self._inflight),
+                'cached_balances': len(self._base),
+                'flushes': self._flushes,
+                'statements': self._statements,
+                'rows_flushed': self._rows_flushed,
+                'flush_errors': self._flush_errors,
+                'avg_flush_ms': round(self._flush_ms_total / self._flushes, 2) if self._flushes else 0.0,
+                # Cuántos PUT /leaves absorbe cada escritura a MySQL
+                'ops_per_statement': round(self._ops / self._statements, 1) if self._statements else None,
+            }
+
+    def _write_chunk(self, session, items):
+        cases = ' '.join(['WHEN %s THEN %s'] * len(items))
+        placeholders = ', '.join(['%s'] * len(items))
+        # GREATEST: otro proceso pudo gastar las mismas hojas; la BD nunca queda negativa
+        query = f"""
+            UPDATE farm
+            SET leaves_count = GREATEST(leaves_count + CASE user_id {cases} END, 0)
+            WHERE user_id IN ({placeholders})
+        """
+        params = [v for pair in items for v in pair] + [user_id for user_id, _ in items]
+        session.execute(query, params, rowcount=True)
+        with self._lock:
+            self._statements += 1
+
+    def _ensure_base(self, user_id):
+        """
+        Base del usuario, cargándola de la BD si no está → (saldo, último uso) o None si no existe
+        La lectura no debe cruzarse con un commit de flush ni con un forget: si el usuario está en
+        escritura se espera a que termine, y si hubo un commit o forget mientras se leía se vuelve a leer
+        """
+        while True:
+            with self._lock:
+                entry = self._base.get(user_id)
+                if entry is not None:
+                    return entry
+                seq = self._base_seq
+                writing = user_id in self._inflight
+            if writing:
+                with self._flush_lock:
+                    continue
+            balance = self._load_balance(user_id)
+            if balance is None:
+                return None
+            with self._lock:
+                if self._base_seq == seq and user_id not in self._inflight:
+                    return self._base.setdefault(user_id, (balance, time.monotonic()))
+
+    def _load_balance(self, user_id):
+        session = DBSession()
+        try:
+            rows = session.execute("SELECT leaves_count FROM farm WHERE user_id = %s", (user_id,), fetch=True)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return rows[0]['leaves_count'] if rows else None
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.base_ttl
+        with self._lock:
+            for user_id in [u for u, (_, used) in self._base.items()
+                            if used < cutoff and u not in self._pending and u not in self._inflight]:
+                del self._base[user_id]
+
+    def _loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._closed:
+                break
+            try:
+                self.flush()
+            except Exception:
+                log.exception('error en flush de hojas')
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_leaves_buffer():
+    """
+    Buffer del proceso si LEAVES_WRITE_BEHIND=1 (se crea al primer uso), si no None
+    Configurable con LEAVES_FLUSH_INTERVAL, LEAVES_FLUSH_THRESHOLD y LEAVES_BASE_TTL
+    """
+    global _buffer
+    if _buffer is None and os.getenv('LEAVES_WRITE_BEHIND', '0') == '1':
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = LeavesBuffer(
+                    flush_interval=float(os.getenv('LEAVES_FLUSH_INTERVAL', '0.5')),
+                    flush_threshold=int(os.getenv('LEAVES_FLUSH_THRESHOLD', '200')),
+                    base_ttl=float(os.getenv('LEAVES_BASE_TTL', '30')),
+                )
+                atexit.register(_buffer.close)
+    return _buffer
+
+
+@registry.register_collector
+def _leaves_buffer_metrics():
+    if _buffer is None:
+        return []
+    stats = _buffer.stats()
+    return [
+        ('leaves_buffer_ops_total', 'counter', 'Cambios de hojas absorbidos por el write-behind',
+         {(('outcome', 'ok'),): stats['ops'], (('outcome', 'insufficient'),): stats['rejected']}),
+        ('leaves_buffer_statements_total', 'counter', 'UPDATE escritos por el write-behind', {(): stats['statements']}),
+        ('leaves_buffer_pending_ops', 'gauge', 'Cambios de hojas sin escribir', {(): stats['pending_ops']}),
+    ]
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class ReceiptCache:
+    """
+    Caché de resultados de análisis de recibos por contenido de la imagen
+    - Nivel 1: LRU en memoria (max_items entradas)
+    - Nivel 2: archivos JSON en disk_dir, compartidos entre procesos
+    Ambos niveles expiran con ttl (segundos); el disco se recorta a max_disk_bytes
+    """
+
+    def __init__(self, max_items=256, disk_dir=None, ttl=7 * 24 * 3600, max_disk_bytes=50 * 1024 * 1024):
+        self.max_items = max_items
+        self.disk_dir = disk_dir
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()   # key -> (expires_at, value)
+        self._disk_bytes = None        # Se calcula al primer uso del disco
+
+        self._hits_memory = 0
+        self._hits_disk = 0
+        self._misses = 0
+        self._evictions = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(image_bytes, version):
+        """Hash de los bytes de la imagen + versión del prompt/modelo"""
+        digest = hashlib.sha256()
+        digest.update(version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Resultado guardado para key o None"""
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._memory.move_to_end(key)
+                    self._hits_memory += 1
+                    return item[1]
+                del self._memory[key]
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self._misses += 1
+                return None
+            self._hits_disk += 1
+            self._memory_put(key, value, now + self.ttl)
+        return value
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._memory_put(key, value, now + self.ttl)
+        self._disk_put(key, value)
+
+    def stats(self):
+        with self._lock:
+            hits = self._hits_memory + self._hits_disk
+            lookups = hits + self._misses
+            return {
+                'memory_items': len(self._memory),
+                'disk_bytes': self._disk_bytes or 0,
+                'hits_memory': self._hits_memory,
+                'hits_disk': self._hits_disk,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # -------------------------
+    #  Internos
+    # -------------------------
+    def _memory_put(self, key, value, expires_at):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl <= now:
+                self._disk_remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _disk_put(self, key, value):
+        if not self.disk_dir:
+            return
+        data = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        try:
+            # Escritura atómica: otro proceso nunca ve un archivo a medias
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += len(data)
+            over_limit = self._disk_bytes > self.max_disk_bytes
+        if over_limit:
+            self._disk_evict()
+
+    def _scan_disk_bytes(self):
+        total = 0
+        for entry in os.scandir(self.disk_dir):
+            if entry.name.endswith('.json'):
+                try:
+                    total += entry.stat().st_size
+                except OSError:
+                    pass
+        return total
+
+    def _disk_remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+            self._evictions += 1
+
+    def _disk_evict(self):
+        """Borra expirados y luego los más viejos hasta quedar bajo max_disk_bytes"""
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, entry.path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for mtime, size, path in files:
+            if total <= self.max_disk_bytes and mtime + self.ttl > now:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self._evictions += evicted
@@ -0,0 +1,149 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config.log import with_request_id
+
+
+class QueueFull(Exception):
+    """La cola de análisis está llena; el cliente debe reintentar más tarde"""
+
+
+class ReceiptJobQueue:
+    """
+    Cola acotada de análisis de recibos en segundo plano
+    - handler: función (**payload) -> (body, http_status) que hace el trabajo
+    - workers: hilos que procesan jobs al mismo tiempo
+    - max_pending: máximo de jobs esperando + corriendo antes de rechazar
+    - ttl: segundos que se conserva un job terminado para consultarlo
+    """
+
+    def __init__(self, handler, workers=2, max_pending=20, ttl=600):
+        self._handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='receipt-job')
+        self._cond = threading.Condition()
+        self._jobs = {}
+
+        # Métricas
+        self._queued = 0
+        self._running = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    def submit(self, **payload):
+        """Encola un job y regresa su estado inicial (lanza QueueFull si no hay cupo)"""
+        job_id = uuid.uuid4().hex
+        with self._cond:
+            self._purge_expired()
+            if self._queued + self._running >= self.max_pending:
+                self._rejected += 1
+                raise QueueFull(f"Hay {self.max_pending} recibos en proceso")
+            job = {
+                'id': job_id,
+                'status': 'queued',
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'http_status': None,
+                'result': None,
+            }
+            self._jobs[job_id] = job
+            self._queued += 1
+            self._submitted += 1
+            snapshot = dict(job)
+
+        # El job corre con el request id del POST que lo creó
+        self._executor.submit(with_request_id(self._run), job_id, payload)
+        return snapshot
+
+    def get(self, job_id, wait=0):
+        """
+        Estado de un job (o None si no existe)
+        - wait: segundos máximos para esperar a que termine (long-poll)
+        """
+        deadline = time.monotonic() + wait
+        with self._cond:
+            job = self._jobs.get(job_id)
+            while job is not None and job['status'] in ('queued', 'running'):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return dict(job) if job is not None else None
+
+    def stats(self):
+        """Profundidad de la cola, tiempos de espera y latencia por job"""
+        with self._cond:
+            started = self._completed + self._failed + self._running
+            finished = self._completed + self._failed
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'queue_depth': self._queued,
+                'running': self._running,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'avg_wait_ms': round(self._wait_total / started * 1000, 1) if started else 0.0,
+                'max_wait_ms': round(self._wait_max * 1000, 1),
+                'avg_latency_ms': round(self._latency_total / finished * 1000, 1) if finished else 0.0,
+                'max_latency_ms': round(self._latency_max * 1000, 1),
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    # -------------------------
+    #  Internos
+    # -------------------------
+    def _run(self, job_id, payload):
+        with self._cond:
+            job = self._jobs[job_id]
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+            waited = job['started_at'] - job['created_at']
+            self._queued -= 1
+            self._running += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        try:
+            body, http_status = self._handler(**payload)
+        except Exception as e:
+            body, http_status = {'success': False, 'message': 'Error procesando recibo', 'error': str(e)}, 500
+
+        with self._cond:
+            job['finished_at'] = time.time()
+            job['http_status'] = http_status
+            job['result'] = body
+            job['status'] = 'done' if http_status < 400 else 'failed'
+            latency = job['finished_at'] - job['started_at']
+            self._running -= 1
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+            if http_status < 400:
+                self._completed += 1
+            else:
+                self._failed += 1
+            self._cond.notify_all()
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['finished_at'] is not None and job['finished_at'] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,118 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config.log import get_logger
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow es opcional: sin él la imagen se manda tal cual
+    Image = None
+    ImageOps = None
+
+log = get_logger('receipt_preprocess')
+
+
+def preprocess_image(image_bytes, max_dim=1600, quality=80, grayscale=True):
+    """
+    Prepara una foto de recibo para el modelo
+    - Corrige la orientación EXIF
+    - Convierte a escala de grises (opcional)
+    - Reduce el lado mayor a max_dim (0 = sin reducir)
+    - Recomprime como JPEG con la calidad indicada
+    Regresa (bytes, mime_type); si no se gana nada regresa la imagen original
+    """
+    if Image is None:
+        return image_bytes, None
+
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img = ImageOps.exif_transpose(img)
+        if grayscale:
+            img = img.convert('L')
+        elif img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        if max_dim and max(img.size) > max_dim:
+            img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+
+        out = io.BytesIO()
+        img.save(out, format='JPEG', quality=quality, optimize=True)
+
+    data = out.getvalue()
+    if len(data) >= len(image_bytes):
+        return image_bytes, None
+    return data, 'image/jpeg'
+
+
+class ImagePreprocessor:
+    """
+    Ejecuta preprocess_image en un pool de hilos acotado y lleva métricas
+    - workers: imágenes procesadas al mismo tiempo (trabajo de CPU)
+    - timeout: segundos máximos; si se excede se usa la imagen original
+    - uplink_kbps: ancho de banda supuesto hacia el modelo para estimar la latencia ahorrada
+    """
+
+    def __init__(self, max_dim=1600, quality=80, grayscale=True, workers=2, timeout=5.0, uplink_kbps=1000):
+        self.max_dim = max_dim
+        self.quality = quality
+        self.grayscale = grayscale
+        self.timeout = timeout
+        self.uplink_kbps = uplink_kbps
+        self.enabled = Image is not None
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='receipt-preprocess')
+        self._lock = threading.Lock()
+        self._processed = 0
+        self._skipped = 0
+        self._errors = 0
+        self._bytes_in = 0
+        self._bytes_out = 0
+        self._elapsed = 0.0
+
+    def process(self, image_bytes, mime_type):
+        """Regresa (bytes, mime_type) listos para el modelo; nunca falla"""
+        if not self.enabled:
+            return image_bytes, mime_type
+
+        start = time.perf_counter()
+        try:
+            future = self._executor.submit(
+                preprocess_image, image_bytes, self.max_dim, self.quality, self.grayscale
+            )
+            data, new_mime = future.result(timeout=self.timeout)
+        except Exception as e:
+            log.warning('preprocesado fallido, se envía la imagen original', extra={'error': repr(e)})
+            with self._lock:
+                self._errors += 1
+            return image_bytes, mime_type
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._elapsed += elapsed
+            self._bytes_in += len(image_bytes)
+            self._bytes_out += len(data)
+            if new_mime is None:
+                self._skipped += 1
+            else:
+                self._processed += 1
+        return data, new_mime or mime_type
+
+    def stats(self):
+        with self._lock:
+            saved = self._bytes_in - self._bytes_out
+            calls = self._processed + self._skipped
+            # Tiempo de subida ahorrado (estimado) menos el costo de procesar
+            upload_saved_ms = saved / (self.uplink_kbps * 1024) * 1000 if self.uplink_kbps else 0.0
+            return {
+                'enabled': self.enabled,
+                'max_dim': self.max_dim,
+                'processed': self._processed,
+                'skipped': self._skipped,
+                'errors': self._errors,
+                'bytes_in': self._bytes_in,
+                'bytes_out': self._bytes_out,
+                'bytes_saved': saved,
+                'avg_preprocess_ms': round(self._elapsed / calls * 1000, 1) if calls else 0.0,
+                'est_upload_ms_saved': round(upload_saved_ms, 1),
+                'est_net_ms_saved': round(upload_saved_ms - self._elapsed * 1000, 1),
+            }
@@ -0,0 +1,305 @@
+"""
+Lógica compartida para leer recibos con Gemini
+La usan la API (routes/expenses.py), el backfill (scripts/backfill_receipts.py) y prueba.py
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from google.genai import types
+
+from config.metrics import registry
+from config.log import get_logger
+
+log = get_logger('gemini')
+
+def strip_markdown_fences(s: str) -> str:
+    s = (s or "").strip()
+    if s.startswith("```"):
+        lines = s.splitlines()
+        if lines and lines[0].lstrip().startswith("```"):
+            lines = lines[1:]
+        for i, line in enumerate(lines):
+            if line.strip().startswith("```"):
+                lines = lines[:i]
+                break
+        s = "\n".join(lines).strip()
+    return s
+
+def try_parse_json(s: str):
+    # 1) Directo
+    try:
+        return json.loads(s)
+    except Exception:
+        pass
+    # 2) Quitando fences
+    s2 = strip_markdown_fences(s)
+    try:
+        return json.loads(s2)
+    except Exception:
+        pass
+    # 3) Extraer bloque { ... }
+    start = s2.find("{")
+    end = s2.rfind("}")
+    if start != -1 and end != -1 and end > start:
+        candidate = s2[start:end+1]
+        return json.loads(candidate)
+    raise ValueError("No se pudo parsear JSON de Gemini.")
+
+CAT_MAP = {
+    1: "food",
+    2: "drinks",
+    3: "subscriptions",
+    4: "small_payment",
+    5: "transport",
+    6: "others",
+}
+NAME_TO_ID = {v: k for k, v in CAT_MAP.items()}
+
+# Prompt: fecha NO se toma del ticket; el backend fija date = fecha de subida (hoy)
+GEMINI_PROMPT = (
+    "LEE LA IMAGEN DEL RECIBO Y DEVUELVE EXCLUSIVAMENTE UN JSON VÁLIDO (sin texto adicional, sin markdown, sin comentarios).\n\n"
+    "El recibo completo representa UN solo gasto. Si la imagen está dañada o ilegible, debes devolver un objeto de error.\n\n"
+    "Formato requerido:\n"
+    "{\n"
+    "  \"store\": string,              // nombre del comercio o 'unidentified' si no se puede leer\n"
+    "  \"date\": string,               // SIEMPRE en formato YYYY-MM-DD, representando la FECHA DE SUBIDA (NO LEAS la fecha impresa en el ticket)\n"
+    "  \"amount\": number,             // monto total del ticket (si no aparece o es ambiguo, marcar error)\n"
+    "  \"category_id\": number,        // 1..6\n"
+    "  \"category_name\": string,      // 'food','drinks','subscriptions','small_payment','transport','others'\n"
+    "  \"error\": string|null          // describe error si no se pudo analizar correctamente\n"
+    "}\n\n"
+    "Reglas:\n"
+    "- Si no hay tienda visible, usa \"store\": \"unidentified\".\n"
+    "- NO LEAS la fecha impresa del ticket; la fecha corresponde al momento de SUBIDA (el sistema del cliente la fijará).\n"
+    "- Si no hay total claro o el recibo es ilegible, devuelve un JSON con:\n"
+    "  {\"error\": \"total_not_found\"} o {\"error\": \"unreadable_image\"} según el caso.\n"
+    "- Si no hay categoría clara, usa id=6 y name='others'.\n"
+    "- Clasificación de categoría:\n"
+    "   1. food            → comida, restaurantes, supermercado, comida rápida\n"
+    "   2. drinks          → café, bebidas, jugos, bares\n"
+    "   3. subscriptions   → Netflix, Spotify, servicios digitales\n"
+    "   4. small_payment   → propinas, comisiones pequeñas, micro pagos\n"
+    "   5. transport       → Uber, gasolina, transporte público, estacionamientos\n"
+    "   6. others          → todo lo demás o ambiguo\n\n"
+    "Si el ticket parece mezcla (ej. OXXO con comida y bebidas), aplica predominio:\n"
+    "- Si no hay predominio claro, usa food (1) por defecto, salvo que sea casi puro bebidas → drinks (2).\n\n"
+    "IMPORTANTE:\n"
+    "- DEVUELVE SOLO EL JSON SIN ``` NI TEXTO EXTRA.\n"
+    "- Usa punto decimal en los montos.\n"
+)
+
+# Prompt corto para salida estructurada: el formato lo impone RECEIPT_SCHEMA, no el texto
+STRUCTURED_PROMPT = (
+    "Lee el recibo de la imagen; todo el ticket es UN solo gasto. No leas la fecha.\n"
+    "store: nombre del comercio o 'unidentified'. amount: total pagado.\n"
+    "Categoría (id/name): 1 food (comida, restaurantes, supermercado), 2 drinks (café, bebidas, bares), "
+    "3 subscriptions (Netflix, Spotify, servicios digitales), 4 small_payment (propinas, comisiones, micro pagos), "
+    "5 transport (Uber, gasolina, transporte público, estacionamiento), 6 others (resto o ambiguo). "
+    "Si es mezcla sin predominio usa food, salvo que sea casi puro bebidas → drinks.\n"
+    "Si no hay total claro: error='total_not_found'; si es ilegible: error='unreadable_image'; si no, error=null."
+)
+
+RECEIPT_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'store': {'type': 'STRING'},
+        'amount': {'type': 'NUMBER'},
+        'category_id': {'type': 'INTEGER', 'minimum': 1, 'maximum': 6},
+        'category_name': {'type': 'STRING', 'enum': list(CAT_MAP.values())},
+        'error': {'type': 'STRING', 'nullable': True},
+    },
+    'required': ['store', 'amount', 'category_id', 'category_name', 'error'],
+    'property_ordering': ['store', 'amount', 'category_id', 'category_name', 'error'],
+}
+
+GEMINI_MODEL = 'gemini-2.5-flash'
+
+# GEMINI_STRUCTURED=0 regresa al prompt de texto libre (para comparar tokens/latencia)
+STRUCTURED_OUTPUT = os.getenv('GEMINI_STRUCTURED', '1') == '1'
+
+ACTIVE_PROMPT = STRUCTURED_PROMPT if STRUCTURED_OUTPUT else GEMINI_PROMPT
+
+STRUCTURED_CONFIG = types.GenerateContentConfig(
+    temperature=0.1,
+    response_mime_type='application/json',
+    response_schema=RECEIPT_SCHEMA,
+    # Leer un ticket no necesita razonamiento: sin thinking hay menos tokens y latencia
+    thinking_config=types.ThinkingConfig(thinking_budget=0),
+)
+
+# Cambia sola si cambia el prompt, el esquema o el modelo → invalida la caché de análisis
+PROMPT_VERSION = hashlib.sha256(
+    f"{GEMINI_MODEL}\n{ACTIVE_PROMPT}\n{json.dumps(RECEIPT_SCHEMA) if STRUCTURED_OUTPUT else ''}".encode('utf-8')
+).hexdigest()[:16]
+
+
+gemini_duration = registry.histogram(
+    'gemini_request_duration_seconds', 'Latencia de las llamadas al analizador de recibos',
+    ('mode', 'outcome'), buckets=(0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 8.0, 13.0, 20.0, 30.0, 60.0))
+gemini_tokens = registry.counter('gemini_tokens_total', 'Tokens consumidos por tipo', ('mode', 'kind'))
+
+
+class UsageStats:
+    """Tokens, latencia y fallos por modo de prompt (structured / legacy)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._modes = {}
+
+    def record(self, mode, latency, usage=None, error=False, parse_failure=False):
+        outcome = 'error' if error else 'parse_failure' if parse_failure else 'ok'
+        gemini_duration.observe(latency, mode=mode, outcome=outcome)
+        log.log(logging.WARNING if error or parse_failure else logging.INFO, 'llamada a Gemini', extra={
+            'mode': mode, 'outcome': outcome, 'ms': round(latency * 1000, 1),
+            'tokens': usage.total_token_count if usage is not None else None,
+        })
+        if usage is not None:
+            gemini_tokens.inc(usage.prompt_token_count or 0, mode=mode, kind='prompt')
+            gemini_tokens.inc(usage.candidates_token_count or 0, mode=mode, kind='output')
+            gemini_tokens.inc(usage.thoughts_token_count or 0, mode=mode, kind='thoughts')
+        with self._lock:
+            m = self._modes.setdefault(mode, {
+                'calls': 0, 'errors': 0, 'parse_failures': 0, 'latency_ms': 0.0,
+                'prompt_tokens': 0, 'output_tokens': 0, 'thoughts_tokens': 0, 'total_tokens': 0,
+            })
+            m['calls'] += 1
+            m['latency_ms'] += latency * 1000
+            m['errors'] += 1 if error else 0
+            m['parse_failures'] += 1 if parse_failure else 0
+            if usage is not None:
+                m['prompt_tokens'] += usage.prompt_token_count or 0
+                m['output_tokens'] += usage.candidates_token_count or 0
+                m['thoughts_tokens'] += usage.thoughts_token_count or 0
+                m['total_tokens'] += usage.total_token_count or 0
+
+    def reset(self):
+        with self._lock:
+            self._modes.clear()
+
+    def snapshot(self):
+        """Totales y promedios por llamada de cada modo"""
+        with self._lock:
+            result = {}
+            for mode, m in self._modes.items():
+                calls = m['calls'] or 1
+                result[mode] = {
+                    **m,
+                    'latency_ms': round(m['latency_ms'], 1),
+                    'avg_latency_ms': round(m['latency_ms'] / calls, 1),
+                    'avg_prompt_tokens': round(m['prompt_tokens'] / calls, 1),
+                    'avg_output_tokens': round(m['output_tokens'] / calls, 1),
+                    'avg_total_tokens': round(m['total_tokens'] / calls, 1),
+                }
+            return result
+
+
+usage_stats = UsageStats()
+
+
+class ReceiptError(Exception):
+    """Error del análisis de un recibo con su código HTTP y datos extra para la respuesta"""
+
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.extra = extra
+
+    def to_body(self):
+        return {'success': False, 'message': self.message, **self.extra}
+
+
+def call_gemini(client, image_bytes, mime_type, model=GEMINI_MODEL, structured=None):
+    """
+    Manda la imagen + prompt a Gemini y regresa el recibo normalizado (lanza ReceiptError)
+    - structured: True = esquema JSON + prompt corto, False = prompt de texto libre
+      (por defecto según GEMINI_STRUCTURED)
+    Cada llamada suma tokens y latencia a usage_stats
+    """
+    if structured is None:
+        structured = STRUCTURED_OUTPUT
+    mode = 'structured' if structured else 'legacy'
+    prompt = STRUCTURED_PROMPT if structured else GEMINI_PROMPT
+    config = STRUCTURED_CONFIG if structured else None
+
+    start = time.perf_counter()
+    try:
+        response = client.models.generate_content(
+            model=model,
+            contents=[
+                types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
+                prompt
+            ],
+            config=config,
+        )
+    except Exception as e:
+        usage_stats.record(mode, time.perf_counter() - start, error=True)
+        raise ReceiptError('Error llamando a Gemini', 502, error=str(e))
+    latency = time.perf_counter() - start
+    usage = getattr(response, 'usage_metadata', None)
+
+    # Con esquema el SDK ya entrega el dict; el texto queda como respaldo
+    data = getattr(response, 'parsed', None) if structured else None
+    if not isinstance(data, dict):
+        # Parseo de salida (limpieza de fences)
+        text = (getattr(response, 'text', None) or str(response)).strip()
+        try:
+            data = try_parse_json(text)
+        except Exception as e:
+            usage_stats.record(mode, latency, usage, parse_failure=True)
+            raise ReceiptError('Respuesta de Gemini no es JSON parseable', 400, error=str(e), raw=text[:500])
+
+    usage_stats.record(mode, latency, usage)
+    return normalize_receipt(data)
+
+
+def normalize_receipt(data):
+    """
+    Valida y normaliza la salida del modelo
+    Regresa dict con store, amount, category_id, category_name (lanza ReceiptError)
+    """
+    if not isinstance(data, dict):
+        raise ReceiptError('Respuesta de Gemini no es un objeto JSON')
+
+    # Checa error explícito del modelo
+    if data.get('error'):
+        raise ReceiptError(f"Gemini error: {data['error']}")
+
+    # Campos mínimos (store puede ser vacío → se normaliza; date la fija backend)
+    if 'amount' not in data:
+        raise ReceiptError('No se detectó amount')
+
+    # Normalizaciones
+    store = data.get('store') or 'unidentified'
+
+    # amount: float positivo
+    try:
+        amount = round(float(data.get('amount')), 2)
+    except Exception:
+        raise ReceiptError('amount no numérico')
+    if amount <= 0:
+        raise ReceiptError('amount debe ser > 0')
+
+    # Categoría coherente, con fallback a others(6)
+    cid = data.get('category_id')
+    cname = data.get('category_name')
+    if cid in CAT_MAP and not cname:
+        cname = CAT_MAP[cid]
+    elif cname in NAME_TO_ID and not cid:
+        cid = NAME_TO_ID[cname]
+    if cid not in CAT_MAP:
+        cid, cname = 6, 'others'
+
+    return {'store': store, 'amount': amount, 'category_id': cid, 'category_name': cname}
+
+
+def guess_mime_type(path):
+    """MIME simple por extensión (jpg por defecto)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.png':
+        return 'image/png'
+    return 'image/jpeg'
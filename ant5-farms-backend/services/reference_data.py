@@ -0,0 +1,152 @@
+"""
+Catálogos casi estáticos (category y ants) servidos desde memoria
+Se cargan al arrancar la app y se refrescan cada REFERENCE_TTL segundos;
+invalidate() fuerza la recarga en el siguiente acceso (ej. después de editar un catálogo)
+"""
+import os
+import threading
+import time
+
+from config.db import DBSession
+from config.metrics import registry
+from config.log import get_logger
+from services.receipts import CAT_MAP
+
+log = get_logger('reference_data')
+
+
+class ReferenceData:
+    """
+    Snapshot en memoria de category {id: name} y ants {id_ant: name}
+    - Al expirar, un solo hilo recarga; los demás siguen usando el snapshot anterior
+    - Si la BD no responde se conserva el último snapshot (o CAT_MAP si nunca cargó)
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._categories = None
+        self._ants = None
+        self._loaded_at = None
+        self._expires_at = 0.0
+
+        self._hits = 0
+        self._loads = 0
+        self._load_errors = 0
+
+    def load(self):
+        """Lee ambos catálogos en una conexión propia; regresa False si falló"""
+        session = DBSession()
+        try:
+            categories = session.execute("SELECT id, name FROM category", fetch=True)
+            ants = session.execute("SELECT id_ant, name FROM ants", fetch=True)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            log.error('error cargando catálogos', extra={'error': str(e)})
+            with self._lock:
+                self._load_errors += 1
+                # Reintentar en unos segundos, no en cada request
+                self._expires_at = time.monotonic() + min(self.ttl, 5)
+            return False
+
+        with self._lock:
+            self._categories = {r['id']: r['name'] for r in categories}
+            self._ants = {r['id_ant']: r['name'] for r in ants}
+            self._loaded_at = time.time()
+            self._expires_at = time.monotonic() + self.ttl
+            self._loads += 1
+        return True
+
+    def invalidate(self):
+        with self._lock:
+            self._expires_at = 0.0
+
+    def _snapshot(self):
+        if time.monotonic() >= self._expires_at:
+            # Solo quien gana el lock recarga; sin snapshot previo los demás esperan
+            blocking = self._categories is None
+            if self._refresh_lock.acquire(blocking=blocking):
+                try:
+                    if time.monotonic() >= self._expires_at:
+                        self.load()
+                finally:
+                    self._refresh_lock.release()
+        with self._lock:
+            self._hits += 1
+            return self._categories, self._ants
+
+    def categories(self):
+        categories, _ = self._snapshot()
+        return dict(categories if categories is not None else CAT_MAP)
+
+    def category_name(self, category_id):
+        """Nombre de la categoría o None si no existe"""
+        categories, _ = self._snapshot()
+        return (categories if categories is not None else CAT_MAP).get(_as_int(category_id))
+
+    def ant_name(self, ant_id):
+        """Nombre de la hormiga o None si no existe"""
+        _, ants = self._snapshot()
+        if ants is None:
+            # Catálogo aún sin cargar (BD caída al arrancar): el query dirá si existe
+            session = DBSession()
+            try:
+                rows = session.execute("SELECT name FROM ants WHERE id_ant = %s", (ant_id,), fetch=True)
+                session.commit()
+            except Exception:
+                session.rollback()
+                raise
+            return rows[0]['name'] if rows else None
+        return ants.get(_as_int(ant_id))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'categories': len(self._categories) if self._categories is not None else None,
+                'ants': len(self._ants) if self._ants is not None else None,
+                'age_s': round(time.time() - self._loaded_at, 1) if self._loaded_at else None,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'loads': self._loads,
+                'load_errors': self._load_errors,
+            }
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+_reference = None
+_reference_lock = threading.Lock()
+
+
+def get_reference_data():
+    """Catálogos compartidos por el proceso (se crean al primer uso); TTL con REFERENCE_TTL"""
+    global _reference
+    if _reference is None:
+        with _reference_lock:
+            if _reference is None:
+                _reference = ReferenceData(ttl=int(os.getenv('REFERENCE_TTL', '300')))
+    return _reference
+
+
+def invalidate():
+    """Fuerza recargar los catálogos en el siguiente acceso"""
+    get_reference_data().invalidate()
+
+
+@registry.register_collector
+def _reference_metrics():
+    if _reference is None:
+        return []
+    stats = _reference.stats()
+    return [
+        ('reference_data_lookups_total', 'counter', 'Búsquedas de catálogos servidas desde memoria', {(): stats['hits']}),
+        ('reference_data_loads_total', 'counter', 'Recargas de catálogos desde la BD',
+         {(('outcome', 'ok'),): stats['loads'], (('outcome', 'error'),): stats['load_errors']}),
+    ]
@@ -0,0 +1,105 @@
+"""
+Mantenimiento de la tabla weekly_spend (gasto por usuario / semana / categoría)
+Las funciones usan execute_query, así que corren dentro de la transacción del
+request o de transaction(): el gasto y su agregado se guardan juntos o ninguno
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from config.db import execute_query, execute_many
+
+# Lunes de la semana de cada gasto, igual que week_bounds()
+WEEK_START_SQL = "DATE_SUB(e.date, INTERVAL WEEKDAY(e.date) DAY)"
+
+_UPSERT = """
+    INSERT INTO weekly_spend (user_id, week_start, category_id, spent, expense_count)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE spent = spent + VALUES(spent),
+                            expense_count = expense_count + VALUES(expense_count)
+"""
+
+
+def week_start(d):
+    return d - timedelta(days=d.weekday())
+
+
+def add_expenses(rows):
+    """
+    Suma gastos nuevos al agregado
+    - rows: [(user_id, category_id, amount, date)]
+    Regresa False si falló la escritura
+    """
+    totals = defaultdict(lambda: [0, 0])
+    for user_id, category_id, amount, expense_date in rows:
+        key = (user_id, week_start(expense_date), category_id)
+        totals[key][0] += float(amount)
+        totals[key][1] += 1
+    if not totals:
+        return True
+
+    params = [(u, w, c, round(spent, 2), count) for (u, w, c), (spent, count) in totals.items()]
+    return execute_many(_UPSERT, params, rowcount=True) is not None
+
+
+def add_expense(user_id, category_id, amount, expense_date):
+    return add_expenses([(user_id, category_id, amount, expense_date)])
+
+
+def remove_expense(user_id, category_id, amount, expense_date):
+    """Resta un gasto borrado del agregado"""
+    query = """
+        UPDATE weekly_spend
+        SET spent = spent - %s, expense_count = expense_count - 1
+        WHERE user_id = %s AND week_start = %s AND category_id = %s
+    """
+    return execute_query(query, (amount, user_id, week_start(expense_date), category_id), rowcount=True) is not None
+
+
+def rebuild(user_id=None):
+    """Recalcula el agregado desde expenses (todo o un usuario)"""
+    params = (user_id,) if user_id else ()
+    execute_query(f"DELETE FROM weekly_spend {'WHERE user_id = %s' if user_id else ''}", params)
+    insert = f"""
+        INSERT INTO weekly_spend (user_id, week_start, category_id, spent, expense_count)
+        SELECT e.user_id, {WEEK_START_SQL}, e.category_id, SUM(e.amount), COUNT(*)
+        FROM expenses e
+        {'WHERE e.user_id = %s' if user_id else ''}
+        GROUP BY e.user_id, {WEEK_START_SQL}, e.category_id
+    """
+    return execute_query(insert, params, rowcount=True)
+
+
+def verify(user_id=None):
+    """
+    Compara weekly_spend contra expenses
+    Regresa [(user_id, week_start, category_id, esperado, guardado)] con las diferencias
+    """
+    where, params = ("WHERE e.user_id = %s", (user_id,)) if user_id else ("", ())
+    expected_q = f"""
+        SELECT e.user_id, {WEEK_START_SQL} AS week_start, e.category_id,
+               SUM(e.amount) AS spent, COUNT(*) AS expense_count
+        FROM expenses e
+        {where}
+        GROUP BY e.user_id, {WEEK_START_SQL}, e.category_id
+    """
+    stored_q = f"""
+        SELECT user_id, week_start, category_id, spent, expense_count
+        FROM weekly_spend
+        {'WHERE user_id = %s' if user_id else ''}
+    """
+    expected = {
+        (r['user_id'], r['week_start'], r['category_id']): (float(r['spent']), int(r['expense_count']))
+        for r in execute_query(expected_q, params, fetch=True) or []
+    }
+    stored = {
+        (r['user_id'], r['week_start'], r['category_id']): (float(r['spent']), int(r['expense_count']))
+        for r in execute_query(stored_q, params, fetch=True) or []
+    }
+
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        want = expected.get(key, (0.0, 0))
+        have = stored.get(key, (0.0, 0))
+        if abs(want[0] - have[0]) >= 0.005 or want[1] != have[1]:
+            drift.append((*key, want, have))
+    return drift
@@ -0,0 +1,153 @@
+"""
+Fixtures sin BD real: la app corre con conexiones falsas que responden según reglas por SQL
+
+    def test_algo(client, fake_db):
+        fake_db.on('INSERT INTO expenses', lastrowid=7)
+        fake_db.on('INSERT INTO users', error=duplicate_error())
+        ...
+        assert fake_db.commits == 1
+
+Cada test recibe un pool nuevo con su propio FakeDB; las sentencias quedan en fake_db.statements
+"""
+import os
+import threading
+
+# Antes de importar la app: nada de red, caché en disco ni write-behind
+os.environ.setdefault('GENAI_API_KEY', 'test')
+os.environ['RECEIPT_ANALYZER'] = 'fake'
+os.environ['FAKE_ANALYZER_LATENCY_MS'] = '0'
+os.environ['FAKE_ANALYZER_JITTER_MS'] = '0'
+os.environ['RECEIPT_CACHE_DIR'] = ''
+os.environ['LEAVES_WRITE_BEHIND'] = '0'
+os.environ.setdefault('LOG_LEVEL', 'CRITICAL')
+
+import pytest
+from mysql.connector import IntegrityError
+
+import config.db as db
+from config.pool import ConnectionPool
+
+CATEGORIES = [{'id': i, 'name': name} for i, name in
+              enumerate(('food', 'drinks', 'subscriptions', 'small_payment', 'transport', 'others'), 1)]
+ANTS = [{'id_ant': 1, 'name': 'obrera'}, {'id_ant': 2, 'name': 'soldado'}]
+
+
+def fk_error(table):
+    """IntegrityError como el de MySQL al insertar con un padre inexistente"""
+    return IntegrityError(
+        msg=f"Cannot add or update a child row: a foreign key constraint fails "
+            f"(`db`.`child`, CONSTRAINT `fk` FOREIGN KEY (`x`) REFERENCES `{table}` (`id`))",
+        errno=1452,
+    )
+
+
+def duplicate_error():
+    return IntegrityError(msg="Duplicate entry 'x' for key 'uq'", errno=1062)
+
+
+class FakeDB:
+    """
+    Responde cada sentencia con la regla más reciente cuyo fragmento aparece en el SQL
+    Una regla regresa filas, rowcount y lastrowid fijos, lanza error o llama fn(sql, params)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statements = []   # [(sql con espacios colapsados, params)]
+        self.commits = 0
+        self.rollbacks = 0
+        self._rules = []
+        self.on('FROM category', rows=CATEGORIES)
+        self.on('FROM ants', rows=ANTS)
+
+    def on(self, fragment, rows=None, rowcount=1, lastrowid=None, error=None, fn=None):
+        if fn is None:
+            def fn(sql, params):
+                if error is not None:
+                    raise error
+                return list(rows or []), lastrowid, rowcount
+        with self.lock:
+            self._rules.insert(0, (fragment, fn))
+
+    def run(self, sql, params):
+        sql = ' '.join(sql.split())
+        with self.lock:
+            self.statements.append((sql, params))
+            rules = list(self._rules)
+        for fragment, fn in rules:
+            if fragment in sql:
+                return fn(sql, params)
+        return [], None, 1
+
+    def executed(self, fragment):
+        """[(sql, params)] de las sentencias que contienen fragment"""
+        with self.lock:
+            return [(sql, params) for sql, params in self.statements if fragment in sql]
+
+
+class FakeCursor:
+    def __init__(self, fake):
+        self._fake = fake
+        self._rows = []
+        self.rowcount = 0
+        self.lastrowid = None
+
+    def execute(self, query, params=()):
+        self._rows, self.lastrowid, self.rowcount = self._fake.run(query, params)
+
+    def executemany(self, query, seq_params):
+        self._rows, self.lastrowid, self.rowcount = self._fake.run(query, list(seq_params))
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    in_transaction = False
+
+    def __init__(self, fake):
+        self._fake = fake
+
+    def cursor(self, dictionary=False):
+        return FakeCursor(self._fake)
+
+    def commit(self):
+        with self._fake.lock:
+            self._fake.commits += 1
+
+    def rollback(self):
+        with self._fake.lock:
+            self._fake.rollbacks += 1
+
+    def ping(self, reconnect=False):
+        pass
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+def _fake_pool(fake):
+    return ConnectionPool(lambda: FakeConnection(fake), size=8, timeout=1)
+
+
+# La app carga los catálogos al importarse: que los lea de un FakeDB
+db._pool = _fake_pool(FakeDB())
+from app import app as flask_app  # noqa: E402
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(db, '_pool', _fake_pool(fake))
+    return fake
+
+
+@pytest.fixture
+def client(fake_db):
+    return flask_app.test_client()
@@ -0,0 +1,70 @@
+"""
+Una conexión y una transacción por request: si una sentencia no pudo correr, nada se confirma
+"""
+from mysql.connector import DatabaseError
+
+import config.db as db
+from app import app
+from config.pool import PoolTimeout
+
+
+def test_pool_timeout_rolls_back_request(client, fake_db, monkeypatch):
+    pool = db.get_pool()
+    acquire = pool.acquire
+    calls = {'n': 0}
+
+    def flaky_acquire():
+        calls['n'] += 1
+        if calls['n'] == 1:
+            raise PoolTimeout('Sin conexiones libres')
+        return acquire()
+
+    monkeypatch.setattr(pool, 'acquire', flaky_acquire)
+
+    response = client.post('/api/expenses/', json={'user_id': 1, 'category_id': 1, 'amount': 10})
+
+    assert response.status_code == 500
+    assert response.get_json()['success'] is False
+    assert fake_db.commits == 0
+
+
+def test_failed_statement_rolls_back_request(client, fake_db):
+    fake_db.on('INSERT INTO weekly_spend', error=DatabaseError(msg='Lock wait timeout exceeded', errno=1205))
+    fake_db.on('INSERT INTO expenses', lastrowid=7)
+
+    response = client.post('/api/expenses/', json={'user_id': 1, 'category_id': 1, 'amount': 10})
+
+    assert response.status_code == 500
+    assert fake_db.commits == 0
+    assert fake_db.rollbacks == 1
+
+
+def test_release_after_failed_statement_does_not_commit(fake_db):
+    fake_db.on('INSERT INTO weekly_spend', error=DatabaseError(msg='Lock wait timeout exceeded', errno=1205))
+
+    with app.test_request_context():
+        db.execute_query("INSERT INTO expenses (user_id) VALUES (%s)", (1,))
+        db.execute_query("INSERT INTO weekly_spend (user_id) VALUES (%s)", (1,))
+        db.release_session()
+
+        session = db.current_session()
+        assert session.failed
+        assert session.connection is None
+        assert fake_db.commits == 0
+        assert fake_db.rollbacks == 1
+
+
+def test_after_commit_runs_only_when_committed(fake_db):
+    called = []
+
+    session = db.DBSession()
+    session.execute("UPDATE farm SET leaves_count = 1")
+    session.after_commit(lambda: called.append('commit'))
+    session.commit()
+
+    session.execute("UPDATE farm SET leaves_count = 2")
+    session.after_commit(lambda: called.append('rollback'))
+    session.rollback()
+
+    assert called == ['commit']
+    assert fake_db.commits == 1
@@ -0,0 +1,22 @@
+"""
+/db/stats y /reference/refresh solo existen con el diagnóstico de BD (app.debug o DB_DEBUG_HEADERS=1)
+"""
+import pytest
+
+
+@pytest.mark.parametrize('method, path', [('get', '/db/stats'), ('post', '/reference/refresh')])
+def test_hidden_without_debug(client, monkeypatch, method, path):
+    monkeypatch.delenv('DB_DEBUG_HEADERS', raising=False)
+
+    response = getattr(client, method)(path)
+
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('method, path', [('get', '/db/stats'), ('post', '/reference/refresh')])
+def test_available_with_debug_switch(client, monkeypatch, method, path):
+    monkeypatch.setenv('DB_DEBUG_HEADERS', '1')
+
+    response = getattr(client, method)(path)
+
+    assert response.status_code == 200
@@ -0,0 +1,52 @@
+"""
+PUT /api/goals/bulk/<id>: el cuerpo se valida sin tocar la BD y las 6 metas van en un solo UPDATE
+que también dice si el usuario existe (filas encontradas: usuario + metas)
+"""
+import pytest
+
+GOALS = [{'category_id': c, 'money': 100 * c} for c in range(1, 7)]
+
+
+def test_updates_six_goals_in_one_statement(client, fake_db):
+    fake_db.on('UPDATE users u LEFT JOIN goal', rowcount=7)
+
+    response = client.put('/api/goals/bulk/1', json={'goals': GOALS})
+
+    assert response.status_code == 200
+    assert len(fake_db.statements) == 1
+    sql, params = fake_db.statements[0]
+    assert params[-1] == 1
+    assert fake_db.commits == 1
+
+
+def test_unknown_user_is_404(client, fake_db):
+    fake_db.on('UPDATE users u LEFT JOIN goal', rowcount=0)
+
+    response = client.put('/api/goals/bulk/999', json={'goals': GOALS})
+
+    assert response.status_code == 404
+    assert response.get_json()['message'] == 'Usuario no existe'
+    assert len(fake_db.statements) == 1
+
+
+@pytest.mark.parametrize('goals', [
+    GOALS[:5],
+    GOALS[:5] + [{'category_id': 1, 'money': 1}],
+    [{'category_id': 1, 'money': 'mucho'}] + GOALS[1:],
+])
+def test_invalid_payload_is_400_without_queries(client, fake_db, goals):
+    response = client.put('/api/goals/bulk/999', json={'goals': goals})
+
+    assert response.status_code == 400
+    assert not fake_db.statements
+
+
+def test_existing_user_without_goals_is_not_404(client, fake_db):
+    # Solo se encontró la fila de users
+    fake_db.on('UPDATE users u LEFT JOIN goal', rowcount=1)
+
+    response = client.put('/api/goals/bulk/1', json={'goals': GOALS})
+
+    assert response.status_code == 500
+    assert response.get_json()['message'] == 'Usuario no tiene metas inicializadas. Contacta soporte.'
+    assert fake_db.commits == 0
@@ -0,0 +1,67 @@
+"""
+PUT /api/farm/<id>/leaves: el saldo no negativo lo asegura el WHERE del UPDATE, no una lectura previa
+"""
+import pytest
+
+CONDITIONAL_UPDATE = 'UPDATE farm SET leaves_count = leaves_count + %s WHERE user_id = %s AND leaves_count >= %s'
+
+
+def test_spend_uses_conditional_update(client, fake_db):
+    response = client.put('/api/farm/1/leaves', json={'leaves': -30})
+
+    assert response.status_code == 204
+    assert fake_db.executed(CONDITIONAL_UPDATE)[0][1] == (-30, 1, 30)
+    assert not fake_db.executed('SELECT')
+
+
+def test_insufficient_balance_is_400(client, fake_db):
+    fake_db.on('UPDATE farm', rowcount=0)
+    fake_db.on('SELECT 1 FROM farm', rows=[{'1': 1}])
+
+    response = client.put('/api/farm/1/leaves', json={'leaves': -30})
+
+    assert response.status_code == 400
+    assert response.get_json()['message'] == 'Saldo insuficiente'
+
+
+def test_missing_farm_is_404(client, fake_db):
+    fake_db.on('UPDATE farm', rowcount=0)
+    fake_db.on('SELECT 1 FROM farm', rows=[])
+
+    response = client.put('/api/farm/999/leaves', json={'leaves': 5})
+
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('body', [{}, {'leaves': 'diez'}])
+def test_invalid_body_is_400(client, fake_db, body):
+    response = client.put('/api/farm/1/leaves', json=body)
+
+    assert response.status_code == 400
+    assert not fake_db.statements
+
+
+def test_sequence_of_changes_never_overdraws(client, fake_db):
+    """
+    La fila en memoria aplica el SET y el WHERE tal como los mandó la app (sin lock propio:
+    la atomicidad bajo concurrencia es de MySQL y la prueba scripts.stress_leaves con BD real)
+    Aquí se cubre lo que decide la app: el mínimo del WHERE (-delta) y filas encontradas → 204/400
+    """
+    farm = {'leaves': 40}
+
+    def conditional_update(sql, params):
+        assert sql == CONDITIONAL_UPDATE
+        delta, user_id, minimum = params
+        if user_id != 1 or not farm['leaves'] >= minimum:
+            return [], None, 0
+        farm['leaves'] += delta
+        return [], None, 1
+
+    fake_db.on('UPDATE farm', fn=conditional_update)
+    fake_db.on('SELECT 1 FROM farm', rows=[{'1': 1}])
+
+    changes = [-15, -15, -15, 20, -30, -25, 5, -1]
+    statuses = [client.put('/api/farm/1/leaves', json={'leaves': delta}).status_code for delta in changes]
+
+    assert statuses == [204, 204, 400, 204, 204, 400, 204, 204]
+    assert farm['leaves'] == 40 - 15 - 15 + 20 - 30 + 5 - 1
@@ -0,0 +1,106 @@
+"""
+Write-behind de hojas: lo que está en escritura sigue contando en el saldo visible hasta el commit
+"""
+import threading
+
+import pytest
+
+import routes.auth as auth
+from services.leaves_buffer import LeavesBuffer
+
+
+@pytest.fixture
+def buffer(fake_db):
+    # Intervalo largo: los flush los dispara el test
+    leaves = LeavesBuffer(flush_interval=3600, flush_threshold=10 ** 6)
+    yield leaves
+    leaves.close()
+
+
+def _blocking_flush(fake_db, buffer, fail=False):
+    """Arranca un flush que se queda dentro del UPDATE hasta que el test suelte release"""
+    entered, release = threading.Event(), threading.Event()
+
+    def update(sql, params):
+        entered.set()
+        release.wait(5)
+        if fail:
+            raise ConnectionError('se cayó la conexión')
+        return [], None, 1
+
+    fake_db.on('UPDATE farm', fn=update)
+    thread = threading.Thread(target=buffer.flush)
+    thread.start()
+    assert entered.wait(5)
+    return release, thread
+
+
+def test_inflight_delta_still_counts_during_flush(fake_db, buffer):
+    fake_db.on('SELECT leaves_count FROM farm', rows=[{'leaves_count': 100}])
+    assert buffer.apply(1, -100) == 'ok'
+
+    release, thread = _blocking_flush(fake_db, buffer)
+    try:
+        assert buffer.apply(1, -60) == 'insufficient'
+        assert buffer.pending(1) == -100
+        assert buffer.balance(1) == 0
+        assert buffer.stats()['inflight_users'] == 1
+    finally:
+        release.set()
+        thread.join(5)
+
+    assert len(fake_db.executed('UPDATE farm')) == 1
+    assert buffer.pending(1) == 0
+    assert buffer.balance(1) == 0
+    assert buffer.apply(1, -1) == 'insufficient'
+
+
+def test_failed_flush_returns_deltas_to_pending(fake_db, buffer):
+    fake_db.on('SELECT leaves_count FROM farm', rows=[{'leaves_count': 100}])
+    assert buffer.apply(1, -40) == 'ok'
+
+    release, thread = _blocking_flush(fake_db, buffer, fail=True)
+    try:
+        assert buffer.apply(1, -50) == 'ok'
+    finally:
+        release.set()
+        thread.join(5)
+
+    assert fake_db.rollbacks == 1
+    assert buffer.pending(1) == -90
+    assert buffer.balance(1) == 10
+    assert buffer.stats()['inflight_users'] == 0
+
+
+def test_login_bonus_forgets_base_after_commit(client, fake_db, monkeypatch):
+    forgotten = []
+
+    class Recorder:
+        def forget(self, user_id):
+            # Cuántos commits había cuando se descartó la base
+            forgotten.append((user_id, fake_db.commits))
+
+    monkeypatch.setattr(auth, 'get_leaves_buffer', lambda: Recorder())
+    fake_db.on('FROM users u LEFT JOIN farm', rows=[
+        {'id': 1, 'last_login_date': None, 'bonus_leaves_earned': 0, 'ants_count': 1}])
+    fake_db.on('UPDATE users u LEFT JOIN farm', rowcount=2)
+
+    response = client.put('/api/auth/login', json={'username': 'ana', 'password': 'x'})
+
+    assert response.status_code == 200
+    assert forgotten == [(1, 1)]
+
+
+def test_forget_during_cold_load_rereads_base(fake_db, buffer):
+    balances = iter([100, 150])
+
+    def load(sql, params):
+        balance = next(balances)
+        if balance == 100:
+            # El bonus se confirma y se descarta la base mientras esta lectura seguía en curso
+            buffer.forget(1)
+        return [{'leaves_count': balance}], None, 1
+
+    fake_db.on('SELECT leaves_count FROM farm', fn=load)
+
+    assert buffer.balance(1) == 150
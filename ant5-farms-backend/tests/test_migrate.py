@@ -0,0 +1,41 @@
+"""
+scripts.migrate: un SELECT en una migración es una verificación que la detiene si regresa filas
+"""
+import io
+
+import pytest
+
+from scripts.migrate import MigrationCheckFailed, migrate
+
+
+def _write(tmp_path, sql):
+    (tmp_path / '0001_prueba.sql').write_text(sql, encoding='utf-8')
+    return str(tmp_path)
+
+
+SQL = """
+-- Verificación
+SELECT 'expenses.user_id' AS fk, COUNT(*) AS huerfanas FROM expenses HAVING COUNT(*) > 0;
+
+ALTER TABLE expenses ADD INDEX ix_prueba (user_id);
+"""
+
+
+def test_failed_check_stops_migration(tmp_path, fake_db):
+    fake_db.on("SELECT 'expenses.user_id'", rows=[{'fk': 'expenses.user_id', 'huerfanas': 3}])
+
+    with pytest.raises(MigrationCheckFailed) as error:
+        migrate(_write(tmp_path, SQL), out=io.StringIO())
+
+    assert 'huerfanas' in str(error.value)
+    assert not fake_db.executed('ALTER TABLE')
+    assert not fake_db.executed('INSERT INTO schema_migrations')
+
+
+def test_passing_check_applies_migration(tmp_path, fake_db):
+    done = migrate(_write(tmp_path, SQL), out=io.StringIO())
+
+    assert done == ['0001']
+    assert fake_db.executed('ALTER TABLE expenses')
+    assert fake_db.executed('INSERT INTO schema_migrations')
+
@@ -0,0 +1,41 @@
+"""
+POST /api/expenses/analyze/batch: un solo INSERT multi-fila y los IDs reales de cada gasto
+"""
+import io
+
+
+def _images(n):
+    return [(io.BytesIO(f'recibo {i}'.encode()), f'ticket{i}.jpg', 'image/jpeg') for i in range(n)]
+
+
+def _inserted_rows(fake_db, ids):
+    """Responde el SELECT de IDs con las filas del INSERT del lote y los ids dados"""
+    def fn(sql, params):
+        rows = fake_db.executed('INSERT INTO expenses')[0][1]
+        return [{'id': i, 'category_id': c, 'amount': a} for i, (_, c, a, _, _) in zip(ids, rows)], None, len(rows)
+    return fn
+
+
+def test_batch_reports_ids_read_back(client, fake_db):
+    # auto_increment_increment = 10 (réplicas / MySQL administrado): IDs no consecutivos
+    fake_db.on('INSERT INTO expenses', lastrowid=10)
+    fake_db.on('SELECT id, category_id, amount FROM expenses', fn=_inserted_rows(fake_db, [10, 20, 30]))
+
+    response = client.post('/api/expenses/analyze/batch', data={'user_id': '1', 'images': _images(3)},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 201
+    assert [r['expense_id'] for r in response.get_json()['results']] == [10, 20, 30]
+    assert len(fake_db.executed('INSERT INTO expenses')) == 1
+    assert fake_db.commits == 1
+
+
+def test_batch_rolls_back_when_rows_do_not_match(client, fake_db):
+    fake_db.on('INSERT INTO expenses', lastrowid=10)
+    fake_db.on('SELECT id, category_id, amount FROM expenses', rows=[{'id': 10, 'category_id': 99, 'amount': 0}])
+
+    response = client.post('/api/expenses/analyze/batch', data={'user_id': '1', 'images': _images(2)},
+                           content_type='multipart/form-data')
+
+    assert response.status_code == 500
+    assert fake_db.commits == 0
@@ -0,0 +1,28 @@
+"""
+POST /api/auth/register sin SELECT previo: el índice único de username decide (1062 → 409)
+y usuario, granja y metas se guardan en la misma transacción
+"""
+from conftest import duplicate_error
+
+
+def test_register_creates_user_farm_and_goals(client, fake_db):
+    fake_db.on('INSERT INTO users', lastrowid=42)
+
+    response = client.post('/api/auth/register', json={'username': 'nuevo', 'password': 'x'})
+
+    assert response.status_code == 201
+    assert response.get_json()['user_id'] == 42
+    assert fake_db.executed('INSERT INTO farm')[0][1] == (42,)
+    assert fake_db.executed('INSERT INTO goal')[0][1] == (42,)
+    assert fake_db.commits == 1
+
+
+def test_register_duplicate_username_is_409(client, fake_db):
+    fake_db.on('INSERT INTO users', error=duplicate_error())
+
+    response = client.post('/api/auth/register', json={'username': 'repetido', 'password': 'x'})
+
+    assert response.status_code == 409
+    assert response.get_json()['message'] == 'Usuario ya existe'
+    assert not fake_db.executed('INSERT INTO farm')
+    assert fake_db.commits == 0
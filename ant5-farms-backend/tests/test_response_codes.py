@@ -0,0 +1,54 @@
+"""
+Códigos de respuesta de las escrituras que confían en las FK y en los índices únicos
+(sin SELECT de validación previo): FK sin padre → 404, duplicado → 409, y nada a medias
+"""
+import io
+
+from conftest import fk_error
+
+
+def test_expense_created(client, fake_db):
+    fake_db.on('INSERT INTO expenses', lastrowid=7)
+
+    response = client.post('/api/expenses/', json={'user_id': 1, 'category_id': 1, 'amount': 10})
+
+    assert response.status_code == 201
+    assert response.get_json()['expense_id'] == 7
+    assert fake_db.executed('INSERT INTO weekly_spend')
+    assert fake_db.commits == 1
+
+
+def test_expense_unknown_user_is_404(client, fake_db):
+    fake_db.on('INSERT INTO expenses', error=fk_error('users'))
+
+    response = client.post('/api/expenses/', json={'user_id': 999, 'category_id': 1, 'amount': 10})
+
+    assert response.status_code == 404
+    assert response.get_json()['message'] == 'Usuario no existe'
+    assert not fake_db.executed('INSERT INTO weekly_spend')
+    assert fake_db.commits == 0
+
+
+def test_expense_unknown_category_is_404(client, fake_db):
+    response = client.post('/api/expenses/', json={'user_id': 1, 'category_id': 99, 'amount': 10})
+
+    assert response.status_code == 404
+    assert not fake_db.executed('INSERT INTO expenses')
+
+
+def test_expense_without_amount_is_400(client, fake_db):
+    response = client.post('/api/expenses/', json={'user_id': 1, 'category_id': 1})
+
+    assert response.status_code == 400
+    assert not fake_db.statements
+
+
+def test_analyze_unknown_user_is_404(client, fake_db):
+    fake_db.on('INSERT INTO expenses', error=fk_error('users'))
+
+    response = client.post('/api/expenses/analyze', data={
+        'user_id': '999', 'image': (io.BytesIO(b'\xff\xd8\xff\xe0 recibo'), 'ticket.jpg', 'image/jpeg'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 404
+    assert fake_db.commits == 0